@@ -1,36 +1,58 @@
+import argparse
 import asyncio
+import csv
 import json
+import random
+import secrets
+import statistics
+import subprocess
+import sys
 import time
+from contextlib import asynccontextmanager
 #from brownie import Contract,accounts
 # import brownie
-from web3.auto import w3
-from web3 import Web3
-from eth_account import account
-from eth_account.messages import encode_defunct
 #from eth_abi.packed import encode_abi_packed
-from eth_utils import keccak
-from pycoin.ecdsa.secp256k1 import secp256k1_generator
 #from pycoin.ecdsa import sign, verify
-import hashlib, secrets
 #import ecdsa, ellipticcurve
 #editor.renderWhitespace: all
-from indy import pool, wallet, did, ledger,anoncreds
-from indy.error import ErrorCode, IndyError
-from ecdsa import SigningKey,SECP256k1
+
+# indy and eth_account are only imported when a ledger call or wallet address needs
+# them, so workers can import this module cheaply; web3.auto is never imported since
+# it probes for a provider on import.
+from lazy_import import LazyModule
+
+pool = LazyModule('indy.pool')
+wallet = LazyModule('indy.wallet')
+did = LazyModule('indy.did')
+ledger = LazyModule('indy.ledger')
+anoncreds = LazyModule('indy.anoncreds')
+indy_error = LazyModule('indy.error')
+eth_account = LazyModule('eth_account')
+
+from credential_issuance import RevocationRegistries, TailsStore, credential_values, issue_credentials
+from did_signing import DidSigner
+from fake_ledger import FakeLedger
+from indy_handles import open_pool, wallet_handles
+from ledger_cache import LedgerCache, ledger_cache
+from pool_topology import PoolTopology, ZmqTransport
+
+# When set (see --route_reads), GET_* polls go to the fastest validator instead of the pool.
+read_pool = None
 
 
 #editor.renderWhitespace: all
 
 async def create_wallet(identity):
+    # Takes a reference on the handle: long-lived identities (steward, issuer, verifier)
+    # keep it for the whole run, holders give it back with release_wallet.
     print("\"{}\" -> Create wallet".format(identity['name']))
-    try:
-        await wallet.create_wallet(identity['wallet_config'],
-                                   identity['wallet_credentials'])
-    except IndyError as ex:
-        if ex.error_code == ErrorCode.PoolLedgerConfigAlreadyExistsError:
-            pass
-    identity['wallet'] = await wallet.open_wallet(identity['wallet_config'],
+    identity['wallet'] = await wallet_handles.open(identity['wallet_config'],
                                                    identity['wallet_credentials'])
+
+async def release_wallet(identity):
+    if identity.pop('wallet', None) is not None:
+        await wallet_handles.release(identity['wallet_config'])
+
 async def getting_verinym(from_, to):
     await create_wallet(to)
 
@@ -45,77 +67,410 @@ async def getting_verinym(from_, to):
                    from_['info']['verkey'], from_['info']['role'])
 
 async def get_cred_def(pool_handle, _did, cred_def_id):
-    get_cred_def_request = await ledger.build_get_cred_def_request(_did, cred_def_id)
-    get_cred_def_response = \
-        await ensure_previous_request_applied(pool_handle, get_cred_def_request,
-                                              lambda response: response['result']['data'] is not None)
-    return await ledger.parse_get_cred_def_response(get_cred_def_response)
+    async def fetch():
+        get_cred_def_request = await ledger.build_get_cred_def_request(_did, cred_def_id)
+        get_cred_def_response = \
+            await ensure_previous_request_applied(pool_handle, get_cred_def_request,
+                                                  lambda response: response['result']['data'] is not None)
+        return await ledger.parse_get_cred_def_response(get_cred_def_response)
+    return await ledger_cache.get_or_fetch(cred_def_id, fetch)
+
+async def get_schema(pool_handle, _did, schema_id):
+    async def fetch():
+        get_schema_request = await ledger.build_get_schema_request(_did, schema_id)
+        get_schema_response = \
+            await ensure_previous_request_applied(pool_handle, get_schema_request,
+                                                  lambda response: response['result']['data'] is not None)
+        return await ledger.parse_get_schema_response(get_schema_response)
+    return await ledger_cache.get_or_fetch(schema_id, fetch)
 
 async def send_nym(pool_handle, wallet_handle, _did, new_did, new_key, role):
     nym_request = await ledger.build_nym_request(_did, new_did, new_key, None, role)
     print(nym_request)
     await ledger.sign_and_submit_request(pool_handle, wallet_handle, _did, nym_request)
 
-async def ensure_previous_request_applied(pool_handle, checker_request, checker):
-    for _ in range(3):
-        response = json.loads(await ledger.submit_request(pool_handle, checker_request))
+async def send_nyms(pool_handle, wallet_handle, _did, nyms, window=32, ledger_api=None):
+    """Register many (did, verkey, role) NYMs, keeping at most `window` submissions outstanding.
+
+    Up to `window` further requests are built and signed ahead of submission, so signing
+    of the next requests overlaps with the pool round trips of the ones in flight while
+    at most 2 x `window` signed requests are held at once. Returns the parsed ledger
+    responses in the order of `nyms`. `ledger_api` replaces `indy.ledger` (e.g. a
+    FakeLedger).
+    """
+    ledger_api = ledger_api or ledger
+    semaphore = asyncio.Semaphore(window)
+    lookahead = asyncio.Semaphore(2 * window)
+
+    async def _send(new_did, new_key, role):
+        async with lookahead:
+            nym_request = await ledger_api.build_nym_request(_did, new_did, new_key, None, role)
+            signed_request = await ledger_api.sign_request(wallet_handle, _did, nym_request)
+            async with semaphore:
+                return json.loads(await ledger_api.submit_request(pool_handle, signed_request))
+
+    responses = await asyncio.gather(*(_send(*nym) for nym in nyms))
+    rejected = [response for response in responses if response.get('op') != 'REPLY']
+    if rejected:
+        print("{} of {} NYM requests rejected, first: {}".format(len(rejected), len(responses),
+                                                                rejected[0].get('reason')))
+    return responses
+
+class PollStats:
+    """How many ledger polls each read needed before the checker accepted it."""
+
+    def __init__(self):
+        self.polls = {}
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def record(self, txn_type, polls):
+        self.polls.setdefault(txn_type, []).append(polls)
+
+    def report(self):
+        for txn_type, counts in self.polls.items():
+            print("  reads of type {:<6} n={:<6} mean polls={:.2f} max polls={}".format(
+                txn_type, len(counts), sum(counts) / len(counts), max(counts)))
+        print("  coalesced reads={} timed out reads={}".format(self.coalesced, self.timeouts))
+
+
+poll_stats = PollStats()
+_inflight_checks = {}
+
+
+def _checker_key(pool_handle, checker_request):
+    # reqId and submitter differ on every build_get_*_request; the operation is what is read.
+    operation = json.loads(checker_request).get('operation', checker_request)
+    return pool_handle, json.dumps(operation, sort_keys=True)
+
+
+async def _poll_until_applied(pool_handle, checker_request, checker, deadline, base_delay, max_delay):
+    expires = time.monotonic() + deadline
+    delay = base_delay
+    polls = 0
+    txn_type = json.loads(checker_request).get('operation', {}).get('type')
+    while True:
+        polls += 1
         try:
+            if read_pool is not None:
+                response = json.loads(await read_pool.submit_read(checker_request))
+            else:
+                response = json.loads(await ledger.submit_request(pool_handle, checker_request))
             if checker(response):
+                poll_stats.record(txn_type, polls)
                 return json.dumps(response)
-        except TypeError:
+        except ConnectionError:
+            # No routed validator answered this poll; retry like an unapplied read.
+            pass
+        except (KeyError, TypeError):
+            # REQNACK/REJECT replies carry no result; poll again until the deadline.
             pass
-        time.sleep(5)
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            poll_stats.timeouts += 1
+            raise asyncio.TimeoutError(
+                "ledger read {} not applied after {} polls in {}s".format(txn_type, polls, deadline))
+        # Full jitter keeps concurrent holders from polling the pool in lockstep.
+        await asyncio.sleep(min(random.uniform(0, delay), remaining))
+        delay = min(delay * 2, max_delay)
+
+
+async def ensure_previous_request_applied(pool_handle, checker_request, checker,
+                                          deadline=15.0, base_delay=0.2, max_delay=5.0):
+    """Poll the ledger with `checker_request` until `checker` accepts the response.
+
+    Retries back off exponentially with jitter until `deadline` seconds have passed.
+    Identical reads already in flight are coalesced onto a single polling task, so
+    concurrent callers share its result (and the first caller's checker).
+    """
+    key = _checker_key(pool_handle, checker_request)
+    task = _inflight_checks.get(key)
+    if task is not None:
+        poll_stats.coalesced += 1
+        return await asyncio.shield(task)
+    task = asyncio.ensure_future(_poll_until_applied(pool_handle, checker_request, checker,
+                                                     deadline, base_delay, max_delay))
+    _inflight_checks[key] = task
+    try:
+        return await asyncio.shield(task)
+    finally:
+        if _inflight_checks.get(key) is task:
+            del _inflight_checks[key]
+
+class StageStats:
+    """Per-stage call counters and latencies for the holder onboarding chain."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.holders = 0
+        self.failed = 0
+
+    @asynccontextmanager
+    async def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.stages.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+
+    def report(self):
+        wall = time.perf_counter() - self.started
+        print("Onboarded {} holders ({} failed) in {:.2f}s -> {:.1f} holders/sec".format(
+            self.holders, self.failed, wall, self.holders / wall if wall else 0.0))
+        for name, entry in self.stages.items():
+            print("  {:<32} n={:<6} mean={:.1f}ms max={:.1f}ms {:.1f}/sec".format(
+                name, entry['count'], 1000 * entry['total'] / entry['count'],
+                1000 * entry['max'], entry['count'] / wall if wall else 0.0))
+
+
+def transcript_values(holder):
+    """Transcript credential values for `holder`; fields missing from its record get placeholders."""
+    first_name, _, last_name = holder['name'].partition(' ')
+    return credential_values({
+        'first_name': holder.get('first_name', first_name),
+        'last_name': holder.get('last_name', last_name or 'Holder'),
+        'credentials': holder.get('credentials', 'Transcript'),
+        'country': holder.get('country', 'N/A'),
+        'year': holder.get('year', time.strftime('%Y')),
+        'date': holder.get('date', time.strftime('%Y-%m-%d')),
+        'ssn': holder.get('ssn', '0'),
+        'nonce': holder['did'],
+    })
+
+def load_holders(path):
+    """Read holder records (at least a 'name' column) from a CSV or JSONL file."""
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+    holders = []
+    for record in records:
+        name = record['name']
+        holders.append({
+            'name': name,
+            'wallet_config': json.dumps({'id': record.get('wallet_id') or '{}_wallet'.format(name)}),
+            'wallet_credentials': json.dumps({'key': record.get('wallet_key') or '{}_wallet_key'.format(name)}),
+        })
+    return holders
+
+
+async def onboard_holder(pool_handle, issuer, holder, stats):
+    """Wallet, DID, master secret, cred def and credential request for one holder."""
+    holder['pool'] = pool_handle
+    async with stats.stage('create_wallet'):
+        await create_wallet(holder)
+    async with stats.stage('create_and_store_my_did'):
+        (holder['did'], holder['key']) = await did.create_and_store_my_did(holder['wallet'], "{}")
+    async with stats.stage('issuer_create_credential_offer'):
+        holder['transcript_cred_offer'] = \
+            await anoncreds.issuer_create_credential_offer(issuer['wallet'], issuer['transcript_cred_def_id'])
+    holder['transcript_cred_def_id'] = json.loads(holder['transcript_cred_offer'])['cred_def_id']
+    async with stats.stage('prover_create_master_secret'):
+        holder['master_secret_id'] = await anoncreds.prover_create_master_secret(holder['wallet'], None)
+    async with stats.stage('get_cred_def'):
+        (holder['issuer_transcript_cred_def_id'], holder['issuer_transcript_cred_def']) = \
+            await get_cred_def(holder['pool'], holder['did'], holder['transcript_cred_def_id'])
+    async with stats.stage('prover_create_credential_req'):
+        (holder['transcript_cred_request'], holder['transcript_cred_request_metadata']) = \
+            await anoncreds.prover_create_credential_req(holder['wallet'], holder['did'],
+                                                         holder['transcript_cred_offer'],
+                                                         holder['issuer_transcript_cred_def'],
+                                                         holder['master_secret_id'])
+    return holder
+
+
+async def onboard_holders(pool_handle, issuer, holders, concurrency=16, stats=None):
+    """Run onboard_holder for every holder with at most `concurrency` chains in flight."""
+    stats = stats or StageStats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _bounded(holder):
+        async with semaphore:
+            try:
+                async with stats.stage('holder_total'):
+                    await onboard_holder(pool_handle, issuer, holder, stats)
+                stats.holders += 1
+            except indy_error.IndyError as ex:
+                stats.failed += 1
+                print("\"{}\" -> onboarding failed: {}".format(holder['name'], ex.error_code))
+            except (asyncio.TimeoutError, ConnectionError) as ex:
+                stats.failed += 1
+                print("\"{}\" -> onboarding failed: {}".format(holder['name'], ex))
+            finally:
+                # Finished holders stay reusable as idle handles, but never crowd out held ones.
+                await release_wallet(holder)
+
+    await asyncio.gather(*(_bounded(holder) for holder in holders))
+    stats.report()
+    poll_stats.report()
+    print("  ledger cache: {}".format(ledger_cache.metrics()))
+    print("  wallet handles: {}".format(wallet_handles.metrics()))
+    return stats
+
+class Onboarder:
+    """Importable onboarding service around one pool handle and one steward wallet.
+
+    A worker builds it once and then drives getting_verinym/send_nym/onboard_holders
+    for many jobs; the pool, steward wallet and ledger lookups stay open and cached.
+    """
+
+    def __init__(self, pool_name='pool1', genesis_txn_path='pool1.txn',
+                 steward_seed='000000000000000000000000Steward1', tails_host='127.0.0.1', tails_port=None,
+                 signing_key_path='./keys/did_signing.key'):
+        self.pool_name = pool_name
+        self.genesis_txn_path = genesis_txn_path
+        self.steward_seed = steward_seed
+        # secp256k1 key signing the DID hashes sent to the Registration contract; its
+        # public key is kept next to it (<path>.pub) and on every signed holder.
+        self.signing_key_path = signing_key_path
+        self.pool_handle = None
+        self.steward = None
+        # Tails files of the revocation registries, served over HTTP when tails_port is set.
+        self.tails = TailsStore()
+        self.tails_host = tails_host
+        self.tails_port = tails_port
+        self.tails_server = None
+
+    async def open(self):
+        if self.steward is not None:
+            return self
+        # Set protocol version 2 to work with Indy Node 1.4; the handle is reused across runs
+        self.pool_handle = await open_pool(self.pool_name, self.genesis_txn_path, protocol_version=2)
+        steward = self.identity("AnonCreds Poll registration and setup", 'sovrin_steward_wallet',
+                                'steward_wallet_key')
+        await create_wallet(steward)
+        steward['did_info'] = json.dumps({'seed': self.steward_seed})
+        steward['did'], steward['key'] = await did.create_and_store_my_did(steward['wallet'], steward['did_info'])
+        self.steward = steward
+        return self
+
+    def identity(self, name, wallet_id, wallet_key, role=None):
+        identity = {
+            'name': name,
+            'wallet_config': json.dumps({'id': wallet_id}),
+            'wallet_credentials': json.dumps({'key': wallet_key}),
+            'pool': self.pool_handle,
+        }
+        if role is not None:
+            identity['role'] = role
+        return identity
+
+    async def getting_verinym(self, to):
+        await self.open()
+        to['pool'] = self.pool_handle
+        await getting_verinym(self.steward, to)
+        return to
+
+    async def send_nym(self, new_did, new_key, role=None):
+        await self.open()
+        await send_nym(self.pool_handle, self.steward['wallet'], self.steward['did'], new_did, new_key, role)
+
+    async def bulk_verinyms(self, nyms, window=32):
+        """Register (did, verkey, role) tuples as verinyms signed by the steward."""
+        await self.open()
+        return await send_nyms(self.pool_handle, self.steward['wallet'], self.steward['did'], nyms, window)
+
+    async def setup_issuer(self, issuer, transcript, cred_def_config):
+        """Publish the transcript schema and credential definition for `issuer`."""
+        print("\"Issuer\" -> Create \"Transcript\" Schema")
+        (issuer['transcript_schema_id'], issuer['transcript_schema']) = \
+            await anoncreds.issuer_create_schema(issuer['did'], transcript['name'], transcript['version'],
+                                                 json.dumps(transcript['attributes']))
+        print(issuer['transcript_schema_id'], issuer['transcript_schema'])
+
+        print("\"Issuer\" -> Send \"Transcript\" Schema to Ledger")
+        schema_request = await ledger.build_schema_request(issuer['did'], issuer['transcript_schema'])
+        await ledger.sign_and_submit_request(issuer['pool'], issuer['wallet'], issuer['did'], schema_request)
+
+        print("\"Issuer\" -> Get \"Transcript\" Schema from Ledger")
+        (issuer['transcript_schema_id'], issuer['transcript_schema']) = \
+            await get_schema(issuer['pool'], issuer['did'], issuer['transcript_schema_id'])
+
+        print("\"Issuer\" -> Create and store in Wallet \"Issuer generated\" Credential Definition")
+        (issuer['transcript_cred_def_id'], issuer['transcript_cred_def']) = \
+            await anoncreds.issuer_create_and_store_credential_def(issuer['wallet'], issuer['did'],
+                                                                   issuer['transcript_schema'], cred_def_config['tag'],
+                                                                   cred_def_config['type'],
+                                                                   json.dumps(cred_def_config['config']))
+
+        print("\"Issuer\" -> Send  \"Issuer defination\" Credential Definition to Ledger")
+        cred_def_request = await ledger.build_cred_def_request(issuer['did'], issuer['transcript_cred_def'])
+        await ledger.sign_and_submit_request(issuer['pool'], issuer['wallet'], issuer['did'], cred_def_request)
+        return issuer
+
+    async def onboard_holders(self, issuer, holders, concurrency=16, signing_workers=1):
+        """Onboard `holders` concurrently, then sign every onboarded DID hash."""
+        await self.open()
+        stats = await onboard_holders(self.pool_handle, issuer, holders, concurrency)
+        onboarded = [holder for holder in holders if 'transcript_cred_request' in holder]
+        start = time.perf_counter()
+        signer, signatures = await self.sign_dids([holder['did'] for holder in onboarded], signing_workers)
+        print("Signed {} DID hashes in {:.2f}s with public key 0x{}".format(
+            len(signatures), time.perf_counter() - start, signer.public_key.hex()))
+        for holder, (did_hash, did_signature) in zip(onboarded, signatures):
+            holder['did_hash'], holder['did_signature'] = '0x' + did_hash, '0x' + did_signature
+            holder['did_signer'] = '0x' + signer.public_key.hex()
+        return stats
+
+    async def sign_dids(self, dids, workers=1):
+        """(signer, [(sha256 hex, signature hex), ...]) for `dids`, computed off the event loop.
+
+        Loading the key and signing tens of thousands of hashes takes seconds, during
+        which the ledger polls and wallet calls of other holders must keep running.
+        """
+        def _sign():
+            signer = DidSigner.from_key_file(self.signing_key_path, workers=workers)
+            return signer, signer.sign(dids)
+        return await asyncio.get_running_loop().run_in_executor(None, _sign)
+
+    async def issue_credentials(self, issuer, holders, workers=16, shard_size=1000, tails_dir='./tails'):
+        """Issue the transcript credential to holders holding a credential request, and store it.
+
+        Revocation registries of `shard_size` credentials are pre-created for the batch
+        and kept on the issuer (issuer['transcript_revocation']) for later batches. With
+        `tails_port` set, their tails files are served from memory maps over HTTP and
+        that URL is published as the tails location.
+        """
+        await self.open()
+        if 'transcript_revocation' not in issuer:
+            tails_url = None
+            if self.tails_port is not None:
+                if self.tails_server is None:
+                    self.tails_server = self.tails.serve(tails_dir, self.tails_host, self.tails_port)
+                tails_url = 'http://{}:{}/'.format(self.tails_host, self.tails_server.server_address[1])
+            issuer['transcript_revocation'] = RevocationRegistries(issuer, issuer['transcript_cred_def_id'],
+                                                                   shard_size, tails_dir, tails=self.tails,
+                                                                   tails_url=tails_url, wallets=wallet_handles)
+        requested = [holder for holder in holders if 'transcript_cred_request' in holder]
+        return await issue_credentials(issuer['transcript_revocation'], requested, transcript_values, workers)
 
     # Generation of Indy Pools of Valid users for AnonCreds
-async def run():
+async def run(holders_path=None, concurrency=16, signing_workers=1, onboarder=None, issue_workers=16,
+              shard_size=1000, tails_dir='./tails'):
     print ("Anoncreds Demo Program for Identity Management and communicates with Registration Contract and PIECHAIN")
     print ("Generating and Connecting with the generated pool of valid users")
 
-    pool_ ={
-    "name": "pool1"
-    }
-    print ("Open pool for AnonCreds ledger:{}".format(pool_['name']))
-    pool_['genesis_txn_path'] = "pool1.txn"
-    pool_['config'] = json.dumps({"genesis_txn": str(pool_['genesis_txn_path'])})
-    
-    print(pool_)
-
-    # Set protocol version 2 to work with Indy Node 1.4
-    await pool.set_protocol_version(2)
-
-    try:
-        await pool.create_pool_ledger_config(pool_['name'], pool_['config'])
-    except IndyError as ex:
-        if ex.error_code == ErrorCode.PoolLedgerConfigAlreadyExistsError:
-            pass
-    pool_['handle'] = await pool.open_pool_ledger(pool_['name'], None)
-
-    print(pool_['handle'])
+    onboarder = onboarder or Onboarder()
+    print ("Open pool for AnonCreds ledger:{}".format(onboarder.pool_name))
 
     print("\n\n\n========================================================================")
     print("==  System Genetered nonce  to handle the pool ==")
     print("============================================================================")
     #    --------------------------------------------------------------------------
     #  Accessing a steward.
-    steward = {
-        'name': "AnonCreds Poll registration and setup",
-        'wallet_config': json.dumps({'id': 'sovrin_steward_wallet'}),
-        'wallet_credentials': json.dumps({'key': 'steward_wallet_key'}),
-        'pool': pool_['handle'],
-        'seed': '000000000000000000000000Steward1'
-    }
-    print(steward)
-
-    await create_wallet(steward)
-
+    await onboarder.open()
+    print(onboarder.pool_handle)
+    steward = onboarder.steward
     print(steward["wallet"])
-
-    steward["did_info"] = json.dumps({'seed':steward['seed']})
     print(steward["did_info"])
 
 # did:generated for the demoindynetwork for the validators to participate in the validation process :Th7MpTaRZVRYnPiabds81Y
-    steward['did'], steward['key'] = await did.create_and_store_my_did(steward['wallet'], steward['did_info']
-)
 
 # ----------------------------------------------------------------------
     # Generatred and register dids for Issuer and Verifier
@@ -124,93 +479,45 @@ async def run():
     print("==  Issuer registering DIDs and Verinym for verifier (ISSUER))only ==")
     print("============================================================================")
 
-    issuer = {
-        'name': 'issuer',
-        'wallet_config': json.dumps({'id': 'Issuer_wallet'}),
-        'wallet_credentials': json.dumps({'key': 'Issuer_wallet_key'}),
-        'pool': pool_['handle'],
-        'role': 'TRUST_ANCHOR'
-    }
-    #issuer1 = bytes(issuer, 'utf-8')
-    #issuer = (issuer, 'utf-8')
-    await getting_verinym(steward, issuer)
+    issuer = onboarder.identity('issuer', 'Issuer_wallet', 'Issuer_wallet_key', role='TRUST_ANCHOR')
+    await onboarder.getting_verinym(issuer)
 
     print("============================================================================")
     print("== Issuer registering DIDs and Verinym for verifier (VERIFIER))only ==")  
     print("============================================================================")
 
-    verifier = {
-        'name': 'verifier',
-        'wallet_config': json.dumps({'id': 'verifier'}),
-        'wallet_credentials': json.dumps({'key': 'verifier_wallet_key'}),
-        'pool': pool_['handle'],
-        'role': 'TRUSTEE'
-    }
-
-    await getting_verinym(steward, verifier)
+    verifier = onboarder.identity('verifier', 'verifier', 'verifier_wallet_key', role='TRUSTEE')
+    await onboarder.getting_verinym(verifier)
 
     print("=============================================================================")
     print("== Issuer creates transcript schema and sends to the AnonCreds ledger  ==")
     print("=============================================================================")
 
     # -----------------------------------------------------
-    # Issuer creates transcript Schema and sends to the AnonCreds ledger
-
-    print("\"Issuer\" -> Create \"Transcript\" Schema")
+    # Issuer creates transcript Schema and sends to the AnonCreds ledger,
+    # then a credential definition for the Scheme
     transcript = {
         'name': 'Transcript',
         'version': '1.2',
         'attributes': ['first_name', 'last_name', 'credentials', 'country', 'year', 'date', 'ssn','nonce']
     }
-    (issuer['transcript_schema_id'], issuer['transcript_schema']) = \
-        await anoncreds.issuer_create_schema(issuer['did'], transcript['name'], transcript['version'],
-                                             json.dumps(transcript['attributes'])) 
-                                             
-    print(issuer['transcript_schema'])
-    transcript_schema_id = issuer['transcript_schema_id']
-
-    print(issuer['transcript_schema_id'], issuer['transcript_schema'])
-
-    print("\"Issuer\" -> Send \"Transcript\" Schema to Ledger")
-
-    schema_request = await ledger.build_schema_request(issuer['did'], issuer['transcript_schema'])
-    await ledger.sign_and_submit_request(issuer['pool'], issuer['wallet'], issuer['did'], schema_request)
-
-    # ------------------------------------------------------------
-    # The Issuer will create a credential definition for the Scheme
-    
-    print("\n\n==========================================================================")
-    print("=== Issuer will perform Credential Definition Setup ==")
-    print("==============================================================================")
-
-    print("\"Issuer\" -> Get \"Transcript\" Schema from Ledger")
-
-    # GET SCHEMA FROM LEDGER
-    get_schema_request = await ledger.build_get_schema_request(issuer['did'], transcript_schema_id)
-    get_schema_response = await ensure_previous_request_applied(
-        issuer['pool'], get_schema_request, lambda response: response['result']['data'] is not None)
-    (issuer['transcript_schema_id'], issuer['transcript_schema']) = await ledger.parse_get_schema_response(get_schema_response)
-
-    # TRANSCRIPT CREDENTIAL DEFINITION
-    print("\"Issuer\" -> Create and store in Wallet \"Issuer generated\" Credential Definition")
     transcript_cred_def = {
         'tag': 'TAG1',
         'type': 'CL',
         'config': {"support_revocation": True}
     }
-    (issuer['transcript_cred_def_id'], issuer['transcript_cred_def']) = \
-        await anoncreds.issuer_create_and_store_credential_def(issuer['wallet'], issuer['did'],
-                                                               issuer['transcript_schema'], transcript_cred_def['tag'],
-                                                               transcript_cred_def['type'],
-                                                               json.dumps(transcript_cred_def['config']))
-
-    print("\"Issuer\" -> Send  \"Issuer defination\" Credential Definition to Ledger")
-    # print(issuer['transcript_cred_def'])
-    cred_def_request = await ledger.build_cred_def_request(issuer['did'], issuer['transcript_cred_def'])
-    # print(cred_def_request)
-    await ledger.sign_and_submit_request(issuer['pool'], issuer['wallet'], issuer['did'], cred_def_request)
+    await onboarder.setup_issuer(issuer, transcript, transcript_cred_def)
     print("\n\n>>>>> Cresential Defination and Scheme for the Holder is generated by issuer with the Identity: \n\n", issuer['transcript_cred_def_id'])
 
+    if holders_path:
+        print("\n\n============================================================================")
+        print("== Bulk onboarding of holders from {} (concurrency {}) ==".format(holders_path, concurrency))
+        print("================================================================================")
+        holders = load_holders(holders_path)
+        stats = await onboarder.onboard_holders(issuer, holders, concurrency, signing_workers)
+        await onboarder.issue_credentials(issuer, holders, issue_workers, shard_size, tails_dir)
+        return stats
+
     print("\n\n============================================================================")
     print("== Holder1(Actioner/Bidders) setup for wallet and credential defination== ==")
     print("================================================================================")
@@ -219,7 +526,7 @@ async def run():
         'name': 'Holder1',
         'wallet_config': json.dumps({'id': 'Holder1_wallet'}),
         'wallet_credentials': json.dumps({'key': 'Holder1_wallet_key'}),
-        'pool': pool_['handle'],
+        'pool': onboarder.pool_handle,
     }
     await create_wallet(Holder1)
     (Holder1['did'], Holder1['key']) = await did.create_and_store_my_did(Holder1['wallet'], "{}")
@@ -285,35 +592,116 @@ async def run():
     print("\n\n==========================================================================")  
     print(Holder1['transcript_cred_offer'])
 
+    print("\"Issuer\" -> Issue \"Transcript\" Credential to Holder1, \"Holder1\" -> Store it")
+    await onboarder.issue_credentials(issuer, [Holder1], issue_workers, shard_size, tails_dir)
+    print(Holder1.get('transcript_cred_id'), Holder1.get('transcript_rev_reg_id'))
+
     # Signing the transaction with DID of the Holder and sending it to Registration Smart Contract
-    private_key = SigningKey.generate()
-    did_has = hashlib.sha256(Holder1['did'].encode('utf-8')).hexdigest()
+    signer, ((did_has, did_signature),) = await onboarder.sign_dids([Holder1['did']])
+    Holder1['did_signer'] = '0x' + signer.public_key.hex()
     print("\n\n==========================================================================")
     print("=== Transaction hash for Holder1 while sending the DID information to =Registration Smart Contract=")
     print("\n\n==========================================================================")
-    did_byts = bytes(did_has.encode('utf-8'))
     print('0x'+did_has)
     print("\n\n==========================================================================")
-    print("=== ECDSA based Signed DID for Holder1 as RAW data after signing by AnonCresa Verifier==")
-    print("\n\n==========================================================================")
-    did_sin = private_key.sign(did_byts)
-    print(did_sin)
-    did_signature = did_sin.hex()
-    print("\n\n==========================================================================")
     print("=== ECDSA based Signed HEXADECIMAL hashed transaction for Holder1 generated by AnonCresa Verifier==")
     print("\n\n==========================================================================")
     print('0x'+did_signature)
+    print("=== verifiable with public key", Holder1['did_signer'], "(also in", onboarder.signing_key_path + ".pub)")
     print("\n\n==========================================================================")
 
-    Web3 = require("web3")
-
-    web3 = Web3("http://127.0.0.1:8545")
-
-    w3.eth.account.create(account)
-    print("accounts: ", account)
-    
-
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-#loop = asyncio.get_event_loop()
-loop.run_until_complete(run())
\ No newline at end of file
+    # 160-bit wallet address for Holder1 to register with the Registration contract
+    holder_account = eth_account.Account.create()
+    Holder1['address'] = holder_account.address
+    print("accounts: ", Holder1['address'])
+
+
+def benchmark_import(repeat=5):
+    """Time a cold `import DID_WalletAddress_Generation` in fresh interpreters."""
+    code = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+    for module in ('DID_WalletAddress_Generation', 'indy', 'web3.auto'):
+        timings = []
+        for _ in range(repeat):
+            result = subprocess.run([sys.executable, '-c', code.format(module)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            timings.append(float(result.stdout))
+        if timings:
+            print("import {:<30} median {:.1f}ms".format(module, 1000 * statistics.median(timings)))
+        else:
+            print("import {:<30} not installed".format(module))
+
+
+def benchmark_nyms(count, window, latency):
+    """Bulk NYM throughput against FakeLedger: one request at a time vs. a `window`."""
+    fake_ledger = FakeLedger(latency=latency)
+    steward_did = 'Th7MpTaRZVRYnPiabds81Y'
+    for size in sorted({1, window}):
+        nyms = [(secrets.token_hex(8), secrets.token_hex(16), 'TRUST_ANCHOR') for _ in range(count)]
+        start = time.perf_counter()
+        asyncio.run(send_nyms(None, None, steward_did, nyms, size, ledger_api=fake_ledger))
+        elapsed = time.perf_counter() - start
+        print("window={:<5} {} NYMs in {:.2f}s -> {:.1f} NYM/sec".format(size, count, elapsed, count / elapsed))
+
+
+def main():
+    global ledger_cache, read_pool
+    parser = argparse.ArgumentParser(description="AnonCreds DID and wallet address generation")
+    parser.add_argument('--holders', type=str, default=None,
+                        help="CSV or JSONL file of holders to onboard in batch mode")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="Maximum number of holders onboarded concurrently")
+    parser.add_argument('--ledger_cache', type=str, default=None,
+                        help="sqlite file backing the schema/cred-def cache across runs")
+    parser.add_argument('--signing_workers', type=int, default=1,
+                        help="Processes used to sign holder DID hashes in batch mode")
+    parser.add_argument('--issue_workers', type=int, default=16,
+                        help="Credentials issued and stored concurrently")
+    parser.add_argument('--rev_reg_size', type=int, default=1000,
+                        help="Credentials per revocation registry shard")
+    parser.add_argument('--tails_dir', type=str, default='./tails',
+                        help="Directory for the tails files of the revocation registries")
+    parser.add_argument('--tails_port', type=int, default=None,
+                        help="Serve tails files over HTTP on this port and publish it as their location")
+    parser.add_argument('--tails_host', type=str, default='127.0.0.1',
+                        help="Host the tails server binds to and advertises")
+    parser.add_argument('--signing_key', type=str, default='./keys/did_signing.key',
+                        help="secp256k1 key signing DID hashes (created on first use, public key in <path>.pub)")
+    parser.add_argument('--pool_name', type=str, default='pool1',
+                        help="Name of the Indy pool ledger config")
+    parser.add_argument('--genesis_txn_path', type=str, default='pool1.txn',
+                        help="Genesis transactions of the validator pool")
+    parser.add_argument('--route_reads', action='store_true',
+                        help="Send ledger reads to the fastest healthy validator, hedging to a second one")
+    parser.add_argument('--bench_import', action='store_true',
+                        help="Only report cold import time of this module and its backends")
+    parser.add_argument('--bench_nyms', type=int, default=0,
+                        help="Benchmark this many bulk NYM registrations against a local fake ledger")
+    parser.add_argument('--nym_window', type=int, default=32,
+                        help="Outstanding NYM submissions allowed in bulk registration")
+    parser.add_argument('--ledger_latency', type=float, default=0.05,
+                        help="Simulated per-request pool latency (seconds) of the fake ledger")
+    args = parser.parse_args()
+    if args.bench_import:
+        benchmark_import()
+        return
+    if args.bench_nyms:
+        benchmark_nyms(args.bench_nyms, args.nym_window, args.ledger_latency)
+        return
+    if args.ledger_cache:
+        ledger_cache = LedgerCache(db_path=args.ledger_cache)
+    if args.route_reads:
+        read_pool = PoolTopology.from_genesis(args.genesis_txn_path, ZmqTransport())
+
+    onboarder = Onboarder(args.pool_name, args.genesis_txn_path, tails_host=args.tails_host,
+                          tails_port=args.tails_port, signing_key_path=args.signing_key)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    #loop = asyncio.get_event_loop()
+    loop.run_until_complete(run(args.holders, args.concurrency, args.signing_workers, onboarder,
+                                args.issue_workers, args.rev_reg_size, args.tails_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import glob
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import jax
+import equinox as eqx
+
+
+########################################
+# Atomic Writes
+########################################
+
+def _atomic_write(path, write):
+    """Run `write(f)` on a temp file next to `path`, fsync it and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def host_snapshot(tree):
+    """Copy every array leaf to host memory.
+
+    The train step donates its buffers, so a checkpoint queued for the writer thread must
+    own its data rather than view device memory that the next step overwrites.
+    """
+    return jax.tree_util.tree_map(lambda a: np.array(a, copy=True) if eqx.is_array(a) else a, tree)
+
+
+########################################
+# Checkpoint Manager
+########################################
+
+class CheckpointManager:
+    """Saves (model, opt_state) plus epoch, RNG state and metric on a background thread.
+
+    Each checkpoint is `ckpt_<epoch>.eqx` with a `ckpt_<epoch>.json` written after it; the
+    JSON file marks the checkpoint as complete, so a crash mid-write never yields a
+    half-written checkpoint. The newest `keep` checkpoints are kept (`keep=0` keeps all of
+    them), plus `best.eqx`/`best.json` for the highest metric. If `best_model_path` is given, the best model is also exported
+    there as `export_model(model)` (e.g. the bare classifier, for the test scripts).
+    """
+
+    def __init__(self, directory, keep=3, best_model_path=None, export_model=None):
+        if keep < 0:
+            raise ValueError(f"keep must be >= 0 (0 keeps every checkpoint), got {keep}")
+        self.directory = directory
+        self.keep = keep
+        self.best_model_path = best_model_path
+        self.export_model = export_model or (lambda model: model)
+        os.makedirs(directory, exist_ok=True)
+        best = self._read_meta(os.path.join(directory, 'best.json'))
+        self.best_metric = best['metric'] if best else None
+        self.error = None
+        self.queue = queue.Queue(maxsize=2)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _read_meta(path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def save(self, epoch, model, opt_state, rng_state, metric=None):
+        """Queue a checkpoint; only the device-to-host copy happens on the caller's thread."""
+        self._raise_error()
+        meta = {'epoch': epoch, 'metric': metric, 'rng_state': rng_state}
+        self.queue.put((host_snapshot((model, opt_state)), meta))
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.wait()
+        self.queue.put(None)
+        self.thread.join()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("checkpoint write failed") from error
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            try:
+                self._write(*item)
+            except Exception as ex:
+                self.error = ex
+            finally:
+                self.queue.task_done()
+
+    def _write(self, tree, meta):
+        name = f"ckpt_{meta['epoch']:06d}"
+        _atomic_write(self._path(name + '.eqx'), lambda f: eqx.tree_serialise_leaves(f, tree))
+        _atomic_write(self._path(name + '.json'), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+        metric = meta['metric']
+        if metric is not None and (self.best_metric is None or metric > self.best_metric):
+            self.best_metric = metric
+            shutil.copyfile(self._path(name + '.eqx'), self._path('best.eqx.tmp'))
+            os.replace(self._path('best.eqx.tmp'), self._path('best.eqx'))
+            _atomic_write(self._path('best.json'), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+            if self.best_model_path:
+                model = self.export_model(tree[0])
+                _atomic_write(self.best_model_path, lambda f: eqx.tree_serialise_leaves(f, model))
+
+        for old in self.checkpoints()[:-self.keep] if self.keep else ():
+            os.remove(old + '.json')
+            if os.path.exists(old + '.eqx'):
+                os.remove(old + '.eqx')
+
+    def checkpoints(self):
+        """Completed checkpoints (path without extension), oldest first."""
+        return sorted(path[:-len('.json')] for path in glob.glob(self._path('ckpt_*.json')))
+
+    def restore(self, model, opt_state):
+        """Latest checkpoint as (model, opt_state, meta), using the arguments as templates.
+
+        Returns None when there is nothing to resume from.
+        """
+        completed = self.checkpoints()
+        if not completed:
+            return None
+        latest = completed[-1]
+        model, opt_state = eqx.tree_deserialise_leaves(latest + '.eqx', (model, opt_state))
+        return model, opt_state, self._read_meta(latest + '.json')
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+from qsam_embedding import idf_vector
+
+# Bump when the on-disk layout or the preprocessing changes, to invalidate old caches.
+CACHE_VERSION = 1
+ARRAYS = ('x_train', 'y_train', 'x_test', 'y_test', 'idf')
+
+
+def _file_digest(path, digest):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+
+def cache_key(train_path, test_path, seq_len, tokenizer_config):
+    """Hash of the source CSVs, tokenizer config, seq_len and cache version."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': CACHE_VERSION, 'seq_len': seq_len,
+                              'tokenizer': tokenizer_config}, sort_keys=True).encode('utf-8'))
+    _file_digest(train_path, digest)
+    _file_digest(test_path, digest)
+    return digest.hexdigest()[:16]
+
+
+def _build(train_path, test_path, seq_len, tokenizer_config, out_dir):
+    from quantum.dataset import build_dataset
+    from quantum.tokenizer.ngram import get_tokenizer
+    from quantum.filter.stw import stw_filter
+
+    token_filter = stw_filter if tokenizer_config['filter'] == 'stw' else None
+    tokenizer = get_tokenizer(ngram=tokenizer_config['ngram'], token_filter=token_filter,
+                              la=tokenizer_config['la'])
+    vocab, idf, train_data, test_data = build_dataset(train_path, test_path, tokenizer, seq_len, need_pad=True)
+
+    arrays = {
+        'x_train': np.asarray(train_data[0], dtype=np.int32),
+        'y_train': np.asarray(train_data[1], dtype=np.int32),
+        'x_test': np.asarray(test_data[0], dtype=np.int32),
+        'y_test': np.asarray(test_data[1], dtype=np.int32),
+        'idf': idf_vector(idf, vocab),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), array)
+    with open(os.path.join(out_dir, 'vocab.json'), 'w') as f:
+        json.dump(dict(vocab) if isinstance(vocab, Mapping) else list(vocab), f)
+
+
+def load_dataset(train_path, test_path, seq_len, cache_dir='./data/cache', ngram=(1,), token_filter='stw',
+                 la='en'):
+    """Preprocessed dataset from the cache, tokenizing the CSVs only on a cache miss.
+
+    Returns (vocab, idf, (x_train, y_train), (x_test, y_test)) like build_dataset, with
+    int32 token ids, labels and the idf vector memory-mapped read-only from .npy files.
+    """
+    tokenizer_config = {'ngram': list(ngram), 'filter': token_filter, 'la': la}
+    path = os.path.join(cache_dir, cache_key(train_path, test_path, seq_len, tokenizer_config))
+    if not os.path.isdir(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            _build(train_path, test_path, seq_len, tokenizer_config, tmp_dir)
+            os.rename(tmp_dir, path)
+        except OSError:
+            # Another process published the same key first; its copy is identical.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    data = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+    with open(os.path.join(path, 'vocab.json')) as f:
+        vocab = json.load(f)
+    return vocab, data['idf'], (data['x_train'], data['y_train']), (data['x_test'], data['y_test'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess QSAM CSVs into the memory-mapped dataset cache")
+    parser.add_argument('--train_path', type=str, default='./data/train.csv', help="Path to training CSV")
+    parser.add_argument('--test_path', type=str, default='./data/test.csv', help="Path to test CSV")
+    parser.add_argument('--cache_dir', type=str, default='./data/cache', help="Directory of cached datasets")
+    parser.add_argument('--seq_len', type=int, default=5, help="Sequence length for tokenization")
+    args = parser.parse_args()
+    vocab, idf, (x_train, _), (x_test, _) = load_dataset(args.train_path, args.test_path, args.seq_len,
+                                                         args.cache_dir)
+    print(f"vocab={len(vocab)} train={x_train.shape} test={x_test.shape} cached in {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from collections.abc import Mapping
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+import equinox as eqx
+
+
+########################################
+# Index-based Embeddings
+########################################
+
+def token_ids(x):
+    """Compact int32 token ids; the only per-sample data kept in memory (N x seq_len)."""
+    return np.asarray(x, dtype=np.int32)
+
+
+def idf_vector(idf, vocab):
+    """IDF weights as a dense |vocab| vector, from an array or a token -> idf mapping."""
+    if not isinstance(idf, Mapping):
+        return np.asarray(idf, dtype=np.float32)
+    vec = np.zeros(len(vocab), dtype=np.float32)
+    for token, value in idf.items():
+        index = vocab[token] if isinstance(vocab, Mapping) and token in vocab else token
+        vec[index] = value
+    return vec
+
+
+def onehot_embed(ids, vocab_size, dtype=jnp.float32):
+    """(..., seq_len) ids -> (..., seq_len, vocab_size) one-hot, built inside the jitted graph."""
+    return jax.nn.one_hot(ids, vocab_size, dtype=dtype)
+
+
+def tfidf_embed(ids, idf):
+    """(batch, seq_len) ids -> (batch, vocab_size) TF-IDF via a scatter-add per sequence."""
+    idf = jnp.asarray(idf)
+
+    def row(seq):
+        counts = jnp.zeros(idf.shape[0], dtype=idf.dtype).at[seq].add(1.0)
+        return counts / seq.shape[0] * idf
+
+    return jax.vmap(row)(ids)
+
+
+class OneHotInput(eqx.Module):
+    """Feeds int32 token ids to a classifier that expects one-hot inputs.
+
+    The one-hot tensor only exists per batch inside the compiled forward pass, so the
+    dataset costs O(N x seq_len) memory regardless of the vocabulary size. Only
+    `model` holds parameters; serialise `wrapper.model` to keep checkpoints compatible.
+    """
+    model: eqx.Module
+    vocab_size: int = eqx.field(static=True)
+
+    def __call__(self, ids):
+        return self.model(onehot_embed(ids, self.vocab_size))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+from jax import export
+
+
+########################################
+# Artifact Layout
+########################################
+
+def artifact_dir(model_path):
+    """`<model>.aot/` next to the checkpoint: forward_b<N>.bin per batch size, meta.json, xla_cache/."""
+    return model_path + '.aot'
+
+
+def checkpoint_digest(model_path):
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def use_compilation_cache(directory):
+    """Point jax's persistent compilation cache at `directory` (process-wide)."""
+    jax.config.update('jax_compilation_cache_dir', directory)
+    jax.config.update('jax_persistent_cache_min_compile_time_secs', 0)
+
+
+########################################
+# Export
+########################################
+
+def export_model(model, model_path, seq_len, batch_sizes):
+    """Lower the ids -> logits forward pass of `model` for each batch size and serialise it.
+
+    `model` takes (batch, seq_len) int32 token ids (e.g. a classifier wrapped in
+    OneHotInput). The weights are baked into the exported StableHLO, so loading needs
+    neither the model classes nor tensorcircuit. The executables are also compiled once
+    into the artifact's XLA cache, so a loader on the same jax version and platform skips
+    XLA compilation as well. meta.json is written last and records the checkpoint
+    digest; an artifact whose checkpoint changed is ignored by `load_forward`.
+    """
+    directory = artifact_dir(model_path)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    use_compilation_cache(os.path.join(directory, 'xla_cache'))
+
+    forward = jax.jit(lambda ids: model(ids))
+    for batch in batch_sizes:
+        exported = export.export(forward)(jax.ShapeDtypeStruct((batch, seq_len), jnp.int32))
+        with open(os.path.join(directory, f'forward_b{batch}.bin'), 'wb') as f:
+            f.write(exported.serialize())
+        # Populate the compilation cache with exactly what the loader will compile.
+        jax.block_until_ready(jax.jit(exported.call)(jnp.zeros((batch, seq_len), jnp.int32)))
+
+    meta = {'checkpoint': checkpoint_digest(model_path), 'seq_len': seq_len, 'batch_sizes': sorted(batch_sizes),
+            'jax': jax.__version__, 'platform': jax.default_backend()}
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return directory
+
+
+########################################
+# Loading
+########################################
+
+class AotForward:
+    """Exported forward passes by batch size; pads or splits any batch onto them."""
+
+    def __init__(self, exported, seq_len):
+        self.batch_sizes = sorted(exported)
+        self.seq_len = seq_len
+        self.calls = {batch: jax.jit(exported[batch].call) for batch in self.batch_sizes}
+
+    def __call__(self, ids):
+        ids = np.asarray(ids, dtype=np.int32)
+        if ids.shape[1:] != (self.seq_len,):
+            raise ValueError(f"exported for {self.seq_len} token ids per sample, got shape {ids.shape}")
+        largest = self.batch_sizes[-1]
+        outputs = []
+        for start in range(0, len(ids), largest):
+            chunk = ids[start:start + largest]
+            batch = next(b for b in self.batch_sizes if b >= len(chunk))
+            padded = np.zeros((batch, self.seq_len), dtype=np.int32)
+            padded[:len(chunk)] = chunk
+            outputs.append(np.asarray(self.calls[batch](padded))[:len(chunk)])
+        return np.concatenate(outputs)
+
+
+def load_forward(model_path, cache=True):
+    """AotForward from the artifact next to `model_path`, or None if it is missing or stale.
+
+    Stale means the checkpoint file changed since export, or the artifact was exported
+    by another jax version or platform.
+    """
+    directory = artifact_dir(model_path)
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path) or not os.path.exists(model_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if (meta['checkpoint'] != checkpoint_digest(model_path) or meta['jax'] != jax.__version__
+            or meta['platform'] != jax.default_backend()):
+        return None
+    if cache:
+        use_compilation_cache(os.path.join(directory, 'xla_cache'))
+    exported = {}
+    for batch in meta['batch_sizes']:
+        with open(os.path.join(directory, f'forward_b{batch}.bin'), 'rb') as f:
+            exported[batch] = export.deserialize(bytearray(f.read()))
+    return AotForward(exported, meta['seq_len'])
+
+
+def build_model(kind, model_path, vocab_size, n_qubits, n_classes, seed):
+    """Deserialised classifier of `kind` ('tqmltksam' or 'tqmlsam') wrapped to take token ids."""
+    import equinox as eqx
+    from qsam_embedding import OneHotInput
+    if kind == 'tqmltksam':
+        from tqmltksam_model import tQMLTKSAMClassifier as Classifier
+    else:
+        from quantum.model import tQTKSAMClassifier as Classifier
+    model = Classifier(embed_dim=vocab_size, n_qubits=n_qubits, n_classes=n_classes, key=jax.random.PRNGKey(seed))
+    return OneHotInput(eqx.tree_deserialise_leaves(model_path, model), vocab_size)
+
+
+########################################
+# Cold-start Benchmark
+########################################
+
+def run_worker(args):
+    """One cold start in a fresh process: load, then the first forward pass of one batch."""
+    start = time.perf_counter()
+    ids = np.zeros((args.batch_sizes[0], args.seq_len), dtype=np.int32)
+    if args.worker == 'aot':
+        predict = load_forward(args.model_path)
+        if predict is None:
+            raise SystemExit("no usable artifact; run with --export first")
+        loaded = time.perf_counter()
+        predict(ids)
+    else:
+        import equinox as eqx
+        model = build_model(args.model, args.model_path, args.vocab_size, args.n_qubits, args.n_classes,
+                            args.seed)
+        loaded = time.perf_counter()
+        jax.block_until_ready(eqx.filter_jit(lambda model, ids: model(ids))(model, jnp.asarray(ids)))
+    done = time.perf_counter()
+    print(json.dumps({'load_s': loaded - start, 'first_call_s': done - loaded, 'total_s': done - start}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ahead-of-time export of the QSAM forward pass and a "
+                                                 "cold-start benchmark")
+    parser.add_argument('--model', type=str, default='tqmltksam', choices=['tqmltksam', 'tqmlsam'],
+                        help="Classifier stored in the checkpoint")
+    parser.add_argument('--model_path', type=str, default='./model/tQMLTKSAM.model',
+                        help="Checkpoint; the artifact is written to <model_path>.aot")
+    parser.add_argument('--vocab_size', type=int, required=True, help="Vocabulary size of the checkpoint")
+    parser.add_argument('--n_qubits', type=int, default=6, help="Number of qubits used in the quantum circuits")
+    parser.add_argument('--n_classes', type=int, default=2, help="Number of output classes")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed used to build the model skeleton")
+    parser.add_argument('--seq_len', type=int, default=5, help="Token ids per sample")
+    parser.add_argument('--batch_sizes', type=lambda s: [int(b) for b in s.split(',')], default=[64],
+                        help="Comma-separated batch sizes to export")
+    parser.add_argument('--export', action='store_true', help="Export the artifact")
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help="Cold starts (fresh processes) to time per loading path")
+    parser.add_argument('--worker', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return
+    if args.export:
+        start = time.perf_counter()
+        model = build_model(args.model, args.model_path, args.vocab_size, args.n_qubits, args.n_classes, args.seed)
+        directory = export_model(model, args.model_path, args.seq_len, args.batch_sizes)
+        print(f"exported batch sizes {args.batch_sizes} to {directory} in {time.perf_counter() - start:.2f}s")
+    if args.benchmark:
+        argv = [f'--{name}={value}' for name, value in vars(args).items()
+                if name not in ('export', 'benchmark', 'worker', 'batch_sizes')]
+        argv.append('--batch_sizes=' + ','.join(map(str, args.batch_sizes)))
+        # 'process' is the whole cold start as a worker sees it, including interpreter and imports.
+        print(f"{'path':>8} {'load (s)':>9} {'first call (s)':>15} {'total (s)':>10} {'process (s)':>12}")
+        for path in ('trace', 'aot'):
+            runs = []
+            for _ in range(args.benchmark):
+                start = time.perf_counter()
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', path] + argv,
+                                     check=True, capture_output=True, text=True).stdout
+                runs.append(dict(json.loads(out.splitlines()[-1]), process_s=time.perf_counter() - start))
+            print(f"{path:>8} " + ' '.join(f"{statistics.median(run[key] for run in runs):>{width}.3f}"
+                                           for key, width in (('load_s', 9), ('first_call_s', 15),
+                                                              ('total_s', 10), ('process_s', 12))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+import equinox as eqx
+import tensorcircuit as tc
+
+
+########################################
+# Per-token Feature Tables
+########################################
+
+def model_fingerprint(model):
+    """Hash of the attention weights, circuit size and simulation dtype of a classifier.
+
+    Any change to the deserialised checkpoint (or to how its circuits are simulated)
+    changes the fingerprint, which is what invalidates a feature table.
+    """
+    attention = model.attention
+    digest = hashlib.sha256()
+    digest.update(f'{attention.ee_layer.n_qubits}:{attention.d_k}:{tc.dtypestr}'.encode('utf-8'))
+    for leaf in jax.tree_util.tree_leaves(eqx.filter(attention, eqx.is_array)):
+        leaf = np.asarray(leaf)
+        digest.update(f'{leaf.shape}{leaf.dtype}'.encode('utf-8'))
+        digest.update(leaf.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def build_feature_table(model, chunk=256):
+    """Entanglement entropy and value vector of every vocabulary token.
+
+    With one-hot inputs the Q/K/V projections of token t are column t of the weight
+    matrices, so the circuit input, and hence its entropy, depends on the token alone:
+    one circuit per vocabulary entry replaces one per token occurrence. Returns
+    (entropy (|vocab|,), values (|vocab|, d)).
+    """
+    attention = model.attention
+    q = attention.qs_layer.weight.T
+    k = attention.ks_layer.weight.T
+    qk = jnp.concatenate((q, k), axis=-1)
+    vocab_size = qk.shape[0]
+    # Pad to whole chunks so every chunk reuses one compiled circuit batch.
+    padded = jnp.pad(qk, ((0, -vocab_size % chunk), (0, 0)))
+    entropy = [np.asarray(attention.ee_layer(padded[start:start + chunk]))
+               for start in range(0, padded.shape[0], chunk)]
+    entropy = np.concatenate(entropy)[:vocab_size]
+    values = np.asarray(attention.vs_layer.weight.T)
+    return entropy, values
+
+
+class CachedAttention(eqx.Module):
+    """Drop-in for `QSAM` over precomputed per-token features.
+
+    Takes int32 token ids (batch, seq_len) where QSAM takes their one-hot rows, and
+    follows QSAM.__call__ from the entanglement entropies on: softmax over the
+    sequence, then the score-weighted sum of the value vectors. Only valid for frozen
+    weights and one-hot token inputs.
+    """
+    entropy: jax.Array
+    values: jax.Array
+    d_k: int = eqx.field(static=True)
+    fingerprint: str = eqx.field(static=True)
+
+    def __call__(self, ids):
+        attention_scores = jax.nn.softmax(self.entropy[ids] / jnp.sqrt(self.d_k), axis=-1)
+        attention_scores = jnp.expand_dims(attention_scores, axis=-2)  # (batch, 1, seq_len)
+        result = jnp.matmul(attention_scores, self.values[ids])       # (batch, 1, embed_dim)
+        return jnp.squeeze(result, axis=-2)
+
+
+def check_equivalence(model, cached, samples=4, seq_len=5, atol=1e-4, seed=0):
+    """Compare `cached` on random token ids with the uncached `model` on their one-hot rows.
+
+    Raises ValueError when any logit differs by more than `atol`; returns the largest
+    difference otherwise.
+    """
+    vocab_size = model.attention.d_k
+    ids = jax.random.randint(jax.random.PRNGKey(seed), (samples, seq_len), 0, vocab_size)
+    expected = model(jax.nn.one_hot(ids, vocab_size))
+    difference = float(jnp.max(jnp.abs(cached(ids) - expected)))
+    if not difference <= atol:
+        raise ValueError(f"feature table {cached.attention.fingerprint} disagrees with the uncached model: "
+                         f"max |logit difference| {difference:.2e} > {atol:.0e}")
+    return difference
+
+
+def feature_cache_path(model_path):
+    return model_path + '.features.npz'
+
+
+def cached_classifier(model, cache_path=None, chunk=256, check=4):
+    """`model` with its attention replaced by a CachedAttention, taking token ids.
+
+    The classifier's own __call__ (norm, fc, ...) runs unchanged on the cached
+    attention output. The table on disk carries the fingerprint of the weights it was
+    built from; a different checkpoint (or dtype) rebuilds it and overwrites the file.
+    `check` samples are compared with the uncached model (0 skips the check).
+    """
+    fingerprint = model_fingerprint(model)
+    table = None
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            if str(data['fingerprint']) == fingerprint:
+                table = data['entropy'], data['values']
+    if table is None:
+        table = build_feature_table(model, chunk)
+        if cache_path:
+            tmp_path = cache_path + '.tmp.npz'
+            np.savez(tmp_path, entropy=table[0], values=table[1], fingerprint=np.str_(fingerprint))
+            os.replace(tmp_path, cache_path)
+    entropy, values = table
+    attention = CachedAttention(jnp.asarray(entropy), jnp.asarray(values), model.attention.d_k, fingerprint)
+    cached = eqx.tree_at(lambda m: m.attention, model, attention)
+    if check:
+        check_equivalence(model, cached, samples=check)
+    return cached
+
+
+########################################
+# Benchmark
+########################################
+
+def main():
+    from tqmltksam_model import tQMLTKSAMClassifier
+
+    parser = argparse.ArgumentParser(description="Circuit-per-token vs. feature-table inference for tQMLTKSAM")
+    parser.add_argument('--model_path', type=str, default=None,
+                        help="Saved tQMLTKSAM model (random weights when omitted)")
+    parser.add_argument('--vocab_size', type=int, default=500, help="Vocabulary size")
+    parser.add_argument('--n_qubits', type=int, default=6, help="Number of qubits used in the quantum circuits")
+    parser.add_argument('--n_classes', type=int, default=2, help="Number of output classes")
+    parser.add_argument('--seq_len', type=int, default=5, help="Tokens per sample")
+    parser.add_argument('--batch', type=int, default=256, help="Samples per forward pass")
+    parser.add_argument('--repeats', type=int, default=10, help="Timed forward passes per variant")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    model = tQMLTKSAMClassifier(embed_dim=args.vocab_size, n_qubits=args.n_qubits, n_classes=args.n_classes,
+                                key=jax.random.PRNGKey(args.seed))
+    if args.model_path:
+        model = eqx.tree_deserialise_leaves(args.model_path, model)
+    ids = jax.random.randint(jax.random.PRNGKey(args.seed + 1), (args.batch, args.seq_len), 0, args.vocab_size)
+
+    start = time.perf_counter()
+    cached = cached_classifier(model, feature_cache_path(args.model_path) if args.model_path else None, check=0)
+    print(f"feature table for {args.vocab_size} tokens built in {time.perf_counter() - start:.2f}s")
+
+    outputs = {}
+    for name, forward in (('circuits', eqx.filter_jit(lambda ids: model(jax.nn.one_hot(ids, args.vocab_size)))),
+                          ('table', eqx.filter_jit(lambda ids: cached(ids)))):
+        outputs[name] = jax.block_until_ready(forward(ids))
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            jax.block_until_ready(forward(ids))
+        elapsed = (time.perf_counter() - start) / args.repeats
+        print(f"{name:>8}: {elapsed * 1000:9.2f} ms per batch of {args.batch} ({args.batch / elapsed:.0f} samples/s)")
+    print(f"max |logit difference| {float(jnp.max(jnp.abs(outputs['circuits'] - outputs['table']))):.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import contextlib
+import json
+import os
+import time
+from collections import defaultdict
+
+import jax
+import equinox as eqx
+
+from qsam_training import loss_fn
+
+
+########################################
+# Phase Timers
+########################################
+
+class Profiler:
+    """Per-phase wall-clock timers for the QSAM training loop.
+
+    Phases are closed with `jax.block_until_ready`, so asynchronous dispatch does not
+    move time from one phase into the next. The first step for each new input shape is
+    booked as `compile` (trace + XLA compile + first run), later ones as `step`. With
+    `breakdown`, one batch per epoch is additionally re-run through separately jitted
+    forward, value-and-grad and update functions to split the fused step into
+    `forward`, `grad` (backward only) and `update`.
+
+    `trace_epochs=(first, last)` captures a `jax.profiler` trace of those epochs into
+    `trace_dir`. Per-epoch records go to `jsonl_path` (one JSON object per line) and the
+    running totals to `prometheus_path` in the Prometheus text format.
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None, trace_dir=None, trace_epochs=None,
+                 breakdown=False):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.trace_dir = trace_dir
+        self.trace_epochs = trace_epochs
+        self.breakdown = breakdown
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.epoch_totals = defaultdict(float)
+        self.epoch_counts = defaultdict(int)
+        self.records = []
+        self.epoch = None
+        self.tracing = False
+        self._shapes = set()
+        self._breakdown_fns = None
+
+    def add(self, name, seconds):
+        self.totals[name] += seconds
+        self.counts[name] += 1
+        self.epoch_totals[name] += seconds
+        self.epoch_counts[name] += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, fn, *args):
+        """Call `fn(*args)` and book it under `name` once its outputs are ready."""
+        start = time.perf_counter()
+        out = jax.block_until_ready(fn(*args))
+        self.add(name, time.perf_counter() - start)
+        return out
+
+    def step_phase(self, *arrays):
+        """'compile' the first time a batch shape is seen, 'step' afterwards."""
+        key = tuple((a.shape, str(a.dtype)) for a in arrays)
+        if key in self._shapes:
+            return 'step'
+        self._shapes.add(key)
+        return 'compile'
+
+    def profile_step(self, optimizer, model, opt_state, x, y):
+        """Time forward, backward and update of one batch as separate jitted calls."""
+        if self._breakdown_fns is None:
+            forward = eqx.filter_jit(loss_fn)
+            value_and_grad = eqx.filter_jit(eqx.filter_value_and_grad(loss_fn))
+
+            @eqx.filter_jit
+            def update(grads, opt_state, model):
+                updates, opt_state = optimizer.update(grads, opt_state, model)
+                return eqx.apply_updates(model, updates), opt_state
+
+            self._breakdown_fns = forward, value_and_grad, update
+        forward, value_and_grad, update = self._breakdown_fns
+
+        # Compile outside the timers; only warm calls are booked.
+        _, grads = jax.block_until_ready(value_and_grad(model, x, y))
+        jax.block_until_ready((forward(model, x, y), update(grads, opt_state, model)))
+
+        start = time.perf_counter()
+        jax.block_until_ready(forward(model, x, y))
+        forward_time = time.perf_counter() - start
+        start = time.perf_counter()
+        _, grads = jax.block_until_ready(value_and_grad(model, x, y))
+        grad_time = time.perf_counter() - start
+        self.add('forward', forward_time)
+        self.add('grad', max(grad_time - forward_time, 0.0))
+        self.timed('update', update, grads, opt_state, model)
+
+    ########################################
+    # Epoch Boundaries and Trace Capture
+    ########################################
+
+    def start_epoch(self, epoch):
+        self.epoch = epoch
+        self.epoch_totals.clear()
+        self.epoch_counts.clear()
+        if self.trace_epochs and epoch == self.trace_epochs[0] and not self.tracing:
+            jax.profiler.start_trace(self.trace_dir or './profile')
+            self.tracing = True
+
+    def end_epoch(self, **extra):
+        if self.tracing and self.epoch >= self.trace_epochs[1]:
+            jax.profiler.stop_trace()
+            self.tracing = False
+        record = {'epoch': self.epoch,
+                  'phases': {name: {'seconds': self.epoch_totals[name], 'count': self.epoch_counts[name]}
+                             for name in sorted(self.epoch_totals)}}
+        steps = self.epoch_counts.get('step', 0)
+        if steps:
+            record['mean_step_s'] = self.epoch_totals['step'] / steps
+        record.update(extra)
+        self.records.append(record)
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+        return record
+
+    def close(self):
+        if self.tracing:
+            jax.profiler.stop_trace()
+            self.tracing = False
+
+    ########################################
+    # Export
+    ########################################
+
+    def prometheus_text(self):
+        lines = ['# HELP qsam_phase_seconds_total Wall-clock seconds spent per training phase.',
+                 '# TYPE qsam_phase_seconds_total counter']
+        lines += [f'qsam_phase_seconds_total{{phase="{name}"}} {self.totals[name]:.6f}'
+                  for name in sorted(self.totals)]
+        lines += ['# HELP qsam_phase_calls_total Number of timed calls per training phase.',
+                  '# TYPE qsam_phase_calls_total counter']
+        lines += [f'qsam_phase_calls_total{{phase="{name}"}} {self.counts[name]}' for name in sorted(self.counts)]
+        lines += ['# HELP qsam_epoch Last completed epoch.', '# TYPE qsam_epoch gauge',
+                  f'qsam_epoch {self.epoch or 0}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """One line per phase: total seconds, calls and mean milliseconds per call."""
+        rows = [f"{'phase':>10} {'total (s)':>10} {'calls':>7} {'mean (ms)':>10}"]
+        for name in sorted(self.totals, key=self.totals.get, reverse=True):
+            rows.append(f"{name:>10} {self.totals[name]:>10.3f} {self.counts[name]:>7} "
+                        f"{self.totals[name] / self.counts[name] * 1000:>10.2f}")
+        return '\n'.join(rows)
+
+
+def parse_epoch_range(spec):
+    """'3' -> (3, 3), '3-5' -> (3, 5); None stays None."""
+    if not spec:
+        return None
+    first, _, last = spec.partition('-')
+    return int(first), int(last or first)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+
+def run_worker(args):
+    from qsam_training import set_host_device_count
+    set_host_device_count(args.worker)
+
+    import jax
+    import jax.numpy as jnp
+    from quantum.model import tQTKSAMClassifier
+    from qsam_embedding import OneHotInput
+    from qsam_training import train
+
+    rng = np.random.default_rng(args.seed)
+    x = rng.integers(0, args.vocab_size, size=(args.samples, args.seq_len), dtype=np.int32)
+    y = rng.integers(0, 2, size=args.samples, dtype=np.int32)
+    model = OneHotInput(tQTKSAMClassifier(embed_dim=args.vocab_size, n_qubits=args.n_qubits, n_classes=2,
+                                          key=jax.random.PRNGKey(args.seed)), args.vocab_size)
+    _, _, history = train(model, x, y, x[:args.batch_size], y[:args.batch_size], jnp.asarray,
+                          epochs=args.epochs, batch_size=args.batch_size, eval_every=args.epochs,
+                          data_parallel=args.worker > 1)
+    # The first epoch includes compilation; report it separately from the steady state.
+    steady = [record['time'] for record in history[1:]] or [history[0]['time']]
+    print(json.dumps({'devices': jax.local_device_count(), 'first_epoch_s': history[0]['time'],
+                      'epoch_s': float(np.median(steady))}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Epoch time of data-parallel QSAM training vs CPU device count")
+    parser.add_argument('--devices', type=str, default='1,2,4,8', help="Comma-separated device counts to time")
+    parser.add_argument('--n_qubits', type=int, default=6, help="Number of qubits of the classifier")
+    parser.add_argument('--vocab_size', type=int, default=64, help="Vocabulary size of the synthetic data")
+    parser.add_argument('--seq_len', type=int, default=5, help="Token ids per sample")
+    parser.add_argument('--samples', type=int, default=512, help="Synthetic training samples")
+    parser.add_argument('--batch_size', type=int, default=64, help="Global minibatch size")
+    parser.add_argument('--epochs', type=int, default=4, help="Epochs per device count (first one compiles)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return
+
+    # XLA fixes the host device count when the backend starts, so each count runs in its own process.
+    argv = [f'--{name}={value}' for name, value in vars(args).items() if name not in ('devices', 'worker')]
+    baseline = None
+    print(f"{'devices':>8} {'first epoch (s)':>16} {'epoch (s)':>10} {'speedup':>8}")
+    for n in [int(count) for count in args.devices.split(',')]:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(n)] + argv,
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        baseline = baseline or result['epoch_s']
+        print(f"{result['devices']:>8} {result['first_epoch_s']:>16.2f} {result['epoch_s']:>10.3f} "
+              f"{baseline / result['epoch_s']:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+import argparse
+import contextlib
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+import tensorcircuit as tc
+
+
+########################################
+# Simulation Settings
+########################################
+
+@dataclasses.dataclass(frozen=True)
+class SimulationConfig:
+    """How the QSAM circuits are simulated.
+
+    `contractor` is 'greedy', 'cotengra' (hyper-optimised paths, needs cotengra) or the
+    name of any other opt_einsum path algorithm.
+    """
+    backend: str = 'jax'
+    dtype: str = 'complex64'
+    contractor: str = 'greedy'
+    cache_paths: bool = True
+
+
+class CachedPathOptimizer:
+    """Memoises contraction paths per tensor-network shape.
+
+    tensorcircuit relabels edges deterministically before asking for a path, so the same
+    circuit layout always yields the same (inputs, output, sizes) key and the search only
+    runs once per shape instead of on every trace or eager call.
+    """
+
+    def __init__(self, optimizer, maxsize=1024):
+        self.optimizer = optimizer
+        self.maxsize = maxsize
+        self.paths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.search_time = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, inputs, output, size_dict, memory_limit=None):
+        key = (tuple(tuple(sorted(edges)) for edges in inputs), tuple(sorted(output)),
+               tuple(sorted(size_dict.items())), memory_limit)
+        with self.lock:
+            if key in self.paths:
+                self.paths.move_to_end(key)
+                self.hits += 1
+                return list(self.paths[key])
+        start = time.perf_counter()
+        path = [tuple(pair) for pair in self.optimizer(inputs, output, size_dict, memory_limit=memory_limit)]
+        with self.lock:
+            self.search_time += time.perf_counter() - start
+            self.misses += 1
+            self.paths[key] = path
+            while len(self.paths) > self.maxsize:
+                self.paths.popitem(last=False)
+        return list(path)
+
+    def metrics(self):
+        with self.lock:
+            return {'paths': len(self.paths), 'hits': self.hits, 'misses': self.misses,
+                    'search_time_s': self.search_time}
+
+
+def simulation_config(args):
+    """SimulationConfig from the --dtype/--contractor command-line options."""
+    return SimulationConfig(dtype=args.dtype, contractor=args.contractor)
+
+
+_path_optimizers = {}
+
+
+def path_optimizer(config):
+    """Path optimizer for `config`, shared by every model using the same contractor."""
+    key = (config.contractor, config.cache_paths)
+    if key not in _path_optimizers:
+        if config.contractor == 'cotengra':
+            import cotengra
+            optimizer = cotengra.ReusableHyperOptimizer(methods=['greedy', 'kahypar'], minimize='combo',
+                                                        max_time=30, max_repeats=64, progbar=False)
+        else:
+            import opt_einsum
+            optimizer = getattr(opt_einsum.paths, config.contractor)
+        _path_optimizers[key] = CachedPathOptimizer(optimizer) if config.cache_paths else optimizer
+    return _path_optimizers[key]
+
+
+def configure_simulation(config=None):
+    """Set the tensorcircuit backend, dtype and contractor globally; returns the backend."""
+    config = config or SimulationConfig()
+    backend = tc.set_backend(config.backend)
+    tc.set_dtype(config.dtype)
+    tc.set_contractor('custom', optimizer=path_optimizer(config), preprocessing=True)
+    return backend
+
+
+@contextlib.contextmanager
+def simulation_scope(config):
+    """Temporarily apply `config`; None keeps the global settings.
+
+    Enter it outside of any jax trace: switching to complex128 flips jax_enable_x64.
+    """
+    if config is None:
+        yield
+        return
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(tc.runtime_backend(config.backend))
+        stack.enter_context(tc.runtime_dtype(config.dtype))
+        stack.enter_context(tc.runtime_contractor('custom', optimizer=path_optimizer(config),
+                                                  preprocessing=True))
+        yield
+
+
+########################################
+# Benchmark
+########################################
+
+def entropy_circuit(n_qubits, features, weights):
+    """The EntanglementEntropy circuit: ZZ feature map, then an RX layer on half the qubits."""
+    c = tc.Circuit(n_qubits)
+    for i in range(n_qubits):
+        c.h(i)
+        c.rz(i, theta=features[i])
+        c.cx(i, (i + 1) % n_qubits)
+    for i in range(n_qubits // 2):
+        c.rx(i, theta=weights[i])
+    return c
+
+
+def benchmark(config, n_qubits, batch, repeats):
+    """Cold (path search + compile) and warm times of a batched entropy forward pass."""
+    with simulation_scope(config):
+        def entropy(x, weights):
+            psi = entropy_circuit(n_qubits, x, weights).state()
+            rho = tc.quantum.reduced_density_matrix(psi, cut=n_qubits // 2)
+            return jnp.real(-jnp.trace(rho * jnp.log(rho + 1e-12)))
+
+        forward = jax.jit(jax.vmap(entropy, in_axes=(0, None)))
+        x = jnp.asarray(np.random.default_rng(0).normal(size=(batch, n_qubits)), dtype=jnp.float32)
+        weights = jnp.ones(n_qubits // 2, dtype=jnp.float32)
+
+        start = time.perf_counter()
+        forward(x, weights).block_until_ready()
+        cold = time.perf_counter() - start
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            forward(x, weights).block_until_ready()
+            times.append(time.perf_counter() - start)
+
+        # A second trace of the same shape, e.g. a new model instance, reuses the cached path.
+        start = time.perf_counter()
+        jax.jit(jax.vmap(entropy, in_axes=(0, None)))(x, weights).block_until_ready()
+        retrace = time.perf_counter() - start
+    return cold, float(np.median(times)), retrace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tensorcircuit settings for the QSAM entropy circuit")
+    parser.add_argument('--n_qubits', type=str, default='4,6,8,10,12', help="Comma-separated qubit counts")
+    parser.add_argument('--dtypes', type=str, default='complex64,complex128', help="Comma-separated dtypes")
+    parser.add_argument('--contractors', type=str, default='greedy', help="Comma-separated contractors")
+    parser.add_argument('--no_cache', action='store_true', help="Disable the contraction path cache")
+    parser.add_argument('--batch', type=int, default=64, help="Circuits per forward pass")
+    parser.add_argument('--repeats', type=int, default=10, help="Warm forward passes to time")
+    args = parser.parse_args()
+
+    print(f"{'contractor':>10} {'dtype':>10} {'qubits':>6} {'cold (s)':>9} {'warm (ms)':>10} "
+          f"{'retrace (s)':>11} {'paths':>6} {'hits':>6}")
+    for contractor in args.contractors.split(','):
+        for dtype in args.dtypes.split(','):
+            for n_qubits in [int(n) for n in args.n_qubits.split(',')]:
+                config = SimulationConfig(dtype=dtype, contractor=contractor, cache_paths=not args.no_cache)
+                cold, warm, retrace = benchmark(config, n_qubits, args.batch, args.repeats)
+                optimizer = path_optimizer(config)
+                metrics = optimizer.metrics() if isinstance(optimizer, CachedPathOptimizer) else {}
+                print(f"{contractor:>10} {dtype:>10} {n_qubits:>6} {cold:>9.2f} {warm * 1000:>10.2f} "
+                      f"{retrace:>11.2f} {metrics.get('paths', '-'):>6} {metrics.get('hits', '-'):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from qsam_dataset_cache import load_dataset
+
+# Trial settings and their defaults, matching the hard-coded values of tQMLSAM_train.py.
+DEFAULTS = {'learning_rate': 0.05, 'epochs': 100, 'batch_size': 6, 'n_qubits': 6, 'eval_every': 5, 'seed': 0}
+
+
+########################################
+# Search Spaces
+########################################
+
+def sample_value(space, rng):
+    """A list is a categorical choice; {'low', 'high'[, 'log', 'int']} a numeric range."""
+    if isinstance(space, list):
+        return space[rng.integers(len(space))]
+    low, high = space['low'], space['high']
+    value = float(np.exp(rng.uniform(np.log(low), np.log(high)))) if space.get('log') else rng.uniform(low, high)
+    return int(round(value)) if space.get('int') else float(value)
+
+
+def expand_spec(spec):
+    """Trial configs for a {'method': 'grid'|'random', 'params': {...}, 'trials': N} spec."""
+    params = spec['params']
+    if spec.get('method', 'grid') == 'grid':
+        names = sorted(params)
+        grids = [params[name] if isinstance(params[name], list) else [params[name]] for name in names]
+        configs = [dict(zip(names, values)) for values in itertools.product(*grids)]
+    else:
+        rng = np.random.default_rng(spec.get('seed', 0))
+        configs = [{name: sample_value(space, rng) for name, space in params.items()}
+                   for _ in range(spec['trials'])]
+    return [{**DEFAULTS, **config} for config in configs]
+
+
+########################################
+# Trials
+########################################
+
+class StopTrial(Exception):
+    pass
+
+
+def _init_worker(threads, compile_cache, worker_ids):
+    # Several trials share the machine: pin each worker to its own `threads` cores so the
+    # XLA CPU thread pools of concurrent trials don't oversubscribe them. Affinity is
+    # inherited by the threads the runtime starts later. (XLA_FLAGS is set by the parent
+    # before spawning: workers import jax while unpickling this module, before this runs.)
+    if threads and hasattr(os, 'sched_setaffinity'):
+        with worker_ids.get_lock():
+            worker_id = worker_ids.value
+            worker_ids.value += 1
+        cores = sorted(os.sched_getaffinity(0))
+        start = (worker_id * threads) % len(cores)
+        os.sched_setaffinity(0, (cores + cores)[start:start + min(threads, len(cores))])
+    import jax
+    if compile_cache:
+        # Trials with the same shapes load each other's compiled steps instead of recompiling.
+        jax.config.update('jax_compilation_cache_dir', compile_cache)
+        jax.config.update('jax_persistent_cache_min_compile_time_secs', 0)
+
+
+def should_stop(reports, trial_id, epoch, accuracy, min_trials, grace_epochs):
+    """Median stopping rule: stop when below the median of other trials at the same epoch."""
+    if epoch < grace_epochs:
+        return False
+    others = [acc for (other, other_epoch), acc in reports.items() if other_epoch == epoch and other != trial_id]
+    return len(others) >= min_trials and accuracy < statistics.median(others)
+
+
+def run_trial(trial_id, config, data_args, reports, min_trials, grace_epochs):
+    import jax
+    import jax.numpy as jnp
+    from quantum.model import tQTKSAMClassifier
+    from qsam_embedding import OneHotInput, token_ids
+    from qsam_training import train
+
+    # Memory-mapped from the cache the parent process built; no re-tokenization.
+    vocab, _, (x_train, y_train), (x_test, y_test) = load_dataset(**data_args)
+    model = OneHotInput(tQTKSAMClassifier(embed_dim=len(vocab), n_qubits=config['n_qubits'], n_classes=2,
+                                          key=jax.random.PRNGKey(config['seed'])), len(vocab))
+    result = {'trial': trial_id, **config, 'best_acc': None, 'best_epoch': None, 'last_epoch': 0,
+              'stopped_early': False}
+
+    def on_eval(epoch, model, test_loss, test_acc):
+        reports[(trial_id, epoch)] = test_acc
+        result['last_epoch'] = epoch
+        if result['best_acc'] is None or test_acc > result['best_acc']:
+            result['best_acc'], result['best_epoch'] = test_acc, epoch
+        if should_stop(reports, trial_id, epoch, test_acc, min_trials, grace_epochs):
+            raise StopTrial()
+
+    start = time.time()
+    try:
+        train(model, token_ids(x_train), np.asarray(y_train), token_ids(x_test), np.asarray(y_test), jnp.asarray,
+              learning_rate=config['learning_rate'], epochs=config['epochs'], batch_size=config['batch_size'],
+              eval_every=config['eval_every'], seed=config['seed'], on_eval=on_eval)
+    except StopTrial:
+        result['stopped_early'] = True
+    result['time'] = time.time() - start
+    return result
+
+
+########################################
+# Results
+########################################
+
+COLUMNS = ['trial', 'learning_rate', 'batch_size', 'epochs', 'n_qubits', 'best_acc', 'best_epoch', 'last_epoch',
+           'stopped_early', 'time']
+
+
+def write_results(results, path):
+    results = sorted(results, key=lambda r: -1 if r['best_acc'] is None else r['best_acc'], reverse=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    print(' '.join(f'{column:>13}' for column in COLUMNS))
+    for r in results:
+        print(' '.join(f'{r[column]:>13.4g}' if isinstance(r[column], float) else f'{str(r[column]):>13}'
+                       for column in COLUMNS))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the tQMLSAM model")
+    parser.add_argument('--spec', type=str, required=True,
+                        help="JSON sweep spec: {'method': 'grid'|'random', 'trials': N, 'params': {...}}")
+    parser.add_argument('--train_path', type=str, default='./data/train.csv', help="Path to training CSV")
+    parser.add_argument('--test_path', type=str, default='./data/test.csv', help="Path to test CSV")
+    parser.add_argument('--cache_dir', type=str, default='./data/cache', help="Directory of cached datasets")
+    parser.add_argument('--seq_len', type=int, default=5, help="Sequence length for tokenization")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Concurrent trials")
+    parser.add_argument('--threads_per_trial', type=int, default=1,
+                        help="CPU cores each trial is pinned to (1 avoids oversubscribing the cores; 0 disables "
+                             "pinning)")
+    parser.add_argument('--compile_cache', type=str, default='./model/jax_cache',
+                        help="Persistent XLA compilation cache shared by the trials ('' disables it)")
+    parser.add_argument('--min_trials', type=int, default=3,
+                        help="Trials that must have reported an epoch before stopping others at it")
+    parser.add_argument('--grace_epochs', type=int, default=10, help="Never stop a trial before this epoch")
+    parser.add_argument('--results', type=str, default='./model/sweep_results.csv', help="Results table (CSV)")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        configs = expand_spec(json.load(f))
+    data_args = {'train_path': args.train_path, 'test_path': args.test_path, 'seq_len': args.seq_len,
+                 'cache_dir': args.cache_dir}
+    load_dataset(**data_args)
+    print(f"{len(configs)} trials on {args.workers} workers")
+
+    # jax is not fork-safe, so trials run in spawned processes. They inherit this
+    # environment at start-up, i.e. before they import jax.
+    if args.threads_per_trial == 1 and 'xla_cpu_multi_thread_eigen' not in os.environ.get('XLA_FLAGS', ''):
+        os.environ['XLA_FLAGS'] = (os.environ.get('XLA_FLAGS', '') + ' --xla_cpu_multi_thread_eigen=false').strip()
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        reports = manager.dict()
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(args.threads_per_trial, args.compile_cache, context.Value('i', 0))) as pool:
+            futures = [pool.submit(run_trial, trial_id, config, data_args, reports, args.min_trials,
+                                   args.grace_epochs) for trial_id, config in enumerate(configs)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"trial {result['trial']} done: best_acc={result['best_acc']} "
+                      f"epochs={result['last_epoch']} stopped_early={result['stopped_early']}")
+
+    os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+    write_results(results, args.results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import functools
+import os
+import resource
+import time
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+import equinox as eqx
+import optax
+
+
+########################################
+# Minibatching
+########################################
+
+def minibatches(rng, n_samples, batch_size, shuffle=True):
+    """Yield index arrays covering `n_samples` in (optionally shuffled) batches of `batch_size`."""
+    order = rng.permutation(n_samples) if shuffle else np.arange(n_samples)
+    for start in range(0, n_samples, batch_size):
+        yield order[start:start + batch_size]
+
+
+def peak_memory_mb():
+    """Peak device memory if the backend reports it, else peak host RSS."""
+    stats = jax.devices()[0].memory_stats() or {}
+    if 'peak_bytes_in_use' in stats:
+        return stats['peak_bytes_in_use'] / 2 ** 20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+########################################
+# Jitted Step and Evaluation
+########################################
+
+def loss_fn(model, x, y):
+    # The model vmaps its circuit evaluations over the batch axis itself.
+    logits = model(x)
+    return optax.softmax_cross_entropy_with_integer_labels(logits, y).mean()
+
+
+def make_step(optimizer):
+    """Jitted train step; the old model and optimizer state buffers are donated to the update."""
+    @eqx.filter_jit(donate='all')
+    def step(model, opt_state, x, y):
+        loss, grads = eqx.filter_value_and_grad(loss_fn)(model, x, y)
+        updates, opt_state = optimizer.update(grads, opt_state, model)
+        model = eqx.apply_updates(model, updates)
+        return model, opt_state, loss
+    return step
+
+
+def make_parallel_step(optimizer, static):
+    """pmapped train step over local devices: per-device grads are all-reduced before the update.
+
+    Takes the array leaves of the model (`eqx.partition(model, eqx.is_array)[0]`)
+    replicated across devices, and batches with a leading device axis.
+    """
+    @functools.partial(jax.pmap, axis_name='devices', donate_argnums=(0, 1))
+    def step(params, opt_state, x, y):
+        loss, grads = eqx.filter_value_and_grad(loss_fn)(eqx.combine(params, static), x, y)
+        grads = jax.lax.pmean(eqx.filter(grads, eqx.is_array), axis_name='devices')
+        loss = jax.lax.pmean(loss, axis_name='devices')
+        updates, opt_state = optimizer.update(grads, opt_state, params)
+        params = eqx.apply_updates(params, updates)
+        return params, opt_state, loss
+    return step
+
+
+def set_host_device_count(n_devices):
+    """Expose `n_devices` CPU devices to XLA; only effective before jax initialises its backend."""
+    flags = [flag for flag in os.environ.get('XLA_FLAGS', '').split()
+             if not flag.startswith('--xla_force_host_platform_device_count')]
+    flags.append(f'--xla_force_host_platform_device_count={n_devices}')
+    os.environ['XLA_FLAGS'] = ' '.join(flags)
+
+
+@eqx.filter_jit
+def _eval_batch(model, x, y):
+    logits = model(x)
+    loss = optax.softmax_cross_entropy_with_integer_labels(logits, y).sum()
+    correct = jnp.sum(jnp.argmax(logits, axis=-1) == y)
+    return loss, correct
+
+
+def evaluate(model, x, y, embed, batch_size):
+    """Mean loss and accuracy over (x, y), embedding and evaluating one batch at a time."""
+    total_loss, total_correct = 0.0, 0
+    for idx in minibatches(None, len(y), batch_size, shuffle=False):
+        loss, correct = _eval_batch(model, embed(x[idx]), jnp.asarray(y[idx]))
+        total_loss += float(loss)
+        total_correct += int(correct)
+    return total_loss / len(y), total_correct / len(y)
+
+
+########################################
+# Training Engine
+########################################
+
+def train(model, x_train, y_train, x_test, y_test, embed, learning_rate=0.05, epochs=100,
+          batch_size=6, eval_every=5, seed=0, on_eval=None, data_parallel=False, checkpoints=None,
+          resume=False, profiler=None):
+    """Minibatch training of a QSAM classifier.
+
+    `x_train`/`x_test` stay on the host as token ids; `embed` turns one batch of ids
+    into model inputs, so device memory is bounded by the batch rather than the
+    dataset. The test set is evaluated every `eval_every` epochs (and after the last
+    one); `on_eval(epoch, model, test_loss, test_acc)` is called after each evaluation.
+
+    With `data_parallel` and more than one local device, every minibatch is split
+    across the devices and gradients are averaged before the optax update; the batch
+    size is rounded down to a multiple of the device count and incomplete trailing
+    batches are skipped.
+
+    `checkpoints` (a CheckpointManager) saves model, optimizer state, shuffling RNG state
+    and epoch after each evaluation; with `resume` training continues from its latest
+    checkpoint.
+
+    `profiler` (a qsam_profiling.Profiler) times embedding, compile, step and eval phases;
+    without it the loop adds no synchronisation of its own.
+
+    The passed-in `model` is never donated: training starts from a copy of its arrays.
+    """
+    rng = np.random.default_rng(seed)
+    optimizer = optax.adam(learning_rate)
+    opt_state = optimizer.init(eqx.filter(model, eqx.is_array))
+
+    first_epoch = 1
+    if checkpoints is not None and resume:
+        restored = checkpoints.restore(model, opt_state)
+        if restored is not None:
+            model, opt_state, meta = restored
+            rng.bit_generator.state = meta['rng_state']
+            first_epoch = meta['epoch'] + 1
+            print(f"Resumed from epoch {meta['epoch']}")
+
+    n_devices = jax.local_device_count() if data_parallel else 1
+    if n_devices > 1:
+        per_device = max(1, batch_size // n_devices)
+        batch_size = per_device * n_devices
+        params, static = eqx.partition(model, eqx.is_array)
+        replicate = lambda tree: jax.tree_util.tree_map(
+            lambda a: jnp.broadcast_to(a, (n_devices,) + jnp.shape(a)), tree)
+        params, opt_state = replicate(params), replicate(opt_state)
+        parallel_step = make_parallel_step(optimizer, static)
+        print(f"Data-parallel training on {n_devices} devices, {per_device} samples per device")
+
+        def shard(a):
+            return a.reshape((n_devices, per_device) + a.shape[1:])
+
+        def run_step(state, x, y):
+            params, opt_state, loss = parallel_step(*state, shard(x), shard(y))
+            return (params, opt_state), loss[0]
+
+        def current_model(state):
+            return eqx.combine(jax.tree_util.tree_map(lambda a: a[0], state[0]), static)
+
+        def current_opt_state(state):
+            return jax.tree_util.tree_map(lambda a: a[0], state[1])
+
+        state = (params, opt_state)
+    else:
+        step = make_step(optimizer)
+        # The step donates its inputs; train on copies so the caller's model stays usable.
+        params, static = eqx.partition(model, eqx.is_array)
+        model = eqx.combine(jax.tree_util.tree_map(jnp.copy, params), static)
+
+        def run_step(state, x, y):
+            model, opt_state, loss = step(*state, x, y)
+            return (model, opt_state), loss
+
+        def current_model(state):
+            return state[0]
+
+        def current_opt_state(state):
+            return state[1]
+
+        state = (model, opt_state)
+
+    history = []
+    for epoch in range(first_epoch, epochs + 1):
+        if profiler is not None:
+            profiler.start_epoch(epoch)
+        start = time.time()
+        epoch_loss, epoch_steps = 0.0, 0
+        for idx in minibatches(rng, len(y_train), batch_size):
+            if n_devices > 1 and len(idx) < batch_size:
+                continue
+            if profiler is None:
+                state, loss = run_step(state, embed(x_train[idx]), jnp.asarray(y_train[idx]))
+            else:
+                x, y = profiler.timed('embed', lambda: (embed(x_train[idx]), jnp.asarray(y_train[idx])))
+                if profiler.breakdown and epoch_steps == 0:
+                    profiler.profile_step(optimizer, current_model(state), current_opt_state(state), x, y)
+                state, loss = profiler.timed(profiler.step_phase(x, y), run_step, state, x, y)
+            epoch_loss += float(loss)
+            epoch_steps += 1
+        elapsed = time.time() - start
+        record = {'epoch': epoch, 'loss': epoch_loss / max(epoch_steps, 1), 'time': elapsed,
+                  'steps_per_sec': epoch_steps / elapsed, 'peak_memory_mb': peak_memory_mb()}
+
+        if epoch % eval_every == 0 or epoch == epochs:
+            model = current_model(state)
+            if profiler is None:
+                record['test_loss'], record['test_acc'] = evaluate(model, x_test, y_test, embed, batch_size)
+            else:
+                with profiler.phase('eval'):
+                    record['test_loss'], record['test_acc'] = evaluate(model, x_test, y_test, embed, batch_size)
+            if on_eval is not None:
+                on_eval(epoch, model, record['test_loss'], record['test_acc'])
+            if checkpoints is not None:
+                checkpoints.save(epoch, model, current_opt_state(state), rng.bit_generator.state,
+                                 metric=record['test_acc'])
+        history.append(record)
+        if profiler is not None:
+            profiler.end_epoch(**record)
+
+        message = (f"Epoch {epoch}: Loss = {record['loss']:.4f}, Time = {elapsed:.2f}s, "
+                   f"{record['steps_per_sec']:.1f} steps/s, peak mem = {record['peak_memory_mb']:.0f}MB")
+        if 'test_acc' in record:
+            message += f", Test Accuracy = {record['test_acc']:.4f}"
+        print(message)
+
+    if checkpoints is not None:
+        checkpoints.wait()
+    return current_model(state), current_opt_state(state), history
@@ -2,47 +2,43 @@ import numpy as np
 import jax.numpy as jnp
 import optax
 import equinox as eqx
-from quantum.test import test_loop
-from quantum.utils import stats
-from quantum.dataset import build_dataset
-from quantum.tokenizer.ngram import get_tokenizer
-from quantum.filter.stw import get_stw, stw_filter
-from quantum.embedding.onehot import embedding as onehot_embedding
-from quantum.embedding.tf import embedding as tf_embedding
-from quantum.model import tQTKSAMClassifier
+from qsam_dataset_cache import load_dataset
+from qsam_embedding import OneHotInput, token_ids
+from qsam_export import export_model, load_forward
+from qsam_training import evaluate
 
 # Load the dataset
 train_path = './data/train.csv'
 test_path = './data/test.csv'
-vocab_path = './data/vocab.quantum.pkl'
-idf_path = './data/RP/idf.quantum.pkl'
 
-# Tokenizer
+# Tokenized once into the memory-mapped dataset cache, re-tokenized only when the CSVs change
 seq_len = 5
-tokenizer = get_tokenizer(ngram=[1], token_filter=stw_filter, la='en')
-vocab, idf, train_data, test_data = build_dataset(train_path, test_path, tokenizer, seq_len, need_pad=True)
+vocab, idf, train_data, test_data = load_dataset(train_path, test_path, seq_len)
 
-# Convert data into quantum-compatible format
-x_test, y_test = np.asarray(test_data[0], dtype=int), np.asarray(test_data[1], dtype=int)
+# Convert data into quantum-compatible format: compact token ids, embedded per batch inside the model
+x_test, y_test = token_ids(test_data[0]), np.asarray(test_data[1], dtype=int)
 
-# Embedding
-x_test_we, x_test_se = onehot_embedding(x_test, len(vocab)), tf_embedding(x_test, len(vocab), idf)
-
-# Load trained model
+# Ahead-of-time exported forward pass next to the model file, if it matches the checkpoint
 model_path = './model/tQMLSAM_test.model'
-model = tQTKSAMClassifier(embed_dim=len(vocab), n_qubits=6, n_classes=2, key=eqx.random.PRNGKey(0))
-model_para = eqx.tree_deserialise_leaves(model_path, model)
-model = model.replace(**model_para)
+predict = load_forward(model_path)
 
 # Define test function
-def evaluate_model(model, x_test_we, x_test_se, y_test):
-    test_loss, test_acc = test_loop(
-        model,
-        optax.softmax_cross_entropy_with_integer_labels,
-        (x_test_we, x_test_se, y_test, 6),
-        metric_func=stats.accuracy
-    )
+def evaluate_model(model, x_test, y_test, batch_size=64):
+    test_loss, test_acc = evaluate(OneHotInput(model, len(vocab)), x_test, y_test, jnp.asarray, batch_size)
     print(f'Test Accuracy: {test_acc:.4f}')
 
-# Run the evaluation
-evaluate_model(model, x_test_we, x_test_se, y_test)
+if predict is not None:
+    # No model rebuild, no tensorcircuit import and no trace/compile of the forward pass
+    print(f'Test Accuracy: {np.mean(np.argmax(predict(x_test), axis=-1) == y_test):.4f}')
+else:
+    # Load trained model
+    from quantum.model import tQTKSAMClassifier
+    model = tQTKSAMClassifier(embed_dim=len(vocab), n_qubits=6, n_classes=2, key=eqx.random.PRNGKey(0))
+    model_para = eqx.tree_deserialise_leaves(model_path, model)
+    model = model.replace(**model_para)
+
+    # Run the evaluation
+    evaluate_model(model, x_test, y_test)
+
+    # Export the forward pass so the next run starts without tracing or compiling
+    export_model(OneHotInput(model_para, len(vocab)), model_path, x_test.shape[1], [64])
@@ -1,17 +1,40 @@
+import argparse
+
+from qsam_training import set_host_device_count, train
+
+parser = argparse.ArgumentParser(description="Train the tQMLSAM model")
+parser.add_argument('model_name', nargs='?', default=None,
+                    help="Accepted for the README's `tQMLSAM_train.py model-name` form; the model path is fixed")
+parser.add_argument('--resume', action='store_true', help="Continue from the latest checkpoint in checkpoint_dir")
+parser.add_argument('--profile_jsonl', type=str, default=None, help="Append per-epoch phase timings to this JSONL file")
+parser.add_argument('--prometheus', type=str, default=None, help="Write phase timers in Prometheus text format here")
+parser.add_argument('--profile_breakdown', action='store_true',
+                    help="Also time forward, grad and update separately on one batch per epoch")
+parser.add_argument('--trace_epochs', type=str, default=None, help="Capture a jax.profiler trace, e.g. '3' or '3-5'")
+parser.add_argument('--trace_dir', type=str, default='./profile', help="Output directory for --trace_epochs")
+parser.add_argument('--devices', type=int, default=1,
+                    help="Split each minibatch over this many host CPU devices (1 disables data parallelism)")
+args = parser.parse_args()
+
+# Data parallelism: must be set before jax creates its CPU backend.
+n_devices = args.devices
+set_host_device_count(n_devices)
+
 import numpy as np
 import jax
 import jax.numpy as jnp
 import optax
 import equinox as eqx
-import pickle as pkl
 import time
 import tensorcircuit as tc
 from tensorcircuit import shadows
 
-from quantum.dataset import build_dataset
-from quantum.embedding.onehot import embedding as onehot_embedding
-from quantum.embedding.tf import embedding as tf_embedding
 from quantum.model import tQTKSAMClassifier
+from qsam_dataset_cache import load_dataset
+from qsam_embedding import OneHotInput, token_ids
+from qsam_simulation import SimulationConfig, configure_simulation
+from qsam_checkpoint import CheckpointManager
+from qsam_profiling import Profiler, parse_epoch_range
 
 # Training configurations
 dataset_name = 'RP'
@@ -19,49 +42,49 @@ train_path = f'./data/train.csv'
 test_path = f'./data/test.csv'
 model_path = f'./model/tQMLSAM.train.model'
 
+seq_len = 5
 batch_size = 6
 epochs = 100
 learning_rate = 0.05
+eval_every = 5
+checkpoint_dir = './model/checkpoints/tQMLSAM'
+keep_checkpoints = 3  # 0 keeps every checkpoint
 
-# Convert dataset into quantum-compatible format
-with open(vocab_path, 'rb') as f:
-    vocab = pkl.load(f)
-with open(idf_path, 'rb') as f:
-    idf = pkl.load(f)
+# Circuit simulation: statevector dtype and contraction path optimizer (paths are cached per circuit shape)
+configure_simulation(SimulationConfig(backend='jax', dtype='complex64', contractor='greedy'))
 
-x_train, y_train = np.load(train_path, allow_pickle=True)
-x_test, y_test = np.load(test_path, allow_pickle=True)
+# Convert dataset into quantum-compatible format (tokenized once, then memory-mapped from the cache)
+vocab, idf, (x_train, y_train), (x_test, y_test) = load_dataset(train_path, test_path, seq_len)
 
-# Apply embeddings
-x_train_we, x_train_se = onehot_embedding(x_train, len(vocab)), tf_embedding(x_train, len(vocab), idf)
-x_test_we, x_test_se = onehot_embedding(x_test, len(vocab)), tf_embedding(x_test, len(vocab), idf)
+# Keep compact int32 token ids; one-hot vectors are built per batch inside the jitted model
+x_train, y_train = token_ids(x_train), np.asarray(y_train, dtype=int)
+x_test, y_test = token_ids(x_test), np.asarray(y_test, dtype=int)
+embed = jnp.asarray
 
 # Initialize model
 key = jax.random.PRNGKey(0)
-model = tQTKSAMClassifier(embed_dim=len(vocab), n_qubits=6, n_classes=2, key=key)
+model = OneHotInput(tQTKSAMClassifier(embed_dim=len(vocab), n_qubits=6, n_classes=2, key=key), len(vocab))
+
+# Training loop: checkpoints are written on a background thread after every evaluation, and the
+# best classifier is exported to model_path
+checkpoints = CheckpointManager(checkpoint_dir, keep=keep_checkpoints, best_model_path=model_path,
+                                export_model=lambda model: model.model)
 
-# Optimizer
-optimizer = optax.adam(learning_rate)
-state = optimizer.init(model)
+profiler = None
+if args.profile_jsonl or args.prometheus or args.profile_breakdown or args.trace_epochs:
+    profiler = Profiler(jsonl_path=args.profile_jsonl, prometheus_path=args.prometheus, trace_dir=args.trace_dir,
+                        trace_epochs=parse_epoch_range(args.trace_epochs), breakdown=args.profile_breakdown)
 
-# Training loop
-best_accuracy = -1e5
-for epoch in range(1, epochs + 1):
-    start = time.time()
-    
-    loss, grads = eqx.filter_value_and_grad(lambda m: optax.softmax_cross_entropy_with_integer_labels(m(x_train_we), y_train).mean())(model)
-    updates, state = optimizer.update(grads, state, model)
-    model = eqx.apply_updates(model, updates)
-    
-    predictions = model(x_test_we)
-    test_accuracy = (jnp.argmax(predictions, axis=-1) == y_test).mean()
-    
-    end = time.time()
-    
-    print(f'Epoch {epoch}: Loss = {loss:.4f}, Test Accuracy = {test_accuracy:.4f}, Time = {end-start:.2f}s')
-    
-    if test_accuracy > best_accuracy:
-        best_accuracy = test_accuracy
-        eqx.tree_serialise_leaves(model_path, model)
+model, state, history = train(model, x_train, y_train, x_test, y_test, embed,
+                              learning_rate=learning_rate, epochs=epochs, batch_size=batch_size,
+                              eval_every=eval_every, seed=0, data_parallel=n_devices > 1,
+                              checkpoints=checkpoints, resume=args.resume, profiler=profiler)
+checkpoints.close()
+if profiler is not None:
+    profiler.close()
+    print(profiler.summary())
 
-print(f'Best test accuracy achieved: {best_accuracy:.4f}')
+if checkpoints.best_metric is None:
+    print('No evaluation ran; no best test accuracy recorded')
+else:
+    print(f'Best test accuracy achieved: {checkpoints.best_metric:.4f}')
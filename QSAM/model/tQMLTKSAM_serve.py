@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import jax
+import equinox as eqx
+
+from qsam_dataset_cache import load_dataset
+from qsam_embedding import OneHotInput
+from qsam_export import export_model, load_forward
+
+
+########################################
+# Model Loading and Warm-up
+########################################
+
+def load_predictor(args, vocab_size):
+    """Deserialise the checkpoint once and return a jitted ids -> class probabilities function.
+
+    With `--aot` the exported forward pass next to the checkpoint is used when it is
+    current, so a fresh worker neither builds the model nor traces and compiles it;
+    otherwise the model is loaded as usual and exported for the next start.
+    """
+    if args.aot:
+        exported = load_forward(args.model_path)
+        if exported is not None:
+            return lambda ids: np.asarray(jax.nn.softmax(exported(ids), axis=-1))
+
+    from tqmltksam_model import tQMLTKSAMClassifier
+    from qsam_feature_cache import cached_classifier, feature_cache_path
+
+    model = tQMLTKSAMClassifier(
+        embed_dim=vocab_size,
+        n_qubits=args.n_qubits,
+        n_classes=args.n_classes,
+        key=jax.random.PRNGKey(args.seed)
+    )
+    model = eqx.tree_deserialise_leaves(args.model_path, model)
+    if args.feature_cache:
+        # Frozen weights: one circuit per vocabulary entry at load time, gathers per request.
+        model = cached_classifier(model, feature_cache_path(args.model_path))
+    else:
+        model = OneHotInput(model, vocab_size)
+    if args.aot:
+        export_model(model, args.model_path, args.seq_len, [int(size) for size in args.buckets.split(',')])
+
+    @eqx.filter_jit
+    def forward(model, ids):
+        return jax.nn.softmax(model(ids), axis=-1)
+
+    return lambda ids: np.asarray(forward(model, ids))
+
+
+def warm_up(predict, buckets, seq_len):
+    """Compile the forward pass for every bucketed batch size before serving."""
+    for size in buckets:
+        start = time.perf_counter()
+        predict(np.zeros((size, seq_len), dtype=np.int32))
+        print(f"warmed batch size {size} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+########################################
+# Dynamic Micro-batching
+########################################
+
+class LatencyStats:
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, latencies, batch_size):
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.batch_sizes.append(batch_size)
+            self.requests += len(latencies)
+
+    def summary(self):
+        with self.lock:
+            latencies = np.asarray(self.latencies) * 1000
+            elapsed = time.perf_counter() - self.started
+            return {
+                'requests': self.requests,
+                'requests_per_sec': self.requests / elapsed if elapsed else 0.0,
+                'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'mean_batch': float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+            }
+
+
+class BadRequest(ValueError):
+    """A request the service refuses before batching (wrong length, non-integer or out-of-vocabulary ids)."""
+
+
+class MicroBatcher:
+    """Collects requests until the largest bucket is full or the oldest one has waited `max_latency` s.
+
+    Each batch is zero-padded up to the smallest warmed bucket size, so the jitted
+    forward pass never recompiles while serving.
+    """
+
+    def __init__(self, predict, buckets, seq_len, vocab_size, max_latency):
+        self.predict = predict
+        self.buckets = sorted(buckets)
+        self.seq_len = seq_len
+        self.vocab_size = vocab_size
+        self.max_latency = max_latency
+        self.stats = LatencyStats()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, ids):
+        """Queue one request; raises BadRequest for ids the model cannot take."""
+        try:
+            ids = np.asarray(ids)
+        except (ValueError, TypeError) as ex:
+            raise BadRequest(f"token ids must be a list of integers: {ex}") from ex
+        if ids.shape != (self.seq_len,):
+            raise BadRequest(f"expected {self.seq_len} token ids, got shape {ids.shape}")
+        if ids.dtype.kind not in 'iu':
+            raise BadRequest(f"token ids must be integers, got {ids.dtype}")
+        # An id outside the vocabulary would silently gather a clamped row (or one-hot to zeros).
+        if ids.min() < 0 or ids.max() >= self.vocab_size:
+            raise BadRequest(f"token ids must be in [0, {self.vocab_size}), got {ids.tolist()}")
+        future = Future()
+        self.queue.put((time.perf_counter(), ids.astype(np.int32), future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first[0] + self.max_latency
+        while len(batch) < self.buckets[-1]:
+            # Past the deadline, still take whatever is already queued, just without waiting.
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            size = next(b for b in self.buckets if b >= len(batch))
+            ids = np.zeros((size, self.seq_len), dtype=np.int32)
+            for row, (_, item_ids, _) in enumerate(batch):
+                ids[row] = item_ids
+            try:
+                probs = self.predict(ids)
+            except Exception as ex:
+                for _, _, future in batch:
+                    future.set_exception(ex)
+                continue
+            done = time.perf_counter()
+            for row, (_, _, future) in enumerate(batch):
+                future.set_result(probs[row])
+            self.stats.record([done - arrival for arrival, _, _ in batch], len(batch))
+
+
+def result_record(request_id, probs):
+    return {'id': request_id, 'label': int(np.argmax(probs)), 'probs': [float(p) for p in probs]}
+
+
+########################################
+# Interfaces: stdin/stdout JSONL and HTTP
+########################################
+
+def serve_jsonl(batcher, stdin, stdout):
+    """One {"id": ..., "tokens": [...]} per input line; results are written as they complete."""
+    lock = threading.Lock()
+    pending = []
+
+    def write(request_id, future):
+        try:
+            record = result_record(request_id, future.result())
+        except Exception as ex:
+            record = {'id': request_id, 'error': str(ex)}
+        with lock:
+            stdout.write(json.dumps(record) + '\n')
+            stdout.flush()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            request = json.loads(line)
+            future = batcher.submit(request['tokens'])
+        except (KeyError, ValueError, TypeError) as ex:
+            request_id = request.get('id') if isinstance(request, dict) else None
+            with lock:
+                stdout.write(json.dumps({'id': request_id, 'error': f"bad request: {ex!r}"}) + '\n')
+                stdout.flush()
+            continue
+        future.add_done_callback(lambda f, request_id=request.get('id'): write(request_id, f))
+        pending.append(future)
+    for future in pending:
+        future.exception()
+
+
+def make_handler(batcher):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._reply(200, batcher.stats.summary())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': 'not found'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                tokens = request['tokens']
+            except KeyError as ex:
+                self._reply(400, {'error': f"missing field {ex}"})
+                return
+            except (ValueError, TypeError) as ex:
+                # Malformed JSON (JSONDecodeError is a ValueError) or a non-object body.
+                self._reply(400, {'error': str(ex)})
+                return
+            try:
+                probs = batcher.submit(tokens).result()
+            except BadRequest as ex:
+                self._reply(400, {'error': str(ex)})
+                return
+            except Exception as ex:
+                # Anything raised by the forward pass is the service's fault, whatever its type.
+                self._reply(500, {'error': f"{type(ex).__name__}: {ex}"})
+                return
+            self._reply(200, result_record(request.get('id'), probs))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched inference service for tQMLTKSAM Model")
+    parser.add_argument('--model_path', type=str, default='./model/tQMLTKSAM.model',
+                        help="Path to the saved tQMLTKSAM model")
+    parser.add_argument('--train_path', type=str, default='./data/train.csv',
+                        help="Training CSV (vocabulary size comes from its dataset cache)")
+    parser.add_argument('--test_path', type=str, default='./data/test.csv',
+                        help="Test CSV (part of the dataset cache key)")
+    parser.add_argument('--cache_dir', type=str, default='./data/cache',
+                        help="Directory of the preprocessed dataset cache")
+    parser.add_argument('--vocab_size', type=int, default=None,
+                        help="Vocabulary size; skips loading the dataset cache when given")
+    parser.add_argument('--n_qubits', type=int, default=6,
+                        help="Number of qubits used in the quantum circuits")
+    parser.add_argument('--n_classes', type=int, default=2,
+                        help="Number of output classes")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Random seed used to build the model skeleton")
+    parser.add_argument('--seq_len', type=int, default=5,
+                        help="Token ids per request")
+    parser.add_argument('--buckets', type=str, default='1,4,16,64',
+                        help="Comma-separated batch sizes compiled ahead of serving")
+    parser.add_argument('--max_latency_ms', type=float, default=5.0,
+                        help="Longest a request waits for its micro-batch to fill")
+    parser.add_argument('--aot', action='store_true',
+                        help="Start from the ahead-of-time exported forward pass (exported on first use)")
+    parser.add_argument('--feature_cache', action='store_true',
+                        help="Serve from per-token quantum features, computed once per checkpoint")
+    parser.add_argument('--mode', type=str, default='stdin', choices=['stdin', 'http'],
+                        help="JSONL over stdin/stdout or HTTP (POST /predict, GET /metrics)")
+    parser.add_argument('--port', type=int, default=8080,
+                        help="Port for --mode http")
+    args = parser.parse_args()
+
+    vocab_size = args.vocab_size
+    if vocab_size is None:
+        vocab, _, _, _ = load_dataset(args.train_path, args.test_path, args.seq_len, cache_dir=args.cache_dir)
+        vocab_size = len(vocab)
+
+    buckets = [int(size) for size in args.buckets.split(',')]
+    predict = load_predictor(args, vocab_size)
+    warm_up(predict, buckets, args.seq_len)
+    batcher = MicroBatcher(predict, buckets, args.seq_len, vocab_size, args.max_latency_ms / 1000)
+
+    if args.mode == 'stdin':
+        serve_jsonl(batcher, sys.stdin, sys.stdout)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(batcher))
+        print(f"serving on http://127.0.0.1:{args.port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    batcher.close()
+    print(json.dumps(batcher.stats.summary()), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
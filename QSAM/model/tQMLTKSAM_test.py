@@ -4,37 +4,42 @@ import numpy as np
 import jax
 import jax.numpy as jnp
 import equinox as eqx
-import tensorcircuit as tc
 
-# Custom imports (make sure these modules are available in your project)
-from quantum.dataset import build_dataset
-from quantum.embedding.onehot import embedding as onehot_embedding
-from quantum.embedding.tf import embedding as tf_embedding
-from quantum.tokenizer.ngram import get_tokenizer
-from quantum.filter.stw import get_stw, stw_filter
+from qsam_dataset_cache import load_dataset
+from qsam_embedding import OneHotInput, token_ids
+from qsam_export import export_model, load_forward
+from qsam_training import evaluate
 
-# Import the tQMLTKSAMClassifier from your model definition file
-# Adjust the import path as needed.
-from tqmltksam_model import tQMLTKSAMClassifier
+
+def test_aot(predict, x_test, y_test):
+    # The exported forward pass needs neither the model classes nor tensorcircuit
+    logits = predict(x_test)
+    print(f"Test Accuracy: {np.mean(np.argmax(logits, axis=-1) == y_test):.4f}")
 
 
 def test_model(args):
-    # Build dataset using your tokenizer and filtering utilities
-    tokenizer = get_tokenizer(ngram=[1], token_filter=stw_filter, la='en')
-    vocab, idf, train_data, test_data = build_dataset(
+    # Load the preprocessed dataset (tokenized once per source files/config, memory-mapped)
+    vocab, idf, train_data, test_data = load_dataset(
         args.train_path,
         args.test_path,
-        tokenizer,
         args.seq_len,
-        need_pad=True
+        cache_dir=args.cache_dir
     )
-    # Convert test data into numpy arrays
-    x_test, y_test = np.asarray(test_data[0], dtype=int), np.asarray(test_data[1], dtype=int)
-    
-    # Generate embeddings for the test data (using one-hot & TF embeddings)
-    x_test_we = onehot_embedding(x_test, len(vocab))
-    x_test_se = tf_embedding(x_test, len(vocab), idf)
-    
+    # Keep the test data as compact token ids; one-hot vectors are built per batch inside the model
+    x_test, y_test = token_ids(test_data[0]), np.asarray(test_data[1], dtype=int)
+
+    if args.aot:
+        predict = load_forward(args.model_path)
+        if predict is not None:
+            test_aot(predict, x_test, y_test)
+            return
+
+    # Imported here so the AOT path above skips tensorcircuit and the model definition.
+    # Import the tQMLTKSAMClassifier from your model definition file
+    # Adjust the import path as needed.
+    from tqmltksam_model import tQMLTKSAMClassifier
+    from qsam_feature_cache import cached_classifier, feature_cache_path
+
     # Initialize the model (the embed_dim is set to len(vocab))
     model = tQMLTKSAMClassifier(
         embed_dim=len(vocab),
@@ -47,23 +52,28 @@ def test_model(args):
     model_params = eqx.tree_deserialise_leaves(args.model_path, model)
     model = model.replace(**model_params)
     
-    # Run inference
-    predictions = model(x_test_we)
-    test_accuracy = jnp.mean(jnp.argmax(predictions, axis=-1) == y_test)
+    # Run inference: circuits per token occurrence, or gathers from the per-token feature table
+    if args.feature_cache:
+        model = cached_classifier(model, feature_cache_path(args.model_path))
+    else:
+        model = OneHotInput(model, len(vocab))
+    _, test_accuracy = evaluate(model, x_test, y_test, jnp.asarray, args.batch_size)
     
     print(f"Test Accuracy: {test_accuracy:.4f}")
 
+    if args.aot:
+        # No usable artifact for this checkpoint yet: export one for the next run.
+        export_model(OneHotInput(model_params, len(vocab)), args.model_path, x_test.shape[1], [args.batch_size])
+
 
 def main():
     parser = argparse.ArgumentParser(description="Testing for tQMLTKSAM Model")
-    parser.add_argument('--train_path', type=str, default='./data/train.npy',
+    parser.add_argument('--train_path', type=str, default='./data/train.csv',
                         help="Path to training data (used for building vocabulary)")
-    parser.add_argument('--test_path', type=str, default='./data/test.npy',
+    parser.add_argument('--test_path', type=str, default='./data/test.csv',
                         help="Path to test data")
-    parser.add_argument('--vocab_path', type=str, default='./data/vocab.quantum.pkl',
-                        help="Path to vocabulary pickle file")
-    parser.add_argument('--idf_path', type=str, default='./data/RP/idf.quantum.pkl',
-                        help="Path to IDF pickle file")
+    parser.add_argument('--cache_dir', type=str, default='./data/cache',
+                        help="Directory of the preprocessed, memory-mapped dataset cache")
     parser.add_argument('--model_path', type=str, default='./model/tQMLTKSAM.model',
                         help="Path to the saved tQMLTKSAM model")
     parser.add_argument('--n_qubits', type=int, default=6,
@@ -74,6 +84,13 @@ def main():
                         help="Random seed for reproducibility")
     parser.add_argument('--seq_len', type=int, default=5,
                         help="Sequence length for tokenization (used in test mode)")
+    parser.add_argument('--batch_size', type=int, default=64,
+                        help="Test samples embedded and evaluated per batch")
+    parser.add_argument('--aot', action='store_true',
+                        help="Use the ahead-of-time exported forward pass next to the model, exporting it "
+                             "first if it is missing or stale")
+    parser.add_argument('--feature_cache', action='store_true',
+                        help="Evaluate from per-token quantum features, computed once per checkpoint")
     
     args = parser.parse_args()
     test_model(args)
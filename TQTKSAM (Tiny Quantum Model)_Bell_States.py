@@ -1,5 +1,6 @@
 from qiskit import QuantumCircuit, execute, Aer
-from qiskit.quantum_info import state_fidelity, Statevector
+
+from ghz_fidelity import batch_hellinger_fidelity, batch_state_fidelity, bell_statevector, circuit_statevector
 
 # Initialize a Quantum Circuit with 2 qubits and 2 classical bits
 qc = QuantumCircuit(2, 2)
@@ -10,9 +11,8 @@ qc.h(0)
 # Step 5: Apply a CNOT gate, with the first qubit as control and the second as target
 qc.cx(0, 1)
 
-# Simulate the state after the gates to check the GHZ state
-backend = Aer.get_backend('statevector_simulator')
-out_state = execute(qc, backend).result().get_statevector()
+# State after the gates; an H + CNOT ladder is a known GHZ/Bell state, so no simulator run is needed
+out_state = circuit_statevector(qc)
 print("Statevector after applying Hadamard and CNOT:", out_state)
 
 # Measure both qubits and store the results in the classical bits
@@ -25,9 +25,10 @@ counts = result.get_counts(qc)
 print("Measurement results:", counts)
 
 # Calculate and print the fidelity, assuming ideal |Phi+> state
-ideal_state = [1 / (2**0.5), 0, 0, 1 / (2**0.5)]  # |Phi+> state
-fidelity = state_fidelity(Statevector(ideal_state), out_state)
+ideal_state = bell_statevector('phi+')  # |Phi+> state
+fidelity = batch_state_fidelity([out_state], ideal_state)[0]
 print("Fidelity with ideal Bell state |Phi+>:", fidelity)
+print("Hellinger fidelity of measured counts:", batch_hellinger_fidelity([counts], 2, ideal_state)[0])
 
 # Determine if the state is valid
 validity = "valid" if fidelity > 0.5 else "invalid"
@@ -0,0 +1,331 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lazy_import import LazyModule
+
+anoncreds = LazyModule('indy.anoncreds')
+blob_storage = LazyModule('indy.blob_storage')
+ledger = LazyModule('indy.ledger')
+
+
+def encode_value(raw):
+    """AnonCreds attribute encoding: 32-bit integers as themselves, anything else as its sha256."""
+    text = str(raw)
+    if text.lstrip('-').isdigit() and -2 ** 31 <= int(text) < 2 ** 31:
+        return str(int(text))
+    return str(int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest(), 'big'))
+
+
+def credential_values(record):
+    return json.dumps({name: {'raw': str(value), 'encoded': encode_value(value)} for name, value in record.items()})
+
+
+########################################
+# Tails Files
+########################################
+
+class TailsStore:
+    """Read-only memory maps of tails files, opened once and shared by every reader.
+
+    Tails files are immutable once their registry is created, so a map never needs
+    refreshing; repeated reads are served from the page cache without re-reading the
+    file. `serve()` exposes them over HTTP as GET /<tails hash>, which is where the
+    tailsLocation of registries created with a `tails_url` points holders and verifiers.
+    """
+
+    def __init__(self):
+        self.maps = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reads = 0
+        self.bytes_served = 0
+
+    def open(self, path):
+        with self.lock:
+            mapped = self.maps.get(path)
+            if mapped is None:
+                with open(path, 'rb') as f:
+                    mapped = self.maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.opened += 1
+            return mapped
+
+    def read(self, path, offset=0, length=None):
+        """memoryview of `length` bytes at `offset` (to the end by default); no copy is made."""
+        mapped = self.open(path)
+        end = len(mapped) if length is None else min(offset + length, len(mapped))
+        self.reads += 1
+        self.bytes_served += end - offset
+        return memoryview(mapped)[offset:end]
+
+    def close(self):
+        with self.lock:
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps.clear()
+
+    def serve(self, tails_dir, host='127.0.0.1', port=0):
+        """Start a threaded HTTP server for the tails files in `tails_dir`; returns the server."""
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = os.path.basename(self.path.strip('/'))
+                path = os.path.join(tails_dir, name)
+                if not name or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                body = store.read(path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def metrics(self):
+        return {'open_maps': len(self.maps), 'opened': self.opened, 'reads': self.reads,
+                'bytes_served': self.bytes_served}
+
+
+########################################
+# Revocation Registry Shards
+########################################
+
+class RevocationShard:
+    """One fixed-size revocation registry: its ids, open tails reader, slots and issuance stats."""
+
+    def __init__(self, rev_reg_id, rev_reg_def, capacity, reader_handle, tails_path):
+        self.rev_reg_id = rev_reg_id
+        self.rev_reg_def = rev_reg_def
+        self.capacity = capacity
+        self.reader_handle = reader_handle
+        self.tails_path = tails_path
+        self.allocated = 0
+        self.in_flight = 0
+        # The issuer wallet keeps one accumulator state per registry; credentials of a
+        # shard are issued one at a time, different shards in parallel.
+        self.lock = asyncio.Lock()
+        self.deltas = []
+        self.issued = 0
+        self.failed = 0
+        self.issue_s = 0.0
+        self.store_s = 0.0
+        self.first = None
+        self.last = None
+
+    @property
+    def free(self):
+        return self.capacity - self.allocated
+
+    def record(self, issue_s, store_s):
+        now = time.perf_counter()
+        self.first = self.first or now - issue_s - store_s
+        self.last = now
+        self.issued += 1
+        self.issue_s += issue_s
+        self.store_s += store_s
+
+    def metrics(self):
+        active = (self.last - self.first) if self.first is not None else 0.0
+        return {'rev_reg_id': self.rev_reg_id, 'capacity': self.capacity, 'issued': self.issued,
+                'failed': self.failed,
+                'issue_ms': 1000 * self.issue_s / self.issued if self.issued else None,
+                'store_ms': 1000 * self.store_s / self.issued if self.issued else None,
+                'per_sec': self.issued / active if active else None}
+
+
+class RevocationRegistries:
+    """Revocation registries of one credential definition, pre-created in fixed-size shards.
+
+    Every shard is a registry of `shard_size` credentials with its own tails file under
+    `tails_dir`, written once at creation and then only read: through one blob-storage
+    reader handle per shard for issuance, and through `tails` (a TailsStore of memory
+    maps) for serving. Issuance on one registry is sequential, so a batch is spread
+    over at least as many shards as it has workers: each credential goes to the shard
+    with free slots and the fewest issuances in flight.
+
+    With `tails_url` (e.g. the address of `tails.serve()`) the ledger's tailsLocation
+    is `<tails_url><tails hash>` instead of a local path. With `wallets` (a
+    WalletHandles), holder wallets are opened for storing the credential and
+    released afterwards, instead of using holder['wallet'].
+
+    With ISSUANCE_BY_DEFAULT (the default) issuing changes no ledger state; with
+    ISSUANCE_ON_DEMAND every issuance produces an accumulator delta, and the deltas of
+    a shard are merged and published as one REVOC_REG_ENTRY per `publish_every`
+    credentials (and on `flush()`).
+    """
+
+    def __init__(self, issuer, cred_def_id, shard_size=1000, tails_dir='./tails',
+                 issuance_type='ISSUANCE_BY_DEFAULT', publish_every=100, tails=None, tails_url=None,
+                 wallets=None):
+        self.issuer = issuer
+        self.cred_def_id = cred_def_id
+        self.shard_size = shard_size
+        self.tails_dir = tails_dir
+        self.issuance_type = issuance_type
+        self.publish_every = publish_every
+        self.tails = tails or TailsStore()
+        self.tails_url = tails_url
+        self.wallets = wallets
+        self.shards = []
+        self.tags = itertools.count()
+        # Serialises overflow shard creation when every shard is full.
+        self.overflow = asyncio.Lock()
+
+    def _tails_config(self):
+        return json.dumps({'base_dir': self.tails_dir, 'uri_pattern': self.tails_url or ''})
+
+    async def _submit(self, request):
+        response = json.loads(await ledger.sign_and_submit_request(self.issuer['pool'], self.issuer['wallet'],
+                                                                   self.issuer['did'], request))
+        if response.get('op') != 'REPLY':
+            raise RuntimeError("revocation registry write rejected: {}".format(response.get('reason')))
+        return response
+
+    async def create_shard(self):
+        os.makedirs(self.tails_dir, exist_ok=True)
+        writer = await blob_storage.open_writer('default', self._tails_config())
+        (rev_reg_id, rev_reg_def, rev_reg_entry) = await anoncreds.issuer_create_and_store_revoc_reg(
+            self.issuer['wallet'], self.issuer['did'], None, 'shard{}'.format(next(self.tags)), self.cred_def_id,
+            json.dumps({'max_cred_num': self.shard_size, 'issuance_type': self.issuance_type}), writer)
+        await self._submit(await ledger.build_revoc_reg_def_request(self.issuer['did'], rev_reg_def))
+        await self._submit(await ledger.build_revoc_reg_entry_request(self.issuer['did'], rev_reg_id, 'CL_ACCUM',
+                                                                      rev_reg_entry))
+        reader = await blob_storage.open_reader('default', self._tails_config())
+        tails_path = os.path.join(self.tails_dir, json.loads(rev_reg_def)['value']['tailsHash'])
+        self.tails.open(tails_path)
+        shard = RevocationShard(rev_reg_id, rev_reg_def, self.shard_size, reader, tails_path)
+        self.shards.append(shard)
+        return shard
+
+    async def prepare(self, count, parallel=1):
+        """Create shards up front until `count` more credentials fit in at least `parallel` open shards.
+
+        Registry creation runs in parallel.
+        """
+        open_shards = [shard for shard in self.shards if shard.free > 0]
+        missing = count - sum(shard.free for shard in open_shards)
+        needed = max(-(-missing // self.shard_size), min(parallel, count) - len(open_shards), 0)
+        await asyncio.gather(*(self.create_shard() for _ in range(needed)))
+        return self.shards
+
+    def allocate(self):
+        """Shard with a free slot and the fewest issuances in flight; None when every shard is full."""
+        shard = min((shard for shard in self.shards if shard.free > 0), key=lambda shard: shard.in_flight,
+                    default=None)
+        if shard is not None:
+            shard.allocated += 1
+        return shard
+
+    async def issue(self, holder, values_json):
+        """Issue one credential to `holder` (after its credential request) and store it in its wallet."""
+        shard = self.allocate()
+        if shard is None:
+            # Concurrent callers that all find the shards full share one new shard.
+            async with self.overflow:
+                shard = self.allocate()
+                if shard is None:
+                    await self.create_shard()
+                    shard = self.allocate()
+        try:
+            shard.in_flight += 1
+            try:
+                async with shard.lock:
+                    start = time.perf_counter()
+                    (cred_json, cred_rev_id, delta) = await anoncreds.issuer_create_credential(
+                        self.issuer['wallet'], holder['transcript_cred_offer'], holder['transcript_cred_request'],
+                        values_json, shard.rev_reg_id, shard.reader_handle)
+                    issue_s = time.perf_counter() - start
+                    if delta:
+                        shard.deltas.append(delta)
+            finally:
+                shard.in_flight -= 1
+            start = time.perf_counter()
+            holder_wallet = holder['wallet'] if self.wallets is None else \
+                await self.wallets.open(holder['wallet_config'], holder['wallet_credentials'])
+            try:
+                holder['transcript_cred_id'] = await anoncreds.prover_store_credential(
+                    holder_wallet, None, holder['transcript_cred_request_metadata'], cred_json,
+                    holder['issuer_transcript_cred_def'], shard.rev_reg_def)
+            finally:
+                if self.wallets is not None:
+                    await self.wallets.release(holder['wallet_config'])
+            shard.record(issue_s, time.perf_counter() - start)
+        except Exception:
+            shard.failed += 1
+            raise
+        holder['transcript_rev_reg_id'], holder['transcript_cred_rev_id'] = shard.rev_reg_id, cred_rev_id
+        if len(shard.deltas) >= self.publish_every:
+            await self.publish(shard)
+        return holder
+
+    async def publish(self, shard):
+        """Merge the shard's pending accumulator deltas and write them to the ledger as one entry."""
+        async with shard.lock:
+            deltas, shard.deltas = shard.deltas, []
+            if not deltas:
+                return
+            merged = deltas[0]
+            for delta in deltas[1:]:
+                merged = await anoncreds.issuer_merge_revocation_registry_deltas(merged, delta)
+        await self._submit(await ledger.build_revoc_reg_entry_request(self.issuer['did'], shard.rev_reg_id,
+                                                                      'CL_ACCUM', merged))
+
+    async def flush(self):
+        await asyncio.gather(*(self.publish(shard) for shard in self.shards))
+
+    def report(self):
+        print("  {:<48} {:>6} {:>6} {:>9} {:>9} {:>8}".format(
+            'revocation registry', 'issued', 'failed', 'issue ms', 'store ms', 'per sec'))
+        for shard in self.shards:
+            entry = shard.metrics()
+            print("  {:<48} {:>6} {:>6} ".format(entry['rev_reg_id'][-48:], entry['issued'], entry['failed']) +
+                  ' '.join('{:>9}'.format('-' if entry[k] is None else '{:.1f}'.format(entry[k]))
+                           for k in ('issue_ms', 'store_ms', 'per_sec')))
+        print("  tails: {}".format(self.tails.metrics()))
+
+
+async def issue_credentials(registries, holders, values_for, workers=16):
+    """Issue and store a credential for every holder with `workers` concurrent issuance tasks.
+
+    `values_for(holder)` returns the credential values JSON. Holders whose issuance
+    fails are reported and skipped. Returns the number of credentials stored.
+    """
+    workers = min(workers, len(holders)) or 1
+    await registries.prepare(len(holders), workers)
+    queue = asyncio.Queue()
+    for holder in holders:
+        queue.put_nowait(holder)
+    stored = 0
+    start = time.perf_counter()
+
+    async def worker():
+        nonlocal stored
+        while not queue.empty():
+            holder = queue.get_nowait()
+            try:
+                await registries.issue(holder, values_for(holder))
+                stored += 1
+            except Exception as ex:
+                print("\"{}\" -> credential issuance failed: {}".format(holder['name'], getattr(ex, 'error_code', ex)))
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await registries.flush()
+    wall = time.perf_counter() - start
+    print("Issued {} of {} credentials over {} registry shards in {:.2f}s -> {:.1f} credentials/sec".format(
+        stored, len(holders), len(registries.shards), wall, stored / wall if wall else 0.0))
+    registries.report()
+    return stored
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""secp256k1 signing of DID transaction hashes for the Registration contract.
+
+Each DID is hashed with sha256 and the 32-byte digest is signed with RFC 6979
+deterministic, low-S ECDSA over secp256k1. Signatures are the 64-byte compact
+r||s form, so the coincurve (libsecp256k1) backend and the pure-Python ecdsa
+fallback produce byte-identical output and can verify each other.
+"""
+import argparse
+import hashlib
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _coincurve_backend():
+    import coincurve
+    from coincurve.ecdsa import cdata_to_der, deserialize_compact
+
+    class CoincurveBackend:
+        name = 'coincurve'
+
+        def __init__(self, secret):
+            self.key = coincurve.PrivateKey(secret)
+            self.public_key = self.key.public_key.format(compressed=False)
+
+        def sign_digest(self, digest):
+            return self.key.sign_recoverable(digest, hasher=None)[:64]
+
+        @staticmethod
+        def verify_digest(public_key, signature, digest):
+            der = cdata_to_der(deserialize_compact(signature))
+            return coincurve.PublicKey(public_key).verify(der, digest, hasher=None)
+
+    return CoincurveBackend
+
+
+def _ecdsa_backend():
+    import ecdsa
+    from ecdsa.util import sigdecode_string, sigencode_string_canonize
+
+    class EcdsaBackend:
+        name = 'ecdsa'
+
+        def __init__(self, secret):
+            self.key = ecdsa.SigningKey.from_string(secret, curve=ecdsa.SECP256k1)
+            self.public_key = b'\x04' + self.key.get_verifying_key().to_string()
+
+        def sign_digest(self, digest):
+            return self.key.sign_digest_deterministic(digest, hashfunc=hashlib.sha256,
+                                                      sigencode=sigencode_string_canonize)
+
+        @staticmethod
+        def verify_digest(public_key, signature, digest):
+            key = ecdsa.VerifyingKey.from_string(public_key, curve=ecdsa.SECP256k1)
+            try:
+                return key.verify_digest(signature, digest, sigdecode=sigdecode_string)
+            except ecdsa.BadSignatureError:
+                return False
+
+    return EcdsaBackend
+
+
+BACKENDS = {'coincurve': _coincurve_backend, 'ecdsa': _ecdsa_backend}
+
+
+def load_backend(name=None):
+    """Return the backend class `name`, or the fastest one importable."""
+    if name is not None:
+        return BACKENDS[name]()
+    for factory in BACKENDS.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    raise ImportError("install coincurve or ecdsa to sign DID transaction hashes")
+
+
+def did_digest(did):
+    return hashlib.sha256(did.encode('utf-8')).digest()
+
+
+def load_or_create_secret(path):
+    """32-byte signing secret stored as hex in `path`; generated (mode 0600) on first use."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return bytes.fromhex(f.read().strip())
+    secret = secrets.token_bytes(32)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as f:
+        f.write(secret.hex())
+    return secret
+
+
+def _sign_chunk(backend_name, secret, dids):
+    signer = load_backend(backend_name)(secret)
+    results = []
+    for did in dids:
+        digest = did_digest(did)
+        results.append((digest.hex(), signer.sign_digest(digest).hex()))
+    return results
+
+
+def _verify_chunk(backend_name, public_key, items):
+    backend = load_backend(backend_name)
+    return [backend.verify_digest(public_key, bytes.fromhex(signature), bytes.fromhex(did_hash))
+            for did_hash, signature in items]
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class DidSigner:
+    """Sign and verify batches of DIDs, optionally spread over a process pool."""
+
+    def __init__(self, secret=None, backend=None, workers=1, chunk_size=256):
+        self.secret = secret or secrets.token_bytes(32)
+        self.backend = load_backend(backend)
+        self.signer = self.backend(self.secret)
+        self.public_key = self.signer.public_key
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_key_file(cls, path, **kwargs):
+        """Signer with the persistent key in `path`; its public key is written to `<path>.pub`.
+
+        Signatures made with a throwaway key cannot be checked by anyone, so the
+        onboarding scripts sign with a key that outlives the run.
+        """
+        signer = cls(load_or_create_secret(path), **kwargs)
+        with open(path + '.pub', 'w') as f:
+            f.write(signer.public_key.hex())
+        return signer
+
+    def _map(self, func, arg, items):
+        if self.workers <= 1 or len(items) <= self.chunk_size:
+            return func(self.backend.name, arg, items)
+        results = []
+        with ProcessPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(func, self.backend.name, arg, chunk)
+                       for chunk in _chunks(items, self.chunk_size)]
+            for future in futures:
+                results.extend(future.result())
+        return results
+
+    def sign(self, dids):
+        """Return a (sha256 hex, signature hex) pair for every DID, in order."""
+        return self._map(_sign_chunk, self.secret, list(dids))
+
+    def verify(self, items, public_key=None):
+        """Check (sha256 hex, signature hex) pairs; returns one bool per pair."""
+        return self._map(_verify_chunk, public_key or self.public_key, list(items))
+
+
+def benchmark(count, workers):
+    dids = [secrets.token_hex(11) for _ in range(count)]
+    for name in BACKENDS:
+        try:
+            load_backend(name)
+        except ImportError:
+            print(f"{name:<10} not installed")
+            continue
+        for n in sorted({1, workers}):
+            signer = DidSigner(backend=name, workers=n)
+            start = time.perf_counter()
+            items = signer.sign(dids)
+            signed = time.perf_counter() - start
+            start = time.perf_counter()
+            assert all(signer.verify(items))
+            verified = time.perf_counter() - start
+            print(f"{name:<10} workers={n:<3} sign {count / signed:10.0f} sig/s   "
+                  f"verify {count / verified:10.0f} sig/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DID hash signing backends")
+    parser.add_argument('--count', type=int, default=5000,
+                        help="Number of DIDs to sign and verify per backend")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Process pool size for the multi-core run")
+    args = parser.parse_args()
+    benchmark(args.count, args.workers)
+
+
+if __name__ == '__main__':
+    main()
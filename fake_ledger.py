@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+
+ROLES = {'TRUSTEE': '0', 'STEWARD': '2', 'TRUST_ANCHOR': '101', 'ENDORSER': '101', None: None}
+
+NYM, SCHEMA, CRED_DEF = '1', '101', '102'
+GET_NYM, GET_SCHEMA, GET_CRED_DEF = '105', '107', '108'
+TXN_NAMES = {NYM: 'NYM', SCHEMA: 'SCHEMA', CRED_DEF: 'CRED_DEF',
+             GET_NYM: 'GET_NYM', GET_SCHEMA: 'GET_SCHEMA', GET_CRED_DEF: 'GET_CRED_DEF'}
+WRITES = (NYM, SCHEMA, CRED_DEF)
+
+
+class FakeLedger:
+    """In-process stand-in for `indy.ledger`, for offline throughput benchmarks and load tests.
+
+    Implements the request builders, submit calls and GET response parsers used by the
+    onboarding flow for NYM, SCHEMA and CRED_DEF writes and their GET_* reads. Every
+    submit sleeps `latency` seconds (+/- `jitter`) to model a pool round trip.
+
+    Failure injection: a write is answered with REQNACK with probability `failure_rate`,
+    any submit raises asyncio.TimeoutError with probability `timeout_rate`, and a write
+    only becomes visible to reads `read_lag` seconds after it was ordered (reads before
+    that see `data: null`, like a lagging node), which exercises the polling in
+    ensure_previous_request_applied.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, failure_rate=0.0, timeout_rate=0.0, read_lag=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.read_lag = read_lag
+        self.random = random.Random(seed)
+        self.req_ids = itertools.count(1)
+        self.seq_no = 0
+        self.nyms = {}
+        self.schemas = {}
+        self.cred_defs = {}
+        self.submitted = 0
+        self.counts = {}
+
+    def _request(self, submitter_did, operation):
+        return json.dumps({'reqId': next(self.req_ids), 'identifier': submitter_did,
+                           'protocolVersion': 2, 'operation': operation})
+
+    ########################################
+    # Request builders
+    ########################################
+
+    async def build_nym_request(self, submitter_did, target_did, ver_key, alias, role):
+        operation = {'type': NYM, 'dest': target_did, 'verkey': ver_key, 'role': ROLES.get(role, role)}
+        if alias is not None:
+            operation['alias'] = alias
+        return self._request(submitter_did, operation)
+
+    async def build_schema_request(self, submitter_did, data):
+        schema = json.loads(data)
+        operation = {'type': SCHEMA, 'data': {'name': schema['name'], 'version': schema['version'],
+                                              'attr_names': schema['attrNames']}}
+        return self._request(submitter_did, operation)
+
+    async def build_cred_def_request(self, submitter_did, data):
+        cred_def = json.loads(data)
+        operation = {'type': CRED_DEF, 'ref': int(cred_def['schemaId']), 'signature_type': cred_def['type'],
+                     'tag': cred_def['tag'], 'data': cred_def['value']}
+        return self._request(submitter_did, operation)
+
+    async def build_get_nym_request(self, submitter_did, target_did):
+        return self._request(submitter_did, {'type': GET_NYM, 'dest': target_did})
+
+    async def build_get_schema_request(self, submitter_did, id_):
+        dest, _, name, version = id_.split(':')
+        return self._request(submitter_did, {'type': GET_SCHEMA, 'dest': dest,
+                                             'data': {'name': name, 'version': version}})
+
+    async def build_get_cred_def_request(self, submitter_did, id_):
+        origin, _, signature_type, ref, tag = id_.split(':')
+        return self._request(submitter_did, {'type': GET_CRED_DEF, 'origin': origin, 'ref': int(ref),
+                                             'signature_type': signature_type, 'tag': tag})
+
+    async def sign_request(self, wallet_handle, submitter_did, request_json):
+        request = json.loads(request_json)
+        request['signature'] = hashlib.sha256(request_json.encode('utf-8')).hexdigest()
+        return json.dumps(request)
+
+    ########################################
+    # Submission
+    ########################################
+
+    async def submit_request(self, pool_handle, request_json):
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        self.submitted += 1
+        request = json.loads(request_json)
+        operation = request['operation']
+        txn_type = operation['type']
+        self.counts[txn_type] = self.counts.get(txn_type, 0) + 1
+        if self.timeout_rate and self.random.random() < self.timeout_rate:
+            raise asyncio.TimeoutError("simulated pool timeout on {}".format(TXN_NAMES.get(txn_type, txn_type)))
+        if txn_type in WRITES:
+            if 'signature' not in request:
+                return self._reply(request, 'REQNACK', reason="client request invalid: missing signature")
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                return self._reply(request, 'REQNACK', reason="simulated pool failure")
+        handler = {NYM: self._nym, SCHEMA: self._schema, CRED_DEF: self._cred_def,
+                   GET_NYM: self._get_nym, GET_SCHEMA: self._get_schema, GET_CRED_DEF: self._get_cred_def}.get(txn_type)
+        if handler is None:
+            return self._reply(request, 'REQNACK', reason="unsupported operation type {}".format(txn_type))
+        return handler(request, operation)
+
+    async def sign_and_submit_request(self, pool_handle, wallet_handle, submitter_did, request_json):
+        return await self.submit_request(pool_handle, await self.sign_request(wallet_handle, submitter_did,
+                                                                               request_json))
+
+    def _order(self, request, operation):
+        self.seq_no += 1
+        return self._reply(request, 'REPLY', txn={'data': operation, 'metadata': {'reqId': request['reqId']}},
+                           txnMetadata={'seqNo': self.seq_no, 'txnTime': int(time.time())})
+
+    def _nym(self, request, operation):
+        reply = self._order(request, operation)
+        self.nyms[operation['dest']] = dict(operation, seqNo=self.seq_no, identifier=request['identifier'],
+                                            visible=time.monotonic() + self.read_lag)
+        return reply
+
+    def _schema(self, request, operation):
+        data = operation['data']
+        key = (request['identifier'], data['name'], data['version'])
+        if key in self.schemas:
+            return self._reply(request, 'REJECT', reason="schema {}:{} already exists".format(data['name'],
+                                                                                           data['version']))
+        reply = self._order(request, operation)
+        self.schemas[key] = {'data': data, 'seqNo': self.seq_no, 'visible': time.monotonic() + self.read_lag}
+        return reply
+
+    def _cred_def(self, request, operation):
+        key = (request['identifier'], operation['signature_type'], operation['ref'], operation['tag'])
+        reply = self._order(request, operation)
+        self.cred_defs[key] = {'data': operation['data'], 'seqNo': self.seq_no,
+                               'visible': time.monotonic() + self.read_lag}
+        return reply
+
+    def _read(self, request, entry, data, **fields):
+        if entry is None or time.monotonic() < entry['visible']:
+            return self._reply(request, 'REPLY', data=None, seqNo=None, **fields)
+        return self._reply(request, 'REPLY', data=data, seqNo=entry['seqNo'], **fields)
+
+    def _get_nym(self, request, operation):
+        entry = self.nyms.get(operation['dest'])
+        data = None if entry is None else json.dumps({'dest': operation['dest'], 'verkey': entry['verkey'],
+                                                      'role': entry['role'], 'identifier': entry['identifier']})
+        return self._read(request, entry, data, dest=operation['dest'])
+
+    def _get_schema(self, request, operation):
+        entry = self.schemas.get((operation['dest'], operation['data']['name'], operation['data']['version']))
+        return self._read(request, entry, entry and entry['data'], dest=operation['dest'])
+
+    def _get_cred_def(self, request, operation):
+        entry = self.cred_defs.get((operation['origin'], operation['signature_type'], operation['ref'],
+                                    operation['tag']))
+        return self._read(request, entry, entry and entry['data'], origin=operation['origin'],
+                          ref=operation['ref'], signature_type=operation['signature_type'], tag=operation['tag'])
+
+    def _reply(self, request, op, reason=None, **result):
+        # As on the wire: a REPLY carries reqId/identifier only inside `result`, NACKs at the top level.
+        if op == 'REPLY':
+            return json.dumps({'op': op, 'result': dict(result, reqId=request['reqId'],
+                                                        identifier=request['identifier'])})
+        return json.dumps({'op': op, 'reqId': request['reqId'], 'identifier': request['identifier'],
+                           'reason': reason})
+
+    ########################################
+    # GET response parsers
+    ########################################
+
+    async def parse_get_schema_response(self, get_schema_response):
+        result = json.loads(get_schema_response)['result']
+        data = result['data']
+        schema_id = '{}:2:{}:{}'.format(result['dest'], data['name'], data['version'])
+        return schema_id, json.dumps({'ver': '1.0', 'id': schema_id, 'name': data['name'],
+                                      'version': data['version'], 'attrNames': data['attr_names'],
+                                      'seqNo': result['seqNo']})
+
+    async def parse_get_cred_def_response(self, get_cred_def_response):
+        result = json.loads(get_cred_def_response)['result']
+        cred_def_id = '{}:3:{}:{}:{}'.format(result['origin'], result['signature_type'], result['ref'],
+                                             result['tag'])
+        return cred_def_id, json.dumps({'ver': '1.0', 'id': cred_def_id, 'schemaId': str(result['ref']),
+                                        'type': result['signature_type'], 'tag': result['tag'],
+                                        'value': result['data']})
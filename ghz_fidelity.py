@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Vectorized Bell/GHZ fidelity checks without simulator round trips.
+
+The ideal n-qubit GHZ state (|0...0> + |1...1>)/sqrt(2) is known analytically, so
+validating a batch of states is one array operation against that vector instead of a
+transpile/execute/state_fidelity call per state.
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+BELL_STATES = {
+    'phi+': (0b00, 0b11, 1),
+    'phi-': (0b00, 0b11, -1),
+    'psi+': (0b01, 0b10, 1),
+    'psi-': (0b01, 0b10, -1),
+}
+
+
+def ghz_statevector(n_qubits, dtype=np.complex128):
+    """(|0...0> + |1...1>) / sqrt(2) on `n_qubits` qubits."""
+    state = np.zeros(2 ** n_qubits, dtype=dtype)
+    state[0] = state[-1] = 1 / np.sqrt(2)
+    return state
+
+
+def bell_statevector(kind='phi+', dtype=np.complex128):
+    first, second, sign = BELL_STATES[kind]
+    state = np.zeros(4, dtype=dtype)
+    state[first] = 1 / np.sqrt(2)
+    state[second] = sign / np.sqrt(2)
+    return state
+
+
+def batch_state_fidelity(states, target):
+    """Fidelity of every state in a batch with the pure `target`.
+
+    `states` is (batch, 2**n) for statevectors or (batch, 2**n, 2**n) for density
+    matrices; returns a (batch,) array of |<target|psi>|^2 or <target|rho|target>.
+    """
+    states = np.asarray(states)
+    target = np.asarray(target)
+    if states.ndim == 2:
+        return np.abs(states @ target.conj()) ** 2
+    return np.real(np.einsum('i,bij,j->b', target.conj(), states, target))
+
+
+def batch_ghz_fidelity(states):
+    """Fidelity of a batch with the GHZ state, reading only the |0...0> and |1...1> amplitudes."""
+    states = np.asarray(states)
+    if states.ndim == 2:
+        return np.abs(states[:, 0] + states[:, -1]) ** 2 / 2
+    return np.real(states[:, 0, 0] + states[:, -1, -1] + states[:, 0, -1] + states[:, -1, 0]) / 2
+
+
+def counts_to_probabilities(counts_list, n_qubits):
+    """Stack qiskit count dictionaries into a (batch, 2**n) probability array."""
+    probs = np.zeros((len(counts_list), 2 ** n_qubits))
+    for row, counts in enumerate(counts_list):
+        for bitstring, count in counts.items():
+            probs[row, int(bitstring.replace(' ', ''), 2)] = count
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def batch_hellinger_fidelity(counts_list, n_qubits, target=None):
+    """Classical (Hellinger) fidelity of measured counts with the target's outcome distribution.
+
+    Same quantity as qiskit's `hellinger_fidelity`, for a whole batch at once. Z-basis
+    counts cannot see the GHZ phase, so this upper-bounds the state fidelity.
+    """
+    target = ghz_statevector(n_qubits) if target is None else np.asarray(target)
+    ideal = np.abs(target) ** 2
+    probs = counts_to_probabilities(counts_list, n_qubits)
+    return np.sqrt(probs * ideal).sum(axis=1) ** 2
+
+
+def parity_phases(n_qubits):
+    """Measurement angles k*pi/n (k = 0..n-1) of the GHZ parity oscillation."""
+    return np.pi * np.arange(n_qubits) / n_qubits
+
+
+def parity_signs(n_qubits):
+    """(-1)**popcount(i) for every computational basis index i."""
+    indices = np.arange(2 ** n_qubits)
+    popcount = np.zeros_like(indices)
+    for bit in range(n_qubits):
+        popcount += (indices >> bit) & 1
+    return 1 - 2 * (popcount & 1)
+
+
+def ghz_dfe_fidelity(z_probs, parity_probs):
+    """Direct GHZ fidelity estimate from n + 1 measurement settings.
+
+    `z_probs` is the Z-basis outcome distribution (2**n,) and `parity_probs` the (n, 2**n)
+    distributions measured with every qubit in the basis cos(phi_k) X + sin(phi_k) Y,
+    phi_k = k*pi/n. Then F = (P + C) / 2 with P the |0...0>/|1...1> population and
+    C = mean_k (-1)**k <parity_k> the coherence, so only O(n) circuits are needed
+    instead of the 3**n bases of full state tomography.
+    """
+    z_probs = np.asarray(z_probs)
+    parity_probs = np.asarray(parity_probs)
+    n_qubits = parity_probs.shape[0]
+    population = z_probs[0] + z_probs[-1]
+    parities = parity_probs @ parity_signs(n_qubits)
+    coherence = np.mean(parities * (-1.0) ** np.arange(n_qubits))
+    return (population + coherence) / 2
+
+
+def _basis_rotation(phi):
+    # H . Rz(-phi) maps the cos(phi) X + sin(phi) Y eigenbasis onto Z.
+    hadamard = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+    return hadamard @ np.diag([np.exp(1j * phi / 2), np.exp(-1j * phi / 2)])
+
+
+def simulate_dfe_probabilities(state, n_qubits, depolarizing=0.0):
+    """Exact Z and parity-basis outcome distributions of `state` mixed with white noise.
+
+    Local NumPy stand-in for running the n + 1 DFE circuits on a simulator; the state
+    is (1 - depolarizing) |state><state| + depolarizing * I / 2**n.
+    """
+    dim = 2 ** n_qubits
+    z_probs = (1 - depolarizing) * np.abs(state) ** 2 + depolarizing / dim
+    parity_probs = np.empty((n_qubits, dim))
+    for k, phi in enumerate(parity_phases(n_qubits)):
+        tensor = np.asarray(state).reshape((2,) * n_qubits)
+        rotation = _basis_rotation(phi)
+        for axis in range(n_qubits):
+            tensor = np.moveaxis(np.tensordot(rotation, tensor, axes=([1], [axis])), 0, axis)
+        parity_probs[k] = (1 - depolarizing) * np.abs(tensor.reshape(dim)) ** 2 + depolarizing / dim
+    return z_probs, parity_probs
+
+
+PAULI_ROTATIONS = {
+    'x': _basis_rotation(0.0),
+    'y': _basis_rotation(np.pi / 2),
+    'z': np.eye(2),
+}
+
+
+def pauli_settings(n_qubits):
+    """All 3**n product bases, as strings over 'xyz' (qubit 0 first)."""
+    return [''.join(setting) for setting in itertools.product('xyz', repeat=n_qubits)]
+
+
+def simulate_pauli_probabilities(state, n_qubits, depolarizing=0.0):
+    """Outcome distributions (3**n, 2**n) of `state` mixed with white noise in every Pauli product basis.
+
+    The measurement record of full state tomography, in `pauli_settings` order, with
+    the same noise model as `simulate_dfe_probabilities`.
+    """
+    dim = 2 ** n_qubits
+    settings = pauli_settings(n_qubits)
+    probs = np.empty((len(settings), dim))
+    for row, setting in enumerate(settings):
+        tensor = np.asarray(state).reshape((2,) * n_qubits)
+        for axis, basis in enumerate(setting):
+            tensor = np.moveaxis(np.tensordot(PAULI_ROTATIONS[basis], tensor, axes=([1], [axis])), 0, axis)
+        probs[row] = (1 - depolarizing) * np.abs(tensor.reshape(dim)) ** 2 + depolarizing / dim
+    return probs
+
+
+def ghz_tomography_fidelity(pauli_probs, n_qubits):
+    """GHZ fidelity of the linear-inversion tomography estimate from all 3**n Pauli bases.
+
+    The reconstruction is rho = mean_s sum_b p(b|s) (x)_i (3 U_i^+|b_i><b_i|U_i - I), so
+    <GHZ|rho|GHZ> is a weighted sum of the outcome frequencies and the density matrix
+    itself never has to be formed.
+    """
+    pauli_probs = np.asarray(pauli_probs)
+    # Inverse measurement channel per basis and outcome: (basis, outcome, 2, 2).
+    inverse = {basis: np.stack([3 * np.outer(rotation[b].conj(), rotation[b]) - np.eye(2) for b in (0, 1)])
+               for basis, rotation in PAULI_ROTATIONS.items()}
+    fidelity = 0.0
+    for row, setting in enumerate(pauli_settings(n_qubits)):
+        # <GHZ|M|GHZ> only reads the |0...0> and |1...1> rows and columns of the product.
+        weights = 0
+        for j, k in ((0, 0), (1, 1), (0, 1), (1, 0)):
+            term = np.ones(1)
+            for basis in setting:
+                term = np.kron(term, inverse[basis][:, j, k])
+            weights = weights + term
+        fidelity += np.real(pauli_probs[row] @ weights) / 2
+    return fidelity / 3 ** n_qubits
+
+
+def sample_probabilities(probs, shots, rng):
+    """Replace exact outcome distributions by `shots`-sample empirical frequencies."""
+    probs = np.asarray(probs)
+    flat = probs.reshape(-1, probs.shape[-1])
+    samples = np.stack([rng.multinomial(shots, row / row.sum()) for row in flat]) / shots
+    return samples.reshape(probs.shape)
+
+
+def ghz_dfe_circuits(n_qubits):
+    """Qiskit circuits for the Z setting and the n parity settings, in that order."""
+    from qiskit import QuantumCircuit
+
+    circuits = []
+    for phi in [None] + list(parity_phases(n_qubits)):
+        qc = QuantumCircuit(n_qubits, n_qubits)
+        qc.h(0)
+        for i in range(n_qubits - 1):
+            qc.cx(i, i + 1)
+        if phi is not None:
+            for i in range(n_qubits):
+                qc.rz(-phi, i)
+                qc.h(i)
+        qc.measure(range(n_qubits), range(n_qubits))
+        circuits.append(qc)
+    return circuits
+
+
+def ghz_ladder_size(circuit):
+    """Number of qubits if `circuit` is exactly H(0) then CX(i, i+1) down the register, else None.
+
+    Measurements and barriers are ignored, so a measured GHZ/Bell circuit still matches.
+    """
+    gates = [(item[0].name, [circuit.find_bit(q).index for q in item[1]])
+             for item in circuit.data if item[0].name not in ('measure', 'barrier')]
+    n_qubits = circuit.num_qubits
+    expected = [('h', [0])] + [('cx', [i, i + 1]) for i in range(n_qubits - 1)]
+    return n_qubits if gates == expected else None
+
+
+def circuit_statevector(circuit):
+    """Statevector of `circuit`, analytic for a GHZ ladder and simulated otherwise."""
+    n_qubits = ghz_ladder_size(circuit)
+    if n_qubits is not None:
+        return ghz_statevector(n_qubits)
+    from qiskit.quantum_info import Statevector
+    return np.asarray(Statevector.from_instruction(circuit.remove_final_measurements(inplace=False)))
+
+
+def noisy_ghz_batch(n_qubits, batch, noise, rng):
+    """GHZ statevectors with complex Gaussian noise of scale `noise`, renormalized."""
+    states = np.tile(ghz_statevector(n_qubits), (batch, 1))
+    states += noise * (rng.standard_normal(states.shape) + 1j * rng.standard_normal(states.shape))
+    return states / np.linalg.norm(states, axis=1, keepdims=True)
+
+
+def _aer_fidelity(n_qubits):
+    from qiskit import Aer, QuantumCircuit, execute
+    from qiskit.quantum_info import Statevector, state_fidelity
+
+    qc = QuantumCircuit(n_qubits)
+    qc.h(0)
+    for i in range(n_qubits - 1):
+        qc.cx(i, i + 1)
+    out_state = execute(qc, Aer.get_backend('statevector_simulator')).result().get_statevector()
+    return state_fidelity(Statevector(ghz_statevector(n_qubits)), out_state)
+
+
+def benchmark(min_qubits, max_qubits, batch, repeat):
+    rng = np.random.default_rng(0)
+    try:
+        import qiskit  # noqa: F401
+        have_aer = True
+    except ImportError:
+        have_aer = False
+        print("qiskit not installed, timing the vectorized path only")
+    print(f"{'qubits':>6} {'vectorized/state':>18} {'aer/state':>12} {'speedup':>9}")
+    for n_qubits in range(min_qubits, max_qubits + 1):
+        size = max(1, min(batch, (1 << 22) // 2 ** n_qubits))
+        states = noisy_ghz_batch(n_qubits, size, 0.01, rng)
+        start = time.perf_counter()
+        batch_ghz_fidelity(states)
+        vectorized = (time.perf_counter() - start) / size
+        if have_aer:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                _aer_fidelity(n_qubits)
+            aer = (time.perf_counter() - start) / repeat
+            print(f"{n_qubits:>6} {vectorized * 1e6:>16.1f}us {aer * 1e3:>10.2f}ms {aer / vectorized:>8.0f}x")
+        else:
+            print(f"{n_qubits:>6} {vectorized * 1e6:>16.1f}us {'-':>12} {'-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized GHZ fidelity against the Aer path")
+    parser.add_argument('--min_qubits', type=int, default=2, help="Smallest GHZ register")
+    parser.add_argument('--max_qubits', type=int, default=20, help="Largest GHZ register")
+    parser.add_argument('--batch', type=int, default=64,
+                        help="States per vectorized fidelity call (capped for large registers)")
+    parser.add_argument('--repeat', type=int, default=3, help="Aer executions per register size")
+    args = parser.parse_args()
+    benchmark(args.min_qubits, args.max_qubits, args.batch, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
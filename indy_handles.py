@@ -0,0 +1,119 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+from lazy_import import LazyModule
+
+pool = LazyModule('indy.pool')
+wallet = LazyModule('indy.wallet')
+indy_error = LazyModule('indy.error')
+
+
+class WalletHandles:
+    """Reference-counted Indy wallet handles keyed by wallet id, with an LRU of idle ones.
+
+    Opening a wallet runs the key derivation on `wallet_credentials`, so a known
+    steward, issuer or holder is opened once and its handle reused. Every `open()`
+    takes a reference that the caller gives back with `release()`; a handle with
+    references is never closed. Long-lived identities (steward, issuer, verifier)
+    simply never release theirs. Released handles stay open for reuse, and only
+    the least recently released beyond `maxsize` idle handles are closed.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.handles = {}
+        self.refs = {}
+        self.idle = OrderedDict()
+        self.locks = {}
+        self.closing = {}
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+
+    async def open(self, wallet_config, wallet_credentials):
+        wallet_id = json.loads(wallet_config)['id']
+        lock = self.locks.setdefault(wallet_id, asyncio.Lock())
+        async with lock:
+            if wallet_id in self.closing:
+                # An evicted handle of this wallet is still closing; reopen after it.
+                await asyncio.shield(self.closing[wallet_id])
+            handle = self.handles.get(wallet_id)
+            if handle is not None:
+                self.reused += 1
+            else:
+                try:
+                    await wallet.create_wallet(wallet_config, wallet_credentials)
+                except indy_error.IndyError as ex:
+                    if ex.error_code != indy_error.ErrorCode.WalletAlreadyExistsError:
+                        raise
+                handle = self.handles[wallet_id] = await wallet.open_wallet(wallet_config, wallet_credentials)
+                self.opened += 1
+            self.refs[wallet_id] = self.refs.get(wallet_id, 0) + 1
+            self.idle.pop(wallet_id, None)
+        return handle
+
+    async def release(self, wallet_config):
+        """Give back one reference; the handle stays open (idle) until evicted."""
+        wallet_id = json.loads(wallet_config)['id']
+        refs = self.refs.get(wallet_id, 0) - 1
+        if refs < 0:
+            raise ValueError("wallet {!r} released more often than opened".format(wallet_id))
+        self.refs[wallet_id] = refs
+        if refs == 0:
+            self.idle[wallet_id] = self.handles[wallet_id]
+            await self._evict()
+
+    async def _evict(self):
+        while len(self.idle) > self.maxsize:
+            wallet_id, handle = self.idle.popitem(last=False)
+            del self.handles[wallet_id], self.refs[wallet_id]
+            closing = self.closing[wallet_id] = asyncio.get_running_loop().create_future()
+            try:
+                await wallet.close_wallet(handle)
+                self.closed += 1
+            finally:
+                del self.closing[wallet_id]
+                closing.set_result(None)
+                if wallet_id in self.locks and not self.locks[wallet_id].locked():
+                    del self.locks[wallet_id]
+
+    async def close_all(self):
+        while self.handles:
+            _, handle = self.handles.popitem()
+            await wallet.close_wallet(handle)
+            self.closed += 1
+        self.refs.clear()
+        self.idle.clear()
+        self.locks.clear()
+
+    def metrics(self):
+        return {'open': len(self.handles), 'in_use': len(self.handles) - len(self.idle), 'opened': self.opened,
+                'reused': self.reused, 'closed': self.closed}
+
+
+_pool_handles = {}
+
+
+async def open_pool(name, genesis_txn_path, protocol_version=2):
+    """Return the pool handle for `name`, creating and opening the ledger config once per process."""
+    handle = _pool_handles.get(name)
+    if handle is not None:
+        return handle
+    await pool.set_protocol_version(protocol_version)
+    try:
+        await pool.create_pool_ledger_config(name, json.dumps({"genesis_txn": str(genesis_txn_path)}))
+    except indy_error.IndyError as ex:
+        if ex.error_code != indy_error.ErrorCode.PoolLedgerConfigAlreadyExistsError:
+            raise
+    handle = _pool_handles[name] = await pool.open_pool_ledger(name, None)
+    return handle
+
+
+async def close_pools():
+    while _pool_handles:
+        _, handle = _pool_handles.popitem()
+        await pool.close_pool_ledger(handle)
+
+
+wallet_handles = WalletHandles()
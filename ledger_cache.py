@@ -0,0 +1,88 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class LedgerCache:
+    """Read-through cache for immutable ledger objects (schemas, credential definitions).
+
+    Entries live in an in-memory LRU tier and, when `db_path` is given, in an sqlite
+    tier that survives restarts. Both tiers honour `ttl` seconds (None keeps forever).
+    Concurrent misses for the same id are collapsed into one ledger fetch.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0, db_path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS ledger_cache "
+                            "(key TEXT PRIMARY KEY, value TEXT, stored REAL)")
+            self.db.commit()
+
+    def _fresh(self, stored):
+        return self.ttl is None or time.time() - stored < self.ttl
+
+    def _remember(self, key, value, stored):
+        self.entries[key] = (value, stored)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and self._fresh(entry[1]):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.db is not None:
+            row = self.db.execute("SELECT value, stored FROM ledger_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._fresh(row[1]):
+                value = tuple(json.loads(row[0]))
+                self._remember(key, value, row[1])
+                self.disk_hits += 1
+                return value
+        return None
+
+    def put(self, key, value):
+        stored = time.time()
+        self._remember(key, value, stored)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO ledger_cache VALUES (?, ?, ?)",
+                            (key, json.dumps(list(value)), stored))
+            self.db.commit()
+
+    async def get_or_fetch(self, key, fetch):
+        """Return the cached value for `key`, awaiting `fetch()` once on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        future = self.pending.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+        self.misses += 1
+        future = asyncio.ensure_future(fetch())
+        self.pending[key] = future
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        self.put(key, value)
+        return value
+
+    def metrics(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'size': len(self.entries)}
+
+
+# Shared by every issuer and holder in the process.
+ledger_cache = LedgerCache()
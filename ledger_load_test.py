@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import json
+import secrets
+import time
+
+import numpy as np
+
+import DID_WalletAddress_Generation as onboarding
+from fake_ledger import TXN_NAMES, FakeLedger
+from ledger_cache import LedgerCache
+
+STEWARD_DID = 'Th7MpTaRZVRYnPiabds81Y'
+
+
+class StepLatencies:
+    """Latency samples and failures per flow step, for throughput and tail-latency reports."""
+
+    def __init__(self):
+        self.samples = {}
+        self.failures = {}
+        self.started = time.perf_counter()
+
+    async def timed(self, step, coro):
+        start = time.perf_counter()
+        try:
+            result = await coro
+        except Exception:
+            self.failures[step] = self.failures.get(step, 0) + 1
+            raise
+        self.samples.setdefault(step, []).append(time.perf_counter() - start)
+        return result
+
+    def fail(self, step):
+        self.failures[step] = self.failures.get(step, 0) + 1
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        steps = {}
+        for step in list(self.samples) + [s for s in self.failures if s not in self.samples]:
+            latencies = np.asarray(self.samples.get(step, [])) * 1000
+            steps[step] = {
+                'ok': len(latencies), 'failed': self.failures.get(step, 0),
+                'per_sec': len(latencies) / wall if wall else 0.0,
+                **{name: float(np.percentile(latencies, q)) if len(latencies) else None
+                   for name, q in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99), ('max_ms', 100))}}
+        return {'wall_s': wall, 'steps': steps}
+
+    def report(self):
+        summary = self.summary()
+        print("wall time {:.2f}s".format(summary['wall_s']))
+        print("  {:<14} {:>7} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            'step', 'ok', 'failed', 'per sec', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+        for step, entry in summary['steps'].items():
+            print("  {:<14} {:>7} {:>7} {:>9.1f} ".format(step, entry['ok'], entry['failed'], entry['per_sec']) +
+                  ' '.join('{:>9}'.format('-' if entry[k] is None else '{:.1f}'.format(entry[k]))
+                           for k in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+
+
+async def _write(stats, step, submitter_did, request):
+    """Sign and submit a write; a REQNACK/REJECT counts as a failed step."""
+    response = json.loads(await stats.timed(step, onboarding.ledger.sign_and_submit_request(
+        None, None, submitter_did, request)))
+    if response.get('op') != 'REPLY':
+        stats.samples[step].pop()
+        stats.fail(step)
+        raise RuntimeError("{} rejected: {}".format(step, response.get('reason')))
+    return response
+
+
+async def run_issuer(index, holders, semaphore, stats, holder_nyms):
+    """Issuer verinym, schema, schema read-back and cred def, then its holders concurrently."""
+    ledger = onboarding.ledger
+    issuer_did = secrets.token_hex(11)
+
+    async def setup():
+        await _write(stats, 'issuer_nym', STEWARD_DID,
+                     await ledger.build_nym_request(STEWARD_DID, issuer_did, secrets.token_hex(16), None,
+                                                    'TRUST_ANCHOR'))
+        schema = {'ver': '1.0', 'name': 'Transcript{}'.format(index), 'version': '1.2',
+                  'attrNames': ['first_name', 'last_name', 'credentials', 'country', 'year', 'date', 'ssn',
+                                'nonce']}
+        schema['id'] = '{}:2:{}:{}'.format(issuer_did, schema['name'], schema['version'])
+        await _write(stats, 'schema', issuer_did, await ledger.build_schema_request(issuer_did, json.dumps(schema)))
+        _, schema_json = await stats.timed('get_schema', onboarding.get_schema(None, issuer_did, schema['id']))
+        seq_no = json.loads(schema_json)['seqNo']
+        cred_def = {'ver': '1.0', 'schemaId': str(seq_no), 'type': 'CL', 'tag': 'TAG1',
+                    'value': {'primary': {'n': secrets.token_hex(32)}}}
+        await _write(stats, 'cred_def', issuer_did, await ledger.build_cred_def_request(issuer_did,
+                                                                                       json.dumps(cred_def)))
+        return seq_no
+
+    try:
+        async with semaphore:
+            # issuer_total covers successful and failed setups alike.
+            seq_no = await stats.timed('issuer_total', setup())
+        cred_def_id = '{}:3:CL:{}:TAG1'.format(issuer_did, seq_no)
+    except (RuntimeError, asyncio.TimeoutError):
+        for _ in range(holders):
+            stats.fail('holder_total')
+        return
+
+    async def holder():
+        holder_did = secrets.token_hex(11)
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                if holder_nyms:
+                    await _write(stats, 'holder_nym', STEWARD_DID,
+                                 await ledger.build_nym_request(STEWARD_DID, holder_did, secrets.token_hex(16),
+                                                                None, None))
+                await stats.timed('get_cred_def', onboarding.get_cred_def(None, holder_did, cred_def_id))
+                stats.samples.setdefault('holder_total', []).append(time.perf_counter() - start)
+        except (RuntimeError, asyncio.TimeoutError):
+            stats.fail('holder_total')
+
+    await asyncio.gather(*(holder() for _ in range(holders)))
+
+
+async def load_test(issuers, holders_per_issuer, concurrency, holder_nyms):
+    stats = StepLatencies()
+    semaphore = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(run_issuer(index, holders_per_issuer, semaphore, stats, holder_nyms)
+                           for index in range(issuers)))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the AnonCreds onboarding ledger flow against "
+                                                 "an in-process fake Indy ledger")
+    parser.add_argument('--issuers', type=int, default=4, help="Concurrent issuers")
+    parser.add_argument('--holders', type=int, default=250, help="Holders per issuer")
+    parser.add_argument('--concurrency', type=int, default=64, help="Flow steps in flight at once")
+    parser.add_argument('--holder_nyms', action='store_true', help="Also register a NYM for every holder")
+    parser.add_argument('--latency', type=float, default=0.05, help="Simulated pool round trip (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Uniform +/- jitter on the round trip")
+    parser.add_argument('--failure_rate', type=float, default=0.0, help="Probability a write is REQNACKed")
+    parser.add_argument('--timeout_rate', type=float, default=0.0, help="Probability a submit times out")
+    parser.add_argument('--read_lag', type=float, default=0.0,
+                        help="Seconds before a write is visible to GET reads")
+    parser.add_argument('--no_cache', action='store_true', help="Bypass the schema/cred-def ledger cache")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the fake ledger's failure injection")
+    parser.add_argument('--json', type=str, default=None, help="Also write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    onboarding.ledger = FakeLedger(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                                   timeout_rate=args.timeout_rate, read_lag=args.read_lag, seed=args.seed)
+    onboarding.ledger_cache = LedgerCache(maxsize=0 if args.no_cache else 1024)
+    stats = asyncio.run(load_test(args.issuers, args.holders, args.concurrency, args.holder_nyms))
+
+    stats.report()
+    onboarding.poll_stats.report()
+    print("  ledger cache: {}".format(onboarding.ledger_cache.metrics()))
+    print("  ledger submits: {}".format({name: onboarding.ledger.counts.get(txn_type, 0)
+                                          for txn_type, name in TXN_NAMES.items()}))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats.summary(), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+"""Validator pool topology and latency-aware routing of ledger reads.
+
+The genesis transactions (e.g. `Validator_pool.txn`) are parsed into a node table,
+every node keeps rolling latency and error statistics, and read-only GET_* requests
+go to the fastest healthy validator instead of the whole pool. If the first node has
+not answered after the hedge delay, the request is also sent to the next node and the
+first reply wins.
+
+A single node's reply is not a consensus result: route reads this way only where the
+replies carry state proofs that are checked, or where the pool is trusted. Writes
+still go through `indy.ledger`, which collects the consensus replies.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from fake_ledger import GET_CRED_DEF, GET_NYM, GET_SCHEMA, FakeLedger
+
+# GET_TXN, GET_ATTR, GET_REVOC_REG_DEF, GET_REVOC_REG and GET_REVOC_REG_DELTA besides the fake ledger's reads.
+READS = (GET_NYM, GET_SCHEMA, GET_CRED_DEF, '3', '104', '115', '116', '117')
+
+NodeInfo = namedtuple('NodeInfo', 'alias dest client_ip client_port node_ip node_port services')
+
+
+def load_genesis(path):
+    """Node table {alias: NodeInfo} of the validators in a genesis transactions file.
+
+    Later NODE transactions for the same `dest` update the earlier ones, as on the
+    ledger; nodes whose services no longer include VALIDATOR are dropped.
+    """
+    by_dest = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            txn = json.loads(line)['txn']
+            if txn['type'] != '0':
+                continue
+            dest, data = txn['data']['dest'], txn['data']['data']
+            previous = by_dest.get(dest)
+            fields = previous._asdict() if previous else {'dest': dest}
+            fields.update({key: data[key] for key in NodeInfo._fields if key in data})
+            fields.setdefault('services', [])
+            by_dest[dest] = NodeInfo(**{key: fields.get(key) for key in NodeInfo._fields})
+    return OrderedDict((node.alias, node) for node in by_dest.values() if 'VALIDATOR' in node.services)
+
+
+########################################
+# Per-Node Statistics
+########################################
+
+class NodeStats:
+    """Rolling window of latencies and outcomes of one node.
+
+    After `max_failures` consecutive errors or misses (reads still unanswered when
+    another node won the race after this one's hedge deadline) the node is marked
+    down for `cooldown` seconds; once that passes it is tried again and recovers on
+    its next success.
+    """
+
+    def __init__(self, window=100, max_failures=3, cooldown=30.0):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self.misses = 0
+
+    def success(self, latency):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def miss(self, elapsed):
+        """No reply within the hedge deadline: `elapsed` is a lower bound on the latency."""
+        self.latencies.append(elapsed)
+        self.misses += 1
+        self.failure()
+
+    def failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.max_failures:
+            self.down_until = time.monotonic() + self.cooldown
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def quantile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def score(self):
+        """Expected seconds per successful read; unmeasured nodes score 0 so they get probed."""
+        if not self.latencies:
+            return 0.0
+        return statistics.median(self.latencies) / max(1.0 - self.error_rate, 0.05)
+
+
+########################################
+# Routing
+########################################
+
+class PoolTopology:
+    """Sends GET_* requests to the fastest healthy validators, hedging to the next one.
+
+    `transport.request(node, request_json, timeout)` delivers one request to one node
+    and returns its reply (a JSON string). The hedge delay is `hedge_after` seconds if
+    given, otherwise the `hedge_quantile` latency of the chosen node once it has
+    `min_samples` measurements (`default_hedge` before that). `explore` is the
+    probability of routing to a random healthy node, which keeps the statistics of
+    the other nodes fresh.
+    """
+
+    def __init__(self, nodes, transport, window=100, hedge_after=None, hedge_quantile=0.95, min_samples=5,
+                 default_hedge=0.5, timeout=10.0, max_failures=3, cooldown=30.0, explore=0.05, seed=None):
+        self.nodes = OrderedDict(nodes)
+        self.transport = transport
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.default_hedge = default_hedge
+        self.timeout = timeout
+        self.explore = explore
+        self.random = random.Random(seed)
+        self.stats = {alias: NodeStats(window, max_failures, cooldown) for alias in self.nodes}
+        self.reads = 0
+        self.hedges = 0
+        self.failed_reads = 0
+
+    @classmethod
+    def from_genesis(cls, path, transport, **kwargs):
+        return cls(load_genesis(path), transport, **kwargs)
+
+    def ranked(self):
+        """Aliases, healthy nodes first, each group by ascending score."""
+        return sorted(self.nodes, key=lambda alias: (not self.stats[alias].healthy, self.stats[alias].score()))
+
+    def hedge_delay(self, alias):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        stats = self.stats[alias]
+        if len(stats.latencies) < self.min_samples:
+            return self.default_hedge
+        return stats.quantile(self.hedge_quantile)
+
+    async def _attempt(self, alias, request_json):
+        stats = self.stats[alias]
+        stats.requests += 1
+        start = time.perf_counter()
+        try:
+            reply = await self.transport.request(self.nodes[alias], request_json, self.timeout)
+            if json.loads(reply).get('op') != 'REPLY':
+                raise LookupError("{} answered {}".format(alias, json.loads(reply).get('op')))
+        except asyncio.CancelledError:
+            # Another leg won. If this node was already past its hedge deadline, it counts
+            # as a miss, so a node that accepts requests but never answers gets demoted.
+            # A leg that simply lost a close race says nothing about its node.
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.hedge_delay(alias):
+                stats.miss(elapsed)
+            raise
+        except Exception:
+            stats.failure()
+            raise
+        stats.success(time.perf_counter() - start)
+        return alias, reply
+
+    def _leg(self, alias, request_json):
+        task = asyncio.ensure_future(self._attempt(alias, request_json))
+        # A losing leg may still fail after the read returned; its error is already in the stats.
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return task
+
+    async def submit_read(self, request_json):
+        """Reply of the first node that answers a GET_* request (a JSON string)."""
+        txn_type = json.loads(request_json).get('operation', {}).get('type')
+        if txn_type not in READS:
+            raise ValueError("only read requests can be routed to a single node, got type {}".format(txn_type))
+        self.reads += 1
+        candidates = self.ranked()
+        healthy = [alias for alias in candidates if self.stats[alias].healthy]
+        if len(healthy) > 1 and self.random.random() < self.explore:
+            pick = self.random.choice(healthy[1:])
+            candidates.remove(pick)
+            candidates.insert(0, pick)
+
+        remaining = deque(candidates)
+        running = set()
+        error = None
+        try:
+            while remaining or running:
+                if remaining and not running:
+                    # Nothing in flight (start, or every leg failed): go straight to the next node.
+                    last = remaining.popleft()
+                    running.add(self._leg(last, request_json))
+                done, _ = await asyncio.wait(running, timeout=self.hedge_delay(last) if remaining else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    last = remaining.popleft()
+                    self.stats[last].hedged += 1
+                    self.hedges += 1
+                    running.add(self._leg(last, request_json))
+                    continue
+                for task in done:
+                    running.discard(task)
+                    if task.exception() is None:
+                        alias, reply = task.result()
+                        self.stats[alias].wins += 1
+                        return reply
+                    error = task.exception()
+        finally:
+            for task in running:
+                task.cancel()
+        self.failed_reads += 1
+        raise ConnectionError("no validator answered the read") from error
+
+    def table(self):
+        rows = []
+        for alias, node in self.nodes.items():
+            stats = self.stats[alias]
+            rows.append({'alias': alias, 'client': '{}:{}'.format(node.client_ip, node.client_port),
+                         'healthy': stats.healthy, 'requests': stats.requests, 'wins': stats.wins,
+                         'hedged': stats.hedged, 'misses': stats.misses, 'error_rate': stats.error_rate,
+                         'p50_ms': None if not stats.latencies else 1000 * stats.quantile(0.5),
+                         'p95_ms': None if not stats.latencies else 1000 * stats.quantile(0.95)})
+        return rows
+
+    def report(self):
+        print("  {:<8} {:<16} {:>7} {:>8} {:>6} {:>7} {:>6} {:>7} {:>8} {:>8}".format(
+            'node', 'client', 'healthy', 'requests', 'wins', 'hedged', 'misses', 'errors', 'p50 ms', 'p95 ms'))
+        for row in self.table():
+            print("  {alias:<8} {client:<16} {healthy!s:>7} {requests:>8} {wins:>6} {hedged:>7} {misses:>6} "
+                  "{error_rate:>7.1%} ".format(**row) +
+                  ' '.join('{:>8}'.format('-' if row[k] is None else '{:.1f}'.format(row[k]))
+                           for k in ('p50_ms', 'p95_ms')))
+        print("  reads={} hedged={} failed={}".format(self.reads, self.hedges, self.failed_reads))
+
+
+########################################
+# Transports
+########################################
+
+class _Dispatcher:
+    """One connection per node; replies are matched to requests by reqId."""
+
+    def __init__(self):
+        self.connections = {}
+        self.pending = {}
+
+    async def _connection(self, node):
+        raise NotImplementedError
+
+    async def _send(self, connection, request_json):
+        raise NotImplementedError
+
+    def _deliver(self, alias, message):
+        reply = json.loads(message)
+        if reply.get('op') == 'REQACK':
+            return
+        # REQNACK/REJECT carry reqId at the top level, a REPLY only inside its result.
+        req_id = reply.get('reqId') or (reply.get('result') or {}).get('reqId')
+        future = self.pending.get((alias, req_id))
+        if future is not None and not future.done():
+            future.set_result(message if isinstance(message, str) else message.decode('utf-8'))
+
+    def _drop(self, alias, error):
+        self.connections.pop(alias, None)
+        for (pending_alias, _), future in self.pending.items():
+            if pending_alias == alias and not future.done():
+                future.set_exception(error)
+
+    async def request(self, node, request_json, timeout):
+        key = (node.alias, json.loads(request_json)['reqId'])
+        future = self.pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            connection = await asyncio.wait_for(self._connection(node), timeout)
+            await self._send(connection, request_json)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(key, None)
+
+
+class JsonLineTransport(_Dispatcher):
+    """Newline-delimited JSON over TCP, as spoken by `StubNode`."""
+
+    async def _connection(self, node):
+        # Concurrent first requests to a node share one connection attempt.
+        connection = self.connections.get(node.alias)
+        if connection is None:
+            connection = self.connections[node.alias] = asyncio.ensure_future(self._connect(node))
+        try:
+            return await asyncio.shield(connection)
+        except OSError:
+            if self.connections.get(node.alias) is connection:
+                del self.connections[node.alias]
+            raise
+
+    async def _connect(self, node):
+        reader, writer = await asyncio.open_connection(node.client_ip, node.client_port)
+        return writer, asyncio.ensure_future(self._read(node.alias, reader))
+
+    async def _read(self, alias, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("{} closed the connection".format(alias))
+                self._deliver(alias, line.decode('utf-8'))
+        except Exception as ex:
+            self._drop(alias, ex)
+
+    async def _send(self, connection, request_json):
+        writer, _ = connection
+        writer.write(request_json.encode('utf-8') + b'\n')
+        await writer.drain()
+
+    async def close(self):
+        for connection in list(self.connections.values()):
+            if connection.done() and connection.exception() is None:
+                writer, reader_task = connection.result()
+                reader_task.cancel()
+                writer.close()
+                await asyncio.gather(reader_task, return_exceptions=True)
+            else:
+                connection.cancel()
+        self.connections.clear()
+
+
+class ZmqTransport(_Dispatcher):
+    """CurveZMQ DEALER sockets to the validators' client ports, like the Indy SDK uses.
+
+    The server key of each node is its ed25519 verkey (`dest`) converted to curve25519.
+    Needs pyzmq and PyNaCl.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import zmq
+        import zmq.asyncio
+        self.zmq = zmq
+        self.context = zmq.asyncio.Context.instance()
+        self.public_key, self.secret_key = zmq.curve_keypair()
+
+    def _server_key(self, node):
+        from nacl.bindings import crypto_sign_ed25519_pk_to_curve25519
+        return self.zmq.utils.z85.encode(crypto_sign_ed25519_pk_to_curve25519(b58decode(node.dest)))
+
+    async def _connection(self, node):
+        socket = self.connections.get(node.alias)
+        if socket is None:
+            socket = self.context.socket(self.zmq.DEALER)
+            socket.curve_publickey, socket.curve_secretkey = self.public_key, self.secret_key
+            socket.curve_serverkey = self._server_key(node)
+            socket.linger = 0
+            socket.connect('tcp://{}:{}'.format(node.client_ip, node.client_port))
+            self.connections[node.alias] = socket
+            asyncio.ensure_future(self._read(node.alias, socket))
+        return socket
+
+    async def _read(self, alias, socket):
+        try:
+            while True:
+                self._deliver(alias, await socket.recv())
+        except Exception as ex:
+            self._drop(alias, ex)
+
+    async def _send(self, socket, request_json):
+        await socket.send(request_json.encode('utf-8'))
+
+    async def close(self):
+        for socket in self.connections.values():
+            socket.close()
+        self.connections.clear()
+
+
+_B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def b58decode(text):
+    number = 0
+    for char in text:
+        number = number * 58 + _B58_ALPHABET.index(char)
+    body = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return b'\x00' * (len(text) - len(text.lstrip('1'))) + body
+
+
+########################################
+# Stub Nodes
+########################################
+
+class StubNode:
+    """Local stand-in for a validator's client port, answering reads from a FakeLedger.
+
+    Every node of a stub pool shares one ledger (they are replicas) but has its own
+    `latency` (+/- `jitter`), `error_rate` (REQNACK) and `down` (accepts connections
+    but never answers) settings.
+    """
+
+    def __init__(self, node, ledger, latency=0.01, jitter=0.0, error_rate=0.0, down=False, seed=None):
+        self.node = node
+        self.ledger = ledger
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.down = down
+        self.random = random.Random(seed)
+        self.server = None
+        self.handlers = set()
+        self.writers = set()
+        self.served = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.node.client_ip, self.node.client_port)
+        return self
+
+    async def _serve(self, reader, writer):
+        async def answer(line):
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+            request = json.loads(line)
+            if self.error_rate and self.random.random() < self.error_rate:
+                reply = json.dumps({'op': 'REQNACK', 'reqId': request['reqId'], 'reason': 'stub node error'})
+            else:
+                reply = await self.ledger.submit_request(None, line)
+            self.served += 1
+            writer.write(reply.encode('utf-8') + b'\n')
+            await writer.drain()
+
+        self.handlers.add(asyncio.current_task())
+        self.writers.add(writer)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not self.down:
+                    task = asyncio.ensure_future(answer(line.decode('utf-8')))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.writers.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        # Closing the connections ends the handlers at EOF instead of cancelling them.
+        for writer in list(self.writers):
+            writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+
+########################################
+# Benchmark
+########################################
+
+async def _reads(topology, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(request_json):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await topology.submit_read(request_json)
+            except ConnectionError:
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(request) for request in requests))
+    return latencies, time.perf_counter() - start
+
+
+async def benchmark(genesis, latencies, error_rates, down, reads, concurrency, hedge_after, seed):
+    nodes = load_genesis(genesis)
+    ledger = FakeLedger(latency=0.0, seed=seed)
+    steward = 'Th7MpTaRZVRYnPiabds81Y'
+    dids = ['{:022d}'.format(i) for i in range(64)]
+    for did in dids:
+        await ledger.sign_and_submit_request(None, None, steward,
+                                             await ledger.build_nym_request(steward, did, did, None, None))
+
+    stubs = [await StubNode(node, ledger, latency=latency, jitter=latency / 2, error_rate=error_rate,
+                            down=node.alias in down, seed=seed).start()
+             for node, latency, error_rate in zip(nodes.values(), itertools.cycle(latencies),
+                                                  itertools.cycle(error_rates))]
+    rng = random.Random(seed)
+    try:
+        for label, options in (('first node', {'hedge_after': 1e9, 'explore': 0.0, 'max_failures': 10 ** 9}),
+                               ('fastest + hedged', {'hedge_after': hedge_after})):
+            transport = JsonLineTransport()
+            topology = PoolTopology(nodes, transport, timeout=2.0, seed=seed, **options)
+            if label == 'first node':
+                # Baseline: always the genesis order, no statistics-driven choice.
+                topology.ranked = lambda topology=topology: list(topology.nodes)
+            requests = [await ledger.build_get_nym_request(steward, rng.choice(dids)) for _ in range(reads)]
+            samples, wall = await _reads(topology, requests, concurrency)
+            await transport.close()
+            samples = sorted(samples)
+            print("{}: {} reads ok in {:.2f}s -> {:.0f} reads/sec, p50 {:.1f}ms p95 {:.1f}ms p99 {:.1f}ms".format(
+                label, len(samples), wall, len(samples) / wall,
+                *(1000 * samples[min(int(q * len(samples)), len(samples) - 1)] for q in (0.5, 0.95, 0.99))))
+            topology.report()
+    finally:
+        for stub in stubs:
+            await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validator node table and latency-aware read routing "
+                                                 "benchmark against local stub nodes")
+    parser.add_argument('--genesis_txn_path', type=str, default='Validator_pool.txn',
+                        help="Genesis transactions of the validator pool")
+    parser.add_argument('--table', action='store_true', help="Only print the node table")
+    parser.add_argument('--latencies', type=str, default='0.08,0.01,0.02,0.04',
+                        help="Comma-separated stub node latencies (seconds), in genesis order")
+    parser.add_argument('--error_rates', type=str, default='0,0,0.05,0',
+                        help="Comma-separated stub node REQNACK rates, in genesis order")
+    parser.add_argument('--down', type=str, default='', help="Comma-separated aliases of unresponsive nodes")
+    parser.add_argument('--reads', type=int, default=2000, help="GET_NYM reads per routing strategy")
+    parser.add_argument('--concurrency', type=int, default=32, help="Reads in flight at once")
+    parser.add_argument('--hedge_after', type=float, default=None,
+                        help="Fixed hedge delay (seconds); default is the node's p95 latency")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the stub nodes and request mix")
+    args = parser.parse_args()
+
+    if args.table:
+        for node in load_genesis(args.genesis_txn_path).values():
+            print("{:<8} {}:{:<6} {:<45} {}".format(node.alias, node.client_ip, node.client_port, node.dest,
+                                                    ','.join(node.services)))
+        return
+    asyncio.run(benchmark(args.genesis_txn_path, [float(x) for x in args.latencies.split(',')],
+                          [float(x) for x in args.error_rates.split(',')],
+                          set(filter(None, args.down.split(','))), args.reads, args.concurrency,
+                          args.hedge_after, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+"""Python client of the Registration contract (`Registrationcontract (1).sol`).
+
+Transactions are signed locally and given consecutive nonces from a local counter,
+so many `push`/`registerHolders` calls are submitted back to back (one JSON-RPC
+batch per chunk) without waiting for a receipt in between. Receipts are collected
+afterwards with batched polling, and `exists1`/`getHolderDetails` reads are sent as
+JSON-RPC batches of `eth_call`s.
+
+Any web3 provider works; against providers without batch support (e.g. the
+in-process EthereumTesterProvider) batches fall back to one request per entry.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+from lazy_import import LazyModule
+
+eth_abi = LazyModule('eth_abi')
+eth_account = LazyModule('eth_account')
+
+REGISTRATION_ABI = [
+    {'type': 'function', 'name': 'push', 'stateMutability': 'nonpayable',
+     'inputs': [{'name': 'did', 'type': 'string'}, {'name': 'holder_add', 'type': 'string'},
+                {'name': 'sigature', 'type': 'string'}, {'name': 'trans_hash', 'type': 'string'}],
+     'outputs': []},
+    {'type': 'function', 'name': 'registerHolders', 'stateMutability': 'nonpayable',
+     'inputs': [{'name': 'didholder', 'type': 'address'}, {'name': 'did', 'type': 'string'},
+                {'name': 'name', 'type': 'string'}],
+     'outputs': [{'name': '', 'type': 'string'}]},
+    {'type': 'function', 'name': 'exists1', 'stateMutability': 'view',
+     'inputs': [{'name': 'num', 'type': 'string'}],
+     'outputs': [{'name': '', 'type': 'bool'}]},
+    {'type': 'function', 'name': 'getHolderDetails', 'stateMutability': 'view',
+     'inputs': [{'name': 'ins', 'type': 'address'}],
+     'outputs': [{'name': '', 'type': 'string'}, {'name': '', 'type': 'address'},
+                 {'name': '', 'type': 'string'}, {'name': '', 'type': 'string'}]},
+    {'type': 'function', 'name': 'isValid_Signature_Hash', 'stateMutability': 'view',
+     'inputs': [{'name': 'hash', 'type': 'string'}, {'name': 'signature', 'type': 'string'}],
+     'outputs': [{'name': '', 'type': 'string'}, {'name': '', 'type': 'bool'}]},
+    {'type': 'function', 'name': 'getAll', 'stateMutability': 'view',
+     'inputs': [], 'outputs': [{'name': '', 'type': 'string[]'}]},
+]
+
+# Fixed gas limits instead of one eth_estimateGas round trip per transaction.
+# registerHolders scans every pushed DID, so its cost grows with the registry.
+GAS_LIMITS = {'push': 400000, 'registerHolders': 1500000}
+
+
+class RegistrationError(Exception):
+    pass
+
+
+def _hex(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return value
+
+
+class RegistrationClient:
+    """Batched reads and pipelined, locally signed writes to one Registration contract.
+
+    The nonce is read once (`pending` count) and then incremented locally under a lock;
+    if the node rejects a nonce (another sender used the account, or a transaction was
+    dropped) the counter is resynchronised and the rejected transactions are re-signed
+    and resubmitted once.
+    """
+
+    def __init__(self, w3, address, private_key, chain_id=None, gas_limits=None, batch_size=100):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=w3.to_checksum_address(address), abi=REGISTRATION_ABI)
+        self.account = eth_account.Account.from_key(private_key)
+        self.chain_id = chain_id if chain_id is not None else w3.eth.chain_id
+        self.gas_limits = dict(GAS_LIMITS, **(gas_limits or {}))
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.nonce = None
+        self.submitted = 0
+        self.batches = 0
+        self.resyncs = 0
+
+    ########################################
+    # JSON-RPC Batches
+    ########################################
+
+    def batch_request(self, calls):
+        """Send [(method, params), ...] as JSON-RPC batches; returns the responses in order."""
+        provider = self.w3.provider
+        responses = []
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            self.batches += 1
+            if hasattr(provider, 'make_batch_request'):
+                result = provider.make_batch_request(chunk)
+                if isinstance(result, dict):
+                    # A batch-level error (e.g. the node does not accept batches).
+                    raise RegistrationError(result.get('error'))
+                responses.extend(result)
+            elif getattr(provider, 'endpoint_uri', None):
+                responses.extend(self._post_batch(provider.endpoint_uri, chunk))
+            else:
+                responses.extend(self._request(provider, method, params) for method, params in chunk)
+        return responses
+
+    @staticmethod
+    def _request(provider, method, params):
+        # In-process providers raise where a node would answer with an error object.
+        try:
+            return provider.make_request(method, params)
+        except Exception as ex:
+            return {'error': {'message': str(ex)}}
+
+    @staticmethod
+    def _post_batch(endpoint_uri, calls):
+        payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                   for i, (method, params) in enumerate(calls)]
+        request = urllib.request.Request(str(endpoint_uri), data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            replies = json.loads(response.read())
+        # The spec lets the server answer a batch in any order.
+        return sorted(replies, key=lambda reply: reply['id'])
+
+    ########################################
+    # Writes
+    ########################################
+
+    def _reserve_nonces(self, count):
+        with self.lock:
+            if self.nonce is None:
+                self.nonce = self.w3.eth.get_transaction_count(self.account.address, 'pending')
+            first = self.nonce
+            self.nonce += count
+        return range(first, first + count)
+
+    def _resync_nonce(self):
+        with self.lock:
+            self.nonce = self.w3.eth.get_transaction_count(self.account.address, 'pending')
+            self.resyncs += 1
+
+    def _sign(self, fn_name, args, nonce, gas_price):
+        data = self.contract.encode_abi(fn_name, args=args)
+        tx = {'to': self.contract.address, 'data': data, 'value': 0, 'nonce': nonce,
+              'gas': self.gas_limits[fn_name], 'gasPrice': gas_price, 'chainId': self.chain_id}
+        signed = self.account.sign_transaction(tx)
+        return _hex(getattr(signed, 'raw_transaction', None) or signed.rawTransaction)
+
+    def submit(self, fn_name, calls, retry=True):
+        """Sign and send one transaction per argument tuple; returns the tx hashes.
+
+        Nothing waits for a receipt; use `wait_for_receipts` on the returned hashes.
+        """
+        gas_price = self.w3.eth.gas_price
+        pending = list(enumerate(calls))
+        hashes = [None] * len(pending)
+        for attempt in range(2 if retry else 1):
+            nonces = self._reserve_nonces(len(pending))
+            raw = [self._sign(fn_name, args, nonce, gas_price) for (_, args), nonce in zip(pending, nonces)]
+            responses = self.batch_request([('eth_sendRawTransaction', [tx]) for tx in raw])
+            failed = []
+            for (index, args), response in zip(pending, responses):
+                if 'error' in response:
+                    failed.append(((index, args), response['error']))
+                else:
+                    hashes[index] = _hex(response['result'])
+                    self.submitted += 1
+            if not failed:
+                return hashes
+            # A rejected transaction leaves a gap behind it: renumber from the node's count.
+            self._resync_nonce()
+            pending = [call for call, _ in failed]
+        raise RegistrationError("{} of {} {} transactions rejected, first: {}".format(
+            len(failed), len(calls), fn_name, failed[0][1]))
+
+    def submit_push(self, records):
+        """records: (did, holder_add, signature, trans_hash) tuples."""
+        return self.submit('push', [tuple(record) for record in records])
+
+    def submit_register(self, records):
+        """records: (holder address, did, name) tuples."""
+        return self.submit('registerHolders', [(self.w3.to_checksum_address(address), did, name)
+                                               for address, did, name in records])
+
+    def wait_for_receipts(self, tx_hashes, timeout=120.0, poll_interval=0.5):
+        """Receipts for `tx_hashes` in order, polling the still-missing ones as one batch."""
+        receipts = {}
+        deadline = time.monotonic() + timeout
+        while True:
+            missing = [tx_hash for tx_hash in tx_hashes if tx_hash not in receipts]
+            if not missing:
+                return [receipts[tx_hash] for tx_hash in tx_hashes]
+            responses = self.batch_request([('eth_getTransactionReceipt', [tx_hash]) for tx_hash in missing])
+            for tx_hash, response in zip(missing, responses):
+                if response.get('result'):
+                    receipts[tx_hash] = response['result']
+            if len(receipts) < len(tx_hashes):
+                if time.monotonic() > deadline:
+                    raise RegistrationError("{} receipts still missing after {}s".format(
+                        len(tx_hashes) - len(receipts), timeout))
+                time.sleep(poll_interval)
+
+    ########################################
+    # Batched Reads
+    ########################################
+
+    def call_many(self, fn_name, calls, block='latest'):
+        """Decoded results of one `eth_call` per argument tuple, sent as JSON-RPC batches."""
+        fn_abi = next(entry for entry in REGISTRATION_ABI if entry['name'] == fn_name)
+        output_types = [output['type'] for output in fn_abi['outputs']]
+        requests = [('eth_call', [{'from': self.account.address, 'to': self.contract.address,
+                                   'data': self.contract.encode_abi(fn_name, args=args)}, block])
+                    for args in calls]
+        results = []
+        for args, response in zip(calls, self.batch_request(requests)):
+            if 'error' in response:
+                raise RegistrationError("{}{} failed: {}".format(fn_name, tuple(args), response['error']))
+            data = response['result']
+            decoded = eth_abi.decode(output_types, bytes.fromhex(data[2:]) if isinstance(data, str) else data)
+            results.append(decoded[0] if len(decoded) == 1 else decoded)
+        return results
+
+    def exists1_many(self, values):
+        return self.call_many('exists1', [(value,) for value in values])
+
+    def holder_details_many(self, addresses):
+        return self.call_many('getHolderDetails', [(self.w3.to_checksum_address(address),)
+                                                   for address in addresses])
+
+    def metrics(self):
+        return {'submitted': self.submitted, 'batches': self.batches, 'nonce_resyncs': self.resyncs}
+
+
+def deploy(w3, bytecode, private_key, gas=3000000):
+    """Deploy the contract from solc output bytecode; returns its address."""
+    account = eth_account.Account.from_key(private_key)
+    tx = {'data': bytecode if bytecode.startswith('0x') else '0x' + bytecode, 'value': 0, 'gas': gas,
+          'gasPrice': w3.eth.gas_price, 'chainId': w3.eth.chain_id,
+          'nonce': w3.eth.get_transaction_count(account.address, 'pending')}
+    signed = account.sign_transaction(tx)
+    tx_hash = w3.eth.send_raw_transaction(getattr(signed, 'raw_transaction', None) or signed.rawTransaction)
+    return w3.eth.wait_for_transaction_receipt(tx_hash)['contractAddress']
+
+
+def main():
+    from web3 import Web3
+    from did_signing import DidSigner
+
+    parser = argparse.ArgumentParser(description="Bulk DID registration with the Registration contract")
+    parser.add_argument('--rpc', type=str, default='http://127.0.0.1:8545', help="JSON-RPC endpoint of the node")
+    parser.add_argument('--contract', type=str, default=None, help="Address of a deployed Registration contract")
+    parser.add_argument('--bytecode', type=str, default=None,
+                        help="File with the compiled contract bytecode; deploys a fresh contract")
+    parser.add_argument('--private_key', type=str, required=True, help="Hex key of the sending account")
+    parser.add_argument('--signing_key', type=str, default='./keys/did_signing.key',
+                        help="secp256k1 key signing the DID hashes (public key in <path>.pub)")
+    parser.add_argument('--holders', type=int, default=100, help="Synthetic holders to register")
+    parser.add_argument('--batch_size', type=int, default=100, help="JSON-RPC requests per batch")
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    address = args.contract
+    if args.bytecode:
+        with open(args.bytecode) as f:
+            address = deploy(w3, f.read().strip(), args.private_key)
+        print("deployed at", address)
+    client = RegistrationClient(w3, address, args.private_key, batch_size=args.batch_size)
+
+    dids = ['did:sov:{:022d}'.format(i) for i in range(args.holders)]
+    holders = [eth_account.Account.create().address for _ in dids]
+    signer = DidSigner.from_key_file(args.signing_key)
+    signed = signer.sign(dids)
+    print("DID hashes signed with public key 0x" + signer.public_key.hex())
+
+    start = time.perf_counter()
+    push_hashes = client.submit_push([(did, holder, '0x' + signature, '0x' + digest)
+                                      for did, holder, (digest, signature) in zip(dids, holders, signed)])
+    register_hashes = client.submit_register([(holder, did, 'holder{}'.format(i))
+                                              for i, (did, holder) in enumerate(zip(dids, holders))])
+    submitted = time.perf_counter() - start
+    receipts = client.wait_for_receipts(push_hashes + register_hashes)
+    mined = time.perf_counter() - start
+    failed = sum(int(receipt['status'], 16) == 0 if isinstance(receipt['status'], str) else receipt['status'] == 0
+                 for receipt in receipts)
+    print("{} transactions submitted in {:.2f}s, mined in {:.2f}s ({} reverted)".format(
+        len(receipts), submitted, mined, failed))
+
+    start = time.perf_counter()
+    exists = client.exists1_many(dids)
+    details = client.holder_details_many(holders)
+    print("{} reads in {:.2f}s: {} DIDs found, {} holders registered".format(
+        len(exists) + len(details), time.perf_counter() - start, sum(exists),
+        sum(bool(detail[0]) for detail in details)))
+    print(client.metrics())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scripts import their neighbours by module name, as when run from their own directory.
+for path in (ROOT, os.path.join(ROOT, 'QSAM', 'model')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
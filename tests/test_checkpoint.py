@@ -0,0 +1,95 @@
+import json
+import os
+
+import jax
+import jax.numpy as jnp
+import equinox as eqx
+import pytest
+
+from qsam_checkpoint import CheckpointManager
+
+
+def make_model(seed=0):
+    return eqx.nn.Linear(3, 2, key=jax.random.PRNGKey(seed))
+
+
+def opt_state_for(model):
+    return {'step': jnp.zeros(()), 'mu': jax.tree_util.tree_map(jnp.zeros_like, eqx.filter(model, eqx.is_array))}
+
+
+def save_epochs(manager, metrics):
+    model = make_model()
+    for epoch, metric in enumerate(metrics, 1):
+        model = eqx.tree_at(lambda m: m.bias, model, jnp.full((2,), float(epoch)))
+        manager.save(epoch, model, opt_state_for(model), [epoch, 0], metric)
+    manager.wait()
+
+
+def epochs(manager):
+    return [int(os.path.basename(path).split('_')[1]) for path in manager.checkpoints()]
+
+
+def test_keeps_newest_and_best(tmp_path):
+    best_model_path = str(tmp_path / 'best.model')
+    manager = CheckpointManager(str(tmp_path / 'ckpt'), keep=2, best_model_path=best_model_path,
+                                export_model=lambda model: model.bias)
+    save_epochs(manager, [0.5, 0.9, 0.7, None, 0.8])
+    manager.close()
+
+    assert epochs(manager) == [4, 5]
+    with open(tmp_path / 'ckpt' / 'best.json') as f:
+        assert json.load(f)['epoch'] == 2
+    assert manager.best_metric == 0.9
+    assert eqx.tree_deserialise_leaves(best_model_path, jnp.zeros((2,))).tolist() == [2.0, 2.0]
+
+
+def test_keep_zero_keeps_every_checkpoint(tmp_path):
+    manager = CheckpointManager(str(tmp_path), keep=0)
+    save_epochs(manager, [None] * 5)
+    manager.close()
+    assert epochs(manager) == [1, 2, 3, 4, 5]
+    assert not os.path.exists(tmp_path / 'best.json')
+
+
+def test_negative_keep_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointManager(str(tmp_path), keep=-1)
+
+
+def test_restore_latest_and_best_metric_after_restart(tmp_path):
+    manager = CheckpointManager(str(tmp_path), keep=3)
+    assert manager.restore(make_model(), opt_state_for(make_model())) is None
+    save_epochs(manager, [0.4, 0.6, 0.5])
+    manager.close()
+
+    restarted = CheckpointManager(str(tmp_path), keep=3)
+    assert restarted.best_metric == 0.6
+    model, opt_state, meta = restarted.restore(make_model(1), opt_state_for(make_model(1)))
+    assert meta == {'epoch': 3, 'metric': 0.5, 'rng_state': [3, 0]}
+    assert model.bias.tolist() == [3.0, 3.0]
+    assert model.weight.tolist() == make_model(0).weight.tolist()
+    restarted.close()
+
+
+def test_incomplete_checkpoint_is_ignored(tmp_path):
+    manager = CheckpointManager(str(tmp_path), keep=3)
+    save_epochs(manager, [None])
+    # A crash between the .eqx and .json writes leaves only the .eqx file behind.
+    with open(tmp_path / 'ckpt_000002.eqx', 'wb') as f:
+        f.write(b'partial')
+    assert epochs(manager) == [1]
+    _, _, meta = manager.restore(make_model(), opt_state_for(make_model()))
+    assert meta['epoch'] == 1
+    manager.close()
+
+
+def test_write_errors_surface_on_the_training_thread(tmp_path):
+    directory = tmp_path / 'ckpt'
+    manager = CheckpointManager(str(directory), keep=3)
+    # Something replaced the checkpoint directory: every write fails on the background thread.
+    os.rmdir(directory)
+    directory.write_text('')
+    manager.save(1, make_model(), opt_state_for(make_model()), [1, 0])
+    with pytest.raises(RuntimeError):
+        manager.wait()
+    manager.close()
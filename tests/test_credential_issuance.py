@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+import credential_issuance
+from credential_issuance import RevocationRegistries, TailsStore, issue_credentials
+
+
+class FakeIndy:
+    """The anoncreds, blob_storage and ledger calls RevocationRegistries makes.
+
+    Tails files are written under the writer's base_dir like the SDK does, and
+    credential issuance records how many calls run at once per registry.
+    """
+
+    def __init__(self, issue_delay=0.001, fail_holders=()):
+        self.issue_delay = issue_delay
+        self.fail_holders = set(fail_holders)
+        self.registries = 0
+        self.issuance_types = {}
+        self.running = {}
+        self.max_running = {}
+        self.max_total = 0
+        self.entries = []
+        self.stored = []
+
+    # blob_storage
+
+    async def open_writer(self, kind, config):
+        return json.loads(config)
+
+    async def open_reader(self, kind, config):
+        return json.loads(config)
+
+    # anoncreds
+
+    async def issuer_create_and_store_revoc_reg(self, wallet, did, kind, tag, cred_def_id, config, writer):
+        self.registries += 1
+        await asyncio.sleep(0.001)
+        tails = os.urandom(64)
+        tails_hash = hashlib.sha256(tails).hexdigest()
+        with open(os.path.join(writer['base_dir'], tails_hash), 'wb') as f:
+            f.write(tails)
+        rev_reg_id = '{}:4:{}:CL_ACCUM:{}'.format(did, cred_def_id, tag)
+        self.issuance_types[rev_reg_id] = json.loads(config)['issuance_type']
+        rev_reg_def = {'id': rev_reg_id, 'value': {'tailsHash': tails_hash,
+                                                   'tailsLocation': writer['uri_pattern'] + tails_hash,
+                                                   **json.loads(config)}}
+        return rev_reg_id, json.dumps(rev_reg_def), json.dumps({'issued': []})
+
+    async def issuer_create_credential(self, wallet, offer, request, values, rev_reg_id, reader):
+        self.running[rev_reg_id] = self.running.get(rev_reg_id, 0) + 1
+        self.max_running[rev_reg_id] = max(self.max_running.get(rev_reg_id, 0), self.running[rev_reg_id])
+        self.max_total = max(self.max_total, sum(self.running.values()))
+        try:
+            await asyncio.sleep(self.issue_delay)
+            if request in self.fail_holders:
+                raise RuntimeError("issuance failed for " + request)
+        finally:
+            self.running[rev_reg_id] -= 1
+        on_demand = self.issuance_types[rev_reg_id] == 'ISSUANCE_ON_DEMAND'
+        delta = json.dumps({'issued': [request]}) if on_demand else None
+        return json.dumps({'values': values, 'rev_reg_id': rev_reg_id}), request, delta
+
+    async def issuer_merge_revocation_registry_deltas(self, first, second):
+        return json.dumps({'issued': json.loads(first)['issued'] + json.loads(second)['issued']})
+
+    async def prover_store_credential(self, wallet, cred_id, metadata, cred_json, cred_def, rev_reg_def):
+        self.stored.append(wallet)
+        return 'cred-' + json.loads(cred_json)['values']
+
+    # ledger
+
+    async def build_revoc_reg_def_request(self, did, rev_reg_def):
+        return json.dumps({'type': 'REVOC_REG_DEF', 'data': rev_reg_def})
+
+    async def build_revoc_reg_entry_request(self, did, rev_reg_id, kind, entry):
+        return json.dumps({'type': 'REVOC_REG_ENTRY', 'id': rev_reg_id, 'entry': json.loads(entry)})
+
+    async def sign_and_submit_request(self, pool, wallet, did, request):
+        request = json.loads(request)
+        if request['type'] == 'REVOC_REG_ENTRY':
+            self.entries.append((request['id'], request['entry']['issued']))
+        return json.dumps({'op': 'REPLY', 'result': {}})
+
+
+@pytest.fixture
+def indy(monkeypatch):
+    fake = FakeIndy()
+    for name in ('anoncreds', 'blob_storage', 'ledger'):
+        monkeypatch.setattr(credential_issuance, name, fake)
+    return fake
+
+
+ISSUER = {'pool': 1, 'wallet': 'issuer-wallet', 'did': 'IssuerDid'}
+
+
+def make_registries(tmp_path, **kwargs):
+    return RevocationRegistries(ISSUER, 'CredDef', tails_dir=str(tmp_path / 'tails'), **kwargs)
+
+
+def make_holders(count):
+    return [{'name': 'holder{}'.format(i), 'wallet': 'wallet{}'.format(i), 'transcript_cred_offer': '{}',
+             'transcript_cred_request': 'holder{}'.format(i), 'transcript_cred_request_metadata': '{}',
+             'issuer_transcript_cred_def': '{}', 'wallet_config': json.dumps({'id': 'wallet{}'.format(i)}),
+             'wallet_credentials': '{}'} for i in range(count)]
+
+
+def values_for(holder):
+    return holder['name']
+
+
+def test_prepare_creates_enough_shards_for_count_and_parallelism(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=1000)
+    asyncio.run(registries.prepare(2500))
+    assert len(registries.shards) == 3
+
+    registries = make_registries(tmp_path, shard_size=1000)
+    asyncio.run(registries.prepare(10, parallel=4))
+    assert len(registries.shards) == 4
+    # Already enough free slots in enough shards: nothing more is created.
+    asyncio.run(registries.prepare(10, parallel=4))
+    assert len(registries.shards) == 4
+    assert all(os.path.isfile(shard.tails_path) for shard in registries.shards)
+
+
+def test_allocate_spreads_credentials_and_serialises_each_shard(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=100)
+    holders = make_holders(40)
+    assert asyncio.run(issue_credentials(registries, holders, values_for, workers=4)) == 40
+
+    assert [shard.issued for shard in registries.shards] == [10, 10, 10, 10]
+    assert max(indy.max_running.values()) == 1
+    assert indy.max_total == 4
+    assert all(shard.in_flight == 0 for shard in registries.shards)
+    assert holders[0]['transcript_cred_id'] == 'cred-holder0'
+    assert holders[0]['transcript_rev_reg_id'] in {shard.rev_reg_id for shard in registries.shards}
+
+
+def test_full_shards_overflow_into_one_new_shard(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=10)
+
+    async def main():
+        holders = make_holders(8)
+        await asyncio.gather(*(registries.issue(holder, values_for(holder)) for holder in holders))
+
+    asyncio.run(main())
+    assert indy.registries == 1
+    assert registries.shards[0].issued == 8
+
+
+def test_on_demand_deltas_are_merged_and_published(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=100, issuance_type='ISSUANCE_ON_DEMAND', publish_every=5)
+    assert asyncio.run(issue_credentials(registries, make_holders(12), values_for, workers=1)) == 12
+
+    rev_reg_id = registries.shards[0].rev_reg_id
+    published = [issued for entry_id, issued in indy.entries if entry_id == rev_reg_id]
+    # The initial accumulator, two merged entries of publish_every credentials, and the flushed rest.
+    assert [len(issued) for issued in published] == [0, 5, 5, 2]
+    assert sum(published, []) == ['holder{}'.format(i) for i in range(12)]
+    assert registries.shards[0].deltas == []
+
+
+def test_by_default_issuance_publishes_nothing(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=100, publish_every=5)
+    asyncio.run(issue_credentials(registries, make_holders(12), values_for, workers=2))
+    assert [len(issued) for _, issued in indy.entries] == [0, 0]
+
+
+def test_failures_are_counted_per_shard_and_skipped(tmp_path, indy, capsys):
+    indy.fail_holders = {'holder3'}
+    registries = make_registries(tmp_path, shard_size=100)
+    holders = make_holders(6)
+    assert asyncio.run(issue_credentials(registries, holders, values_for, workers=2)) == 5
+
+    assert sum(shard.failed for shard in registries.shards) == 1
+    assert sum(shard.issued for shard in registries.shards) == 5
+    assert all(shard.in_flight == 0 for shard in registries.shards)
+    assert 'transcript_cred_id' not in holders[3]
+    assert '"holder3" -> credential issuance failed' in capsys.readouterr().out
+
+
+def test_holder_wallets_are_opened_and_released_around_store(tmp_path, indy):
+    class Wallets:
+        def __init__(self):
+            self.refs = {}
+
+        async def open(self, config, credentials):
+            wallet_id = json.loads(config)['id']
+            self.refs[wallet_id] = self.refs.get(wallet_id, 0) + 1
+            return 'handle-' + wallet_id
+
+        async def release(self, config):
+            self.refs[json.loads(config)['id']] -= 1
+
+    wallets = Wallets()
+    registries = make_registries(tmp_path, shard_size=100, wallets=wallets)
+    asyncio.run(issue_credentials(registries, make_holders(3), values_for, workers=3))
+    assert sorted(indy.stored) == ['handle-wallet0', 'handle-wallet1', 'handle-wallet2']
+    assert set(wallets.refs.values()) == {0}
+
+
+def test_tails_location_points_at_the_tails_url(tmp_path, indy):
+    registries = make_registries(tmp_path, shard_size=10, tails_url='http://tails.example:8001/')
+    shard = asyncio.run(registries.create_shard())
+    value = json.loads(shard.rev_reg_def)['value']
+    assert value['tailsLocation'] == 'http://tails.example:8001/' + value['tailsHash']
+    assert shard.tails_path == os.path.join(registries.tails_dir, value['tailsHash'])
+
+
+def test_tails_store_read_shares_one_map(tmp_path):
+    path = tmp_path / 'tails'
+    path.write_bytes(bytes(range(100)))
+    store = TailsStore()
+    try:
+        assert bytes(store.read(str(path), 10, 5)) == bytes(range(10, 15))
+        assert bytes(store.read(str(path), 95, 20)) == bytes(range(95, 100))
+        assert len(store.read(str(path))) == 100
+        assert store.metrics() == {'open_maps': 1, 'opened': 1, 'reads': 3, 'bytes_served': 110}
+    finally:
+        store.close()
+
+
+def test_tails_store_serves_files_over_http(tmp_path):
+    tails_dir = tmp_path / 'tails'
+    tails_dir.mkdir()
+    (tails_dir / 'abc123').write_bytes(b'tails-bytes')
+    (tmp_path / 'secret').write_bytes(b'not a tails file')
+    store = TailsStore()
+    server = store.serve(str(tails_dir))
+    url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    try:
+        with urllib.request.urlopen(url + 'abc123', timeout=5) as response:
+            assert response.read() == b'tails-bytes'
+            assert response.headers['Content-Type'] == 'application/octet-stream'
+        for name in ('missing', '../secret', ''):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(url + name, timeout=5)
+            assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        store.close()
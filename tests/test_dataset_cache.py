@@ -0,0 +1,80 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import qsam_dataset_cache
+from qsam_dataset_cache import cache_key, load_dataset
+
+TOKENIZER = {'ngram': [1], 'filter': 'stw', 'la': 'en'}
+
+
+@pytest.fixture
+def csvs(tmp_path):
+    train = tmp_path / 'train.csv'
+    test = tmp_path / 'test.csv'
+    train.write_text('label,text\n1,good\n0,bad\n')
+    test.write_text('label,text\n1,fine\n')
+    return str(train), str(test)
+
+
+def test_cache_key_is_stable(csvs):
+    assert cache_key(*csvs, 5, TOKENIZER) == cache_key(*csvs, 5, dict(reversed(list(TOKENIZER.items()))))
+
+
+def test_cache_key_changes_with_every_input(csvs, monkeypatch):
+    train, test = csvs
+    key = cache_key(train, test, 5, TOKENIZER)
+    assert cache_key(train, test, 6, TOKENIZER) != key
+    assert cache_key(train, test, 5, dict(TOKENIZER, ngram=[1, 2])) != key
+    assert cache_key(test, train, 5, TOKENIZER) != key
+    monkeypatch.setattr(qsam_dataset_cache, 'CACHE_VERSION', qsam_dataset_cache.CACHE_VERSION + 1)
+    assert cache_key(train, test, 5, TOKENIZER) != key
+    monkeypatch.undo()
+    with open(train, 'a') as f:
+        f.write('1,great\n')
+    assert cache_key(train, test, 5, TOKENIZER) != key
+
+
+def test_load_dataset_builds_once_and_memory_maps(csvs, tmp_path, monkeypatch):
+    builds = []
+
+    def build(train_path, test_path, seq_len, tokenizer_config, out_dir):
+        # Stand-in for the tokenizer pipeline: writes the same files _build does.
+        builds.append(tokenizer_config)
+        arrays = {'x_train': np.arange(2 * seq_len, dtype=np.int32).reshape(2, seq_len),
+                  'y_train': np.array([1, 0], dtype=np.int32),
+                  'x_test': np.zeros((1, seq_len), dtype=np.int32),
+                  'y_test': np.array([1], dtype=np.int32),
+                  'idf': np.ones(3)}
+        for name, array in arrays.items():
+            np.save(os.path.join(out_dir, f'{name}.npy'), array)
+        with open(os.path.join(out_dir, 'vocab.json'), 'w') as f:
+            json.dump({'good': 0, 'bad': 1, 'fine': 2}, f)
+
+    monkeypatch.setattr(qsam_dataset_cache, '_build', build)
+    cache_dir = str(tmp_path / 'cache')
+    first = load_dataset(*csvs, 4, cache_dir=cache_dir)
+    second = load_dataset(*csvs, 4, cache_dir=cache_dir)
+
+    assert builds == [TOKENIZER]
+    vocab, idf, (x_train, y_train), _ = second
+    assert vocab == first[0] == {'good': 0, 'bad': 1, 'fine': 2}
+    assert isinstance(x_train, np.memmap) and not x_train.flags.writeable
+    assert x_train.tolist() == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert os.listdir(cache_dir) == [cache_key(*csvs, 4, TOKENIZER)]
+
+    load_dataset(*csvs, 5, cache_dir=cache_dir)
+    assert len(builds) == 2
+
+
+def test_failed_build_leaves_no_cache_entry(csvs, tmp_path, monkeypatch):
+    def build(*args):
+        raise RuntimeError("tokenizer crashed")
+
+    monkeypatch.setattr(qsam_dataset_cache, '_build', build)
+    cache_dir = str(tmp_path / 'cache')
+    with pytest.raises(RuntimeError):
+        load_dataset(*csvs, 4, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,70 @@
+import functools
+import multiprocessing
+import os
+import stat
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import did_signing
+from did_signing import BACKENDS, DidSigner, did_digest, load_backend, load_or_create_secret
+
+SECRET = bytes.fromhex('11' * 32)
+DIDS = ['did:sov:{:022d}'.format(i) for i in range(5)]
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    try:
+        load_backend(request.param)
+    except ImportError:
+        pytest.skip(f"{request.param} not installed")
+    return request.param
+
+
+def test_sign_verify_roundtrip(backend):
+    signer = DidSigner(SECRET, backend=backend)
+    items = signer.sign(DIDS)
+    assert [did_hash for did_hash, _ in items] == [did_digest(did).hex() for did in DIDS]
+    assert all(len(bytes.fromhex(signature)) == 64 for _, signature in items)
+    assert signer.verify(items) == [True] * len(DIDS)
+
+
+def test_tampered_signature_is_rejected(backend):
+    signer = DidSigner(SECRET, backend=backend)
+    (_, signature), = signer.sign(DIDS[:1])
+    other_hash = did_digest('did:sov:other').hex()
+    assert signer.verify([(other_hash, signature)]) == [False]
+
+
+def test_backends_are_byte_identical_and_cross_verify():
+    try:
+        signers = [DidSigner(SECRET, backend=name) for name in sorted(BACKENDS)]
+    except ImportError:
+        pytest.skip("needs both coincurve and ecdsa")
+    first, second = signers
+    assert first.public_key == second.public_key
+    assert first.sign(DIDS) == second.sign(DIDS)
+    assert second.verify(first.sign(DIDS), public_key=first.public_key) == [True] * len(DIDS)
+
+
+def test_process_pool_matches_single_process(backend, monkeypatch):
+    # Other test modules load jax, whose threads make forking this process unsafe.
+    monkeypatch.setattr(did_signing, 'ProcessPoolExecutor',
+                        functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn')))
+    single = DidSigner(SECRET, backend=backend).sign(DIDS * 4)
+    pooled = DidSigner(SECRET, backend=backend, workers=2, chunk_size=3).sign(DIDS * 4)
+    assert pooled == single
+
+
+def test_key_file_persists_secret_and_public_key(tmp_path, backend):
+    path = str(tmp_path / 'keys' / 'did_signing.key')
+    first = DidSigner.from_key_file(path, backend=backend)
+    second = DidSigner.from_key_file(path, backend=backend)
+    assert first.secret == second.secret == load_or_create_secret(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    with open(path + '.pub') as f:
+        public_key = bytes.fromhex(f.read())
+    assert public_key == first.public_key
+    # Anyone holding only the .pub file can check the signatures.
+    assert DidSigner(backend=backend).verify(first.sign(DIDS), public_key=public_key) == [True] * len(DIDS)
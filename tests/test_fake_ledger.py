@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from DID_WalletAddress_Generation import send_nyms
+from fake_ledger import FakeLedger
+
+STEWARD = 'Th7MpTaRZVRYnPiabds81Y'
+
+
+def nyms(count):
+    return [('did{:019d}'.format(i), 'verkey{}'.format(i), 'TRUST_ANCHOR') for i in range(count)]
+
+
+class CountingLedger(FakeLedger):
+    """FakeLedger that records the most submissions in flight and signed requests held at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.signed = 0
+        self.max_signed = 0
+
+    async def sign_request(self, wallet_handle, submitter_did, request_json):
+        signed = await super().sign_request(wallet_handle, submitter_did, request_json)
+        self.signed += 1
+        self.max_signed = max(self.max_signed, self.signed)
+        return signed
+
+    async def submit_request(self, pool_handle, request_json):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().submit_request(pool_handle, request_json)
+        finally:
+            self.in_flight -= 1
+            self.signed -= 1
+
+
+def test_send_nyms_registers_in_order_within_the_window():
+    fake_ledger = CountingLedger(latency=0.005, seed=0)
+    batch = nyms(40)
+    responses = asyncio.run(send_nyms(1, 1, STEWARD, batch, window=8, ledger_api=fake_ledger))
+
+    assert [response['op'] for response in responses] == ['REPLY'] * len(batch)
+    assert [response['result']['txn']['data']['dest'] for response in responses] == [did for did, _, _ in batch]
+    assert fake_ledger.max_in_flight == 8
+    # Signing runs ahead of submission, but only by a bounded number of requests.
+    assert 8 < fake_ledger.max_signed <= 16
+    assert fake_ledger.nyms['did' + '0' * 19]['role'] == '101'
+    assert sorted(response['result']['txnMetadata']['seqNo'] for response in responses) == list(range(1, 41))
+
+
+def test_send_nyms_returns_rejections(capsys):
+    fake_ledger = FakeLedger(latency=0.0, failure_rate=1.0, seed=0)
+    responses = asyncio.run(send_nyms(1, 1, STEWARD, nyms(3), ledger_api=fake_ledger))
+    assert [response['op'] for response in responses] == ['REQNACK'] * 3
+    assert not fake_ledger.nyms
+    assert "3 of 3 NYM requests rejected" in capsys.readouterr().out
+
+
+def test_unsigned_writes_are_rejected():
+    fake_ledger = FakeLedger(latency=0.0)
+
+    async def main():
+        request = await fake_ledger.build_nym_request(STEWARD, 'did', 'verkey', None, None)
+        return json.loads(await fake_ledger.submit_request(1, request))
+
+    assert asyncio.run(main())['op'] == 'REQNACK'
+
+
+def test_reads_lag_behind_writes():
+    fake_ledger = FakeLedger(latency=0.0, read_lag=0.05)
+
+    async def read():
+        request = await fake_ledger.build_get_nym_request(STEWARD, 'did')
+        return json.loads(await fake_ledger.submit_request(1, request))['result']['data']
+
+    async def main():
+        request = await fake_ledger.build_nym_request(STEWARD, 'did', 'verkey', None, 'ENDORSER')
+        await fake_ledger.sign_and_submit_request(1, 1, STEWARD, request)
+        before = await read()
+        await asyncio.sleep(0.06)
+        return before, await read()
+
+    before, after = asyncio.run(main())
+    assert before is None
+    assert json.loads(after) == {'dest': 'did', 'verkey': 'verkey', 'role': '101', 'identifier': STEWARD}
+
+
+def test_schema_write_read_and_parse():
+    fake_ledger = FakeLedger(latency=0.0)
+    schema = {'name': 'transcript', 'version': '1.2', 'attrNames': ['first_name', 'degree']}
+
+    async def main():
+        request = await fake_ledger.build_schema_request(STEWARD, json.dumps(schema))
+        first = json.loads(await fake_ledger.sign_and_submit_request(1, 1, STEWARD, request))
+        duplicate = json.loads(await fake_ledger.sign_and_submit_request(1, 1, STEWARD, request))
+        get_request = await fake_ledger.build_get_schema_request(STEWARD, f'{STEWARD}:2:transcript:1.2')
+        response = await fake_ledger.submit_request(1, get_request)
+        return first, duplicate, await fake_ledger.parse_get_schema_response(response)
+
+    first, duplicate, (schema_id, schema_json) = asyncio.run(main())
+    assert first['op'] == 'REPLY' and duplicate['op'] == 'REJECT'
+    assert schema_id == f'{STEWARD}:2:transcript:1.2'
+    parsed = json.loads(schema_json)
+    assert parsed['attrNames'] == schema['attrNames']
+    assert parsed['seqNo'] == first['result']['txnMetadata']['seqNo']
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from ghz_fidelity import (ghz_dfe_fidelity, ghz_statevector, ghz_tomography_fidelity, parity_signs,
+                          simulate_dfe_probabilities, simulate_pauli_probabilities)
+from ghz_state_Fidelity_generation import local_fidelity, local_tomography_fidelity
+
+
+def exact_fidelity(n_qubits, depolarizing):
+    return (1 - depolarizing) + depolarizing / 2 ** n_qubits
+
+
+def test_parity_signs():
+    assert parity_signs(2).tolist() == [1, -1, -1, 1]
+    assert parity_signs(3).tolist() == [1, -1, -1, 1, -1, 1, 1, -1]
+
+
+@pytest.mark.parametrize('n_qubits', [2, 3, 5, 8])
+@pytest.mark.parametrize('depolarizing', [0.0, 0.1, 0.5])
+def test_dfe_is_exact_without_shot_noise(n_qubits, depolarizing):
+    z_probs, parity_probs = simulate_dfe_probabilities(ghz_statevector(n_qubits), n_qubits, depolarizing)
+    assert ghz_dfe_fidelity(z_probs, parity_probs) == pytest.approx(exact_fidelity(n_qubits, depolarizing))
+
+
+@pytest.mark.parametrize('n_qubits', [1, 2, 3, 4])
+@pytest.mark.parametrize('depolarizing', [0.0, 0.2])
+def test_tomography_is_exact_without_shot_noise(n_qubits, depolarizing):
+    probs = simulate_pauli_probabilities(ghz_statevector(n_qubits), n_qubits, depolarizing)
+    assert ghz_tomography_fidelity(probs, n_qubits) == pytest.approx(exact_fidelity(n_qubits, depolarizing))
+
+
+def test_estimators_agree_on_other_states():
+    n_qubits = 3
+    product = np.zeros(2 ** n_qubits, dtype=complex)
+    product[0] = 1
+    odd = ghz_statevector(n_qubits)
+    odd[-1] *= -1
+    for state, expected in ((product, 0.5), (odd, 0.0)):
+        dfe = ghz_dfe_fidelity(*simulate_dfe_probabilities(state, n_qubits))
+        tomography = ghz_tomography_fidelity(simulate_pauli_probabilities(state, n_qubits), n_qubits)
+        assert dfe == pytest.approx(expected, abs=1e-12)
+        assert tomography == pytest.approx(expected, abs=1e-12)
+
+
+def test_sampled_estimates_converge_with_shots():
+    rng = np.random.default_rng(0)
+    exact = exact_fidelity(4, 0.1)
+    dfe = [local_fidelity(4, 20000, 0.1, rng) for _ in range(5)]
+    tomography = [local_tomography_fidelity(4, 2000, 0.1, rng) for _ in range(5)]
+    assert np.mean(dfe) == pytest.approx(exact, abs=0.01)
+    assert np.mean(tomography) == pytest.approx(exact, abs=0.02)
+    # Noise actually reaches the estimate instead of a constant ideal fidelity of 1.
+    assert max(dfe) < 0.95
@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import indy_handles
+from indy_handles import WalletHandles
+
+
+class FakeWallet:
+    """The three indy.wallet calls WalletHandles makes, with a log of opens and closes."""
+
+    def __init__(self, close_delay=0.0):
+        self.close_delay = close_delay
+        self.handles = itertools.count(1)
+        self.open_handles = set()
+        self.log = []
+
+    async def create_wallet(self, config, credentials):
+        pass
+
+    async def open_wallet(self, config, credentials):
+        handle = next(self.handles)
+        self.open_handles.add(handle)
+        self.log.append(('open', json.loads(config)['id'], handle))
+        return handle
+
+    async def close_wallet(self, handle):
+        await asyncio.sleep(self.close_delay)
+        self.open_handles.remove(handle)
+        self.log.append(('close', handle))
+
+
+@pytest.fixture
+def fake_wallet(monkeypatch):
+    fake = FakeWallet()
+    monkeypatch.setattr(indy_handles, 'wallet', fake)
+    return fake
+
+
+def config(wallet_id):
+    return json.dumps({'id': wallet_id})
+
+
+CREDENTIALS = json.dumps({'key': 'secret'})
+
+
+def test_reopen_reuses_the_handle(fake_wallet):
+    handles = WalletHandles()
+
+    async def main():
+        first = await handles.open(config('steward'), CREDENTIALS)
+        second = await handles.open(config('steward'), CREDENTIALS)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert handles.metrics() == {'open': 1, 'in_use': 1, 'opened': 1, 'reused': 1, 'closed': 0}
+
+
+def test_held_handles_are_never_evicted(fake_wallet):
+    handles = WalletHandles(maxsize=1)
+
+    async def main():
+        held = [await handles.open(config(f'holder{i}'), CREDENTIALS) for i in range(3)]
+        assert fake_wallet.open_handles == set(held)
+        for i in range(3):
+            await handles.release(config(f'holder{i}'))
+        return held
+
+    held = asyncio.run(main())
+    # Only idle handles beyond maxsize are closed, least recently released first.
+    assert fake_wallet.open_handles == {held[2]}
+    assert handles.metrics() == {'open': 1, 'in_use': 0, 'opened': 3, 'reused': 0, 'closed': 2}
+
+
+def test_handle_stays_open_while_any_reference_is_held(fake_wallet):
+    handles = WalletHandles(maxsize=0)
+
+    async def main():
+        handle = await handles.open(config('issuer'), CREDENTIALS)
+        await handles.open(config('issuer'), CREDENTIALS)
+        await handles.release(config('issuer'))
+        assert handle in fake_wallet.open_handles
+        await handles.release(config('issuer'))
+        assert handle not in fake_wallet.open_handles
+
+    asyncio.run(main())
+
+
+def test_release_without_open_raises(fake_wallet):
+    handles = WalletHandles()
+
+    async def main():
+        await handles.open(config('holder'), CREDENTIALS)
+        await handles.release(config('holder'))
+        with pytest.raises(ValueError):
+            await handles.release(config('holder'))
+
+    asyncio.run(main())
+
+
+def test_reopen_waits_for_a_pending_close(fake_wallet):
+    fake_wallet.close_delay = 0.02
+    handles = WalletHandles(maxsize=0)
+
+    async def main():
+        first = await handles.open(config('holder'), CREDENTIALS)
+        evict = asyncio.ensure_future(handles.release(config('holder')))
+        await asyncio.sleep(0)
+        second = await handles.open(config('holder'), CREDENTIALS)
+        await evict
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first != second
+    assert fake_wallet.log == [('open', 'holder', first), ('close', first), ('open', 'holder', second)]
+
+
+def test_close_all(fake_wallet):
+    handles = WalletHandles()
+
+    async def main():
+        for i in range(3):
+            await handles.open(config(f'holder{i}'), CREDENTIALS)
+        await handles.release(config('holder0'))
+        await handles.close_all()
+
+    asyncio.run(main())
+    assert not fake_wallet.open_handles
+    assert handles.metrics()['open'] == 0
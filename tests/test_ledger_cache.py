@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import ledger_cache
+from ledger_cache import LedgerCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ledger_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_get_put_and_lru_eviction():
+    cache = LedgerCache(maxsize=2, ttl=None)
+    cache.put('a', ('id-a', '{}'))
+    cache.put('b', ('id-b', '{}'))
+    assert cache.get('a') == ('id-a', '{}')
+    cache.put('c', ('id-c', '{}'))
+    # 'b' was the least recently used entry.
+    assert cache.get('b') is None
+    assert cache.get('a') == ('id-a', '{}')
+    assert cache.get('c') == ('id-c', '{}')
+    assert cache.metrics() == {'hits': 3, 'disk_hits': 0, 'misses': 0, 'size': 2}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LedgerCache(ttl=10.0)
+    cache.put('a', ('id-a', '{}'))
+    clock[0] += 9.9
+    assert cache.get('a') == ('id-a', '{}')
+    clock[0] += 0.2
+    assert cache.get('a') is None
+
+
+def test_sqlite_tier_survives_restart_and_honours_ttl(tmp_path, clock):
+    db_path = str(tmp_path / 'cache.sqlite')
+    LedgerCache(ttl=10.0, db_path=db_path).put('a', ('id-a', '{"ver": "1.0"}'))
+
+    restarted = LedgerCache(ttl=10.0, db_path=db_path)
+    assert restarted.get('a') == ('id-a', '{"ver": "1.0"}')
+    assert restarted.disk_hits == 1
+
+    clock[0] += 11.0
+    assert LedgerCache(ttl=10.0, db_path=db_path).get('a') is None
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = LedgerCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'id-a', '{}'
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_fetch('a', fetch) for _ in range(10)))
+
+    assert asyncio.run(main()) == [('id-a', '{}')] * 10
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.hits == 9
+    assert not cache.pending
+
+
+def test_failed_fetch_is_not_cached():
+    cache = LedgerCache()
+
+    async def failing():
+        raise ConnectionError("pool unreachable")
+
+    async def succeeding():
+        return 'id-a', '{}'
+
+    async def main():
+        with pytest.raises(ConnectionError):
+            await cache.get_or_fetch('a', failing)
+        return await cache.get_or_fetch('a', succeeding)
+
+    assert asyncio.run(main()) == ('id-a', '{}')
+    assert cache.misses == 2
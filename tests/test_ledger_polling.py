@@ -0,0 +1,156 @@
+import asyncio
+import json
+import socket
+from collections import OrderedDict
+
+import pytest
+
+import DID_WalletAddress_Generation as onboarding
+from fake_ledger import FakeLedger
+from pool_topology import JsonLineTransport, NodeInfo, PoolTopology, StubNode
+
+STEWARD = 'Th7MpTaRZVRYnPiabds81Y'
+
+
+def applied(response):
+    return response['result']['data'] is not None
+
+
+@pytest.fixture
+def fake_ledger(monkeypatch):
+    fake = FakeLedger(latency=0.0)
+    monkeypatch.setattr(onboarding, 'ledger', fake)
+    monkeypatch.setattr(onboarding, 'poll_stats', onboarding.PollStats())
+    monkeypatch.setattr(onboarding, 'read_pool', None)
+    return fake
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_routed_read_with_every_validator_down_times_out(fake_ledger, monkeypatch):
+    nodes = OrderedDict((alias, NodeInfo(alias, alias, '127.0.0.1', free_port(), '127.0.0.1', None, ['VALIDATOR']))
+                        for alias in ('Node1', 'Node2'))
+
+    async def main():
+        stubs = [await StubNode(node, fake_ledger, down=True).start() for node in nodes.values()]
+        transport = JsonLineTransport()
+        monkeypatch.setattr(onboarding, 'read_pool', PoolTopology(nodes, transport, timeout=0.05, hedge_after=0.01))
+        try:
+            request = await fake_ledger.build_get_nym_request(STEWARD, 'did')
+            await onboarding.ensure_previous_request_applied(None, request, applied, deadline=0.3,
+                                                             base_delay=0.01, max_delay=0.05)
+        finally:
+            await transport.close()
+            for stub in stubs:
+                await stub.stop()
+
+    # The ConnectionError of each failed poll is retried; only the deadline ends the read.
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    assert onboarding.poll_stats.timeouts == 1
+    assert onboarding.read_pool.failed_reads > 1
+
+
+class NackingLedger(FakeLedger):
+    """Answers the first `nacks` reads with REQNACK, like a node that is still catching up."""
+
+    def __init__(self, nacks, **kwargs):
+        super().__init__(**kwargs)
+        self.nacks = nacks
+
+    async def submit_request(self, pool_handle, request_json):
+        if self.nacks and json.loads(request_json)['operation']['type'] == '105':
+            self.nacks -= 1
+            return json.dumps({'op': 'REQNACK', 'reqId': json.loads(request_json)['reqId'], 'reason': 'busy'})
+        return await super().submit_request(pool_handle, request_json)
+
+
+async def write_nym(fake_ledger, target='did'):
+    request = await fake_ledger.build_nym_request(STEWARD, target, 'verkey', None, None)
+    await fake_ledger.sign_and_submit_request(None, None, STEWARD, request)
+    return await fake_ledger.build_get_nym_request(STEWARD, target)
+
+
+def test_lagging_read_is_polled_until_applied(fake_ledger):
+    fake_ledger.read_lag = 0.05
+
+    async def main():
+        request = await write_nym(fake_ledger)
+        return await onboarding.ensure_previous_request_applied(None, request, applied, base_delay=0.01,
+                                                                max_delay=0.02)
+
+    response = json.loads(asyncio.run(main()))
+    assert json.loads(response['result']['data'])['verkey'] == 'verkey'
+    polls = onboarding.poll_stats.polls['105']
+    assert len(polls) == 1 and polls[0] > 1
+    assert onboarding.poll_stats.timeouts == 0
+
+
+def test_reqnack_is_retried(monkeypatch):
+    fake_ledger = NackingLedger(2, latency=0.0)
+    monkeypatch.setattr(onboarding, 'ledger', fake_ledger)
+    monkeypatch.setattr(onboarding, 'poll_stats', onboarding.PollStats())
+    monkeypatch.setattr(onboarding, 'read_pool', None)
+
+    async def main():
+        request = await write_nym(fake_ledger)
+        return await onboarding.ensure_previous_request_applied(None, request, applied, base_delay=0.001)
+
+    assert json.loads(asyncio.run(main()))['op'] == 'REPLY'
+    assert onboarding.poll_stats.polls == {'105': [3]}
+
+
+def test_backoff_doubles_up_to_max_delay(fake_ledger, monkeypatch):
+    bounds = []
+
+    class Jitter:
+        @staticmethod
+        def uniform(low, high):
+            bounds.append(high)
+            return 0.0
+
+    monkeypatch.setattr(onboarding, 'random', Jitter)
+
+    async def main():
+        request = await fake_ledger.build_get_nym_request(STEWARD, 'never-written')
+        await onboarding.ensure_previous_request_applied(None, request, applied, deadline=0.05, base_delay=0.1,
+                                                         max_delay=0.5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    assert bounds[:5] == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+
+def test_deadline_raises_timeout(fake_ledger):
+    async def main():
+        request = await fake_ledger.build_get_nym_request(STEWARD, 'never-written')
+        await onboarding.ensure_previous_request_applied(None, request, applied, deadline=0.05, base_delay=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    assert onboarding.poll_stats.timeouts == 1
+    assert '105' not in onboarding.poll_stats.polls
+
+
+def test_identical_concurrent_reads_share_one_poll(fake_ledger):
+    fake_ledger.read_lag = 0.03
+
+    async def main():
+        await write_nym(fake_ledger)
+        # Separately built requests differ in reqId but read the same thing.
+        requests = [await fake_ledger.build_get_nym_request(STEWARD, 'did') for _ in range(5)]
+        return await asyncio.gather(*(onboarding.ensure_previous_request_applied(None, request, applied,
+                                                                                 base_delay=0.005)
+                                      for request in requests))
+
+    responses = asyncio.run(main())
+    assert len(set(responses)) == 1
+    assert onboarding.poll_stats.coalesced == 4
+    polls = onboarding.poll_stats.polls['105']
+    assert len(polls) == 1
+    assert fake_ledger.counts['105'] == polls[0]
+    assert not onboarding._inflight_checks
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import DID_WalletAddress_Generation as onboarding
+import indy_handles
+from did_signing import DidSigner
+from fake_ledger import FakeLedger
+from indy_handles import WalletHandles
+from ledger_cache import LedgerCache
+
+ISSUER_DID = 'Th7MpTaRZVRYnPiabds81Y'
+
+
+def test_signing_runs_off_the_event_loop(tmp_path):
+    onboarder = onboarding.Onboarder(signing_key_path=str(tmp_path / 'did_signing.key'))
+    dids = ['did:sov:{:022d}'.format(i) for i in range(2000)]
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticker = asyncio.ensure_future(tick())
+        await asyncio.sleep(0)
+        signer, signatures = await onboarder.sign_dids(dids)
+        ticker.cancel()
+        return ticks, signer, signatures
+
+    ticks, signer, signatures = asyncio.run(main())
+    # Other coroutines kept running while the hashes were signed.
+    assert ticks > 1
+    assert len(signatures) == len(dids)
+    assert DidSigner(backend=signer.backend.name).verify(signatures, public_key=signer.public_key) == [True] * len(dids)
+
+
+def test_load_holders_csv_defaults(tmp_path):
+    path = tmp_path / 'holders.csv'
+    path.write_text('name,wallet_id,wallet_key\nAlice,alice_w,alice_k\nBob,,\n')
+    holders = onboarding.load_holders(str(path))
+    assert [holder['name'] for holder in holders] == ['Alice', 'Bob']
+    assert json.loads(holders[0]['wallet_config']) == {'id': 'alice_w'}
+    assert json.loads(holders[0]['wallet_credentials']) == {'key': 'alice_k'}
+    assert json.loads(holders[1]['wallet_config']) == {'id': 'Bob_wallet'}
+    assert json.loads(holders[1]['wallet_credentials']) == {'key': 'Bob_wallet_key'}
+
+
+def test_load_holders_jsonl(tmp_path):
+    path = tmp_path / 'holders.jsonl'
+    path.write_text('{"name": "Alice", "wallet_key": "k"}\n\n{"name": "Bob", "wallet_id": "b"}\n')
+    holders = onboarding.load_holders(str(path))
+    assert [(json.loads(h['wallet_config'])['id'], json.loads(h['wallet_credentials'])['key']) for h in holders] == \
+        [('Alice_wallet', 'k'), ('b', 'Bob_wallet_key')]
+
+
+class IndyError(Exception):
+    def __init__(self, error_code):
+        super().__init__(error_code)
+        self.error_code = error_code
+
+
+class FakeWallet:
+    def __init__(self):
+        self.handles = itertools.count(1)
+
+    async def create_wallet(self, config, credentials):
+        pass
+
+    async def open_wallet(self, config, credentials):
+        return next(self.handles)
+
+    async def close_wallet(self, handle):
+        pass
+
+
+class FakeAgent:
+    """The indy.did and indy.anoncreds calls of onboard_holder; tracks the chains in flight."""
+
+    def __init__(self, fail=None):
+        self.fail = fail or {}
+        self.dids = itertools.count()
+        self.active = 0
+        self.max_active = 0
+        self.wallet_names = {}
+
+    async def create_and_store_my_did(self, wallet, config):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.002)
+        return 'did{:019d}'.format(next(self.dids)), 'verkey'
+
+    async def issuer_create_credential_offer(self, wallet, cred_def_id):
+        return json.dumps({'cred_def_id': cred_def_id})
+
+    async def prover_create_master_secret(self, wallet, master_secret_id):
+        error = self.fail.get(wallet)
+        if error is not None:
+            self.active -= 1
+            raise error
+        return 'master-secret'
+
+    async def prover_create_credential_req(self, wallet, did, offer, cred_def, master_secret_id):
+        await asyncio.sleep(0.002)
+        self.active -= 1
+        return json.dumps({'prover_did': did}), '{}'
+
+
+@pytest.fixture
+def agent(monkeypatch, tmp_path):
+    """Onboarding against FakeLedger with a published cred def, stub did/anoncreds and fresh handles."""
+    fake_ledger = FakeLedger(latency=0.0)
+    fake = FakeAgent()
+    handles = WalletHandles(maxsize=4)
+    monkeypatch.setattr(indy_handles, 'wallet', FakeWallet())
+    monkeypatch.setattr(onboarding, 'wallet_handles', handles)
+    monkeypatch.setattr(onboarding, 'ledger', fake_ledger)
+    monkeypatch.setattr(onboarding, 'ledger_cache', LedgerCache())
+    monkeypatch.setattr(onboarding, 'poll_stats', onboarding.PollStats())
+    monkeypatch.setattr(onboarding, 'read_pool', None)
+    monkeypatch.setattr(onboarding, 'did', fake)
+    monkeypatch.setattr(onboarding, 'anoncreds', fake)
+    monkeypatch.setattr(onboarding, 'indy_error', type('indy_error', (), {'IndyError': IndyError}))
+
+    async def publish_cred_def():
+        request = await fake_ledger.build_cred_def_request(ISSUER_DID, json.dumps(
+            {'schemaId': '12', 'type': 'CL', 'tag': 'TAG1', 'value': {'primary': {}}}))
+        await fake_ledger.sign_and_submit_request(None, None, ISSUER_DID, request)
+
+    asyncio.run(publish_cred_def())
+    return fake
+
+
+ISSUER = {'wallet': 'issuer-wallet', 'transcript_cred_def_id': '{}:3:CL:12:TAG1'.format(ISSUER_DID)}
+
+
+def make_holders(count):
+    return [{'name': 'holder{}'.format(i), 'wallet_config': json.dumps({'id': 'holder{}_wallet'.format(i)}),
+             'wallet_credentials': json.dumps({'key': 'key'})} for i in range(count)]
+
+
+def test_onboard_holders_bounds_chains_in_flight(agent):
+    holders = make_holders(12)
+    stats = asyncio.run(onboarding.onboard_holders(None, ISSUER, holders, concurrency=3))
+
+    assert agent.max_active == 3
+    assert stats.holders == 12 and stats.failed == 0
+    for name in ('create_wallet', 'create_and_store_my_did', 'get_cred_def', 'prover_create_credential_req',
+                 'holder_total'):
+        assert stats.stages[name]['count'] == 12
+    assert all(json.loads(holder['issuer_transcript_cred_def'])['tag'] == 'TAG1' for holder in holders)
+    # The cred def was read from the ledger once and then served from the cache.
+    assert onboarding.ledger_cache.metrics()['misses'] == 1
+
+
+def test_failed_holders_are_counted_and_release_their_wallets(agent):
+    holders = make_holders(6)
+    # Wallet handles are handed out in order: holders 1 and 4 fail at the master secret step.
+    agent.fail = {2: IndyError(212), 5: asyncio.TimeoutError("ledger read timed out")}
+    stats = asyncio.run(onboarding.onboard_holders(None, ISSUER, holders, concurrency=1))
+
+    assert stats.holders == 4 and stats.failed == 2
+    assert stats.stages['holder_total']['count'] == 6
+    assert 'transcript_cred_request' not in holders[1] and 'transcript_cred_request' not in holders[4]
+    assert all('wallet' not in holder for holder in holders)
+    metrics = onboarding.wallet_handles.metrics()
+    assert metrics['in_use'] == 0
+    assert metrics['open'] == 4 and metrics['closed'] == 2
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import socket
+import time
+from collections import OrderedDict
+
+import pytest
+
+from fake_ledger import FakeLedger
+from pool_topology import JsonLineTransport, NodeInfo, NodeStats, PoolTopology, StubNode
+
+STEWARD = 'Th7MpTaRZVRYnPiabds81Y'
+
+
+def make_nodes(*aliases):
+    return OrderedDict((alias, NodeInfo(alias, alias, '127.0.0.1', 9700 + i, '127.0.0.1', 9800 + i, ['VALIDATOR']))
+                       for i, alias in enumerate(aliases))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def local_nodes(*aliases):
+    return OrderedDict((alias, NodeInfo(alias, alias, '127.0.0.1', free_port(), '127.0.0.1', None, ['VALIDATOR']))
+                       for alias in aliases)
+
+
+class MemoryTransport:
+    """Answers from a FakeLedger after a per-node latency; 'silent' nodes never answer, 'nack' ones refuse."""
+
+    def __init__(self, ledger, latencies, silent=(), nack=()):
+        self.ledger = ledger
+        self.latencies = latencies
+        self.silent = set(silent)
+        self.nack = set(nack)
+
+    async def request(self, node, request_json, timeout):
+        if node.alias in self.silent:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError(node.alias)
+        await asyncio.sleep(self.latencies[node.alias])
+        if node.alias in self.nack:
+            return json.dumps({'op': 'REQNACK', 'reqId': json.loads(request_json)['reqId']})
+        return await self.ledger.submit_request(None, request_json)
+
+
+async def read_many(topology, ledger, count):
+    request = await ledger.build_get_nym_request(STEWARD, STEWARD)
+    ops = []
+    for _ in range(count):
+        ops.append(json.loads(await topology.submit_read(request))['op'])
+        # Let the cancelled losing legs record their misses before the next read is routed.
+        await asyncio.sleep(0)
+    return ops
+
+
+def test_node_stats_cooldown_and_recovery(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('pool_topology.time.monotonic', lambda: now[0])
+    stats = NodeStats(max_failures=3, cooldown=30.0)
+    stats.failure()
+    stats.miss(0.5)
+    assert stats.healthy and stats.misses == 1
+    stats.miss(0.6)
+    assert not stats.healthy
+    now[0] += 30.0
+    assert stats.healthy
+    stats.success(0.01)
+    assert stats.consecutive_failures == 0
+    assert stats.error_rate == pytest.approx(0.75)
+
+
+def test_silent_node_is_demoted_after_repeated_misses():
+    ledger = FakeLedger(latency=0.0)
+    transport = MemoryTransport(ledger, {'Node1': 0.0, 'Node2': 0.001}, silent={'Node1'})
+    topology = PoolTopology(make_nodes('Node1', 'Node2'), transport, hedge_after=0.01, timeout=1.0,
+                            max_failures=3, explore=0.0)
+    # Node1 has no measurements yet, so it scores 0 and is tried first until demoted.
+    topology.ranked = lambda: sorted(topology.nodes, key=lambda alias: not topology.stats[alias].healthy)
+
+    assert asyncio.run(read_many(topology, ledger, 6)) == ['REPLY'] * 6
+    silent = topology.stats['Node1']
+    assert silent.misses == 3 and not silent.healthy
+    assert silent.requests == 3
+    assert topology.hedges == 3
+    assert topology.stats['Node2'].wins == 6
+
+
+def test_refusing_node_falls_through_to_the_next():
+    ledger = FakeLedger(latency=0.0)
+    transport = MemoryTransport(ledger, {'Node1': 0.0, 'Node2': 0.0}, nack={'Node1'})
+    topology = PoolTopology(make_nodes('Node1', 'Node2'), transport, hedge_after=1.0, explore=0.0)
+    topology.ranked = lambda: list(topology.nodes)
+
+    assert asyncio.run(read_many(topology, ledger, 2)) == ['REPLY'] * 2
+    assert topology.hedges == 0
+    assert topology.stats['Node1'].error_rate == 1.0
+    assert topology.stats['Node1'].misses == 0
+
+
+def test_all_nodes_failing_raises():
+    ledger = FakeLedger(latency=0.0)
+    transport = MemoryTransport(ledger, {'Node1': 0.0}, nack={'Node1'})
+    topology = PoolTopology(make_nodes('Node1'), transport)
+    with pytest.raises(ConnectionError):
+        asyncio.run(read_many(topology, ledger, 1))
+    assert topology.failed_reads == 1
+
+
+def test_writes_are_not_routed():
+    ledger = FakeLedger(latency=0.0)
+    topology = PoolTopology(make_nodes('Node1'), MemoryTransport(ledger, {'Node1': 0.0}))
+
+    async def main():
+        request = await ledger.build_nym_request(STEWARD, 'did', 'verkey', None, None)
+        await topology.submit_read(request)
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+
+def test_replies_are_matched_over_tcp():
+    # REPLYs carry reqId only inside `result`, as real validators send them.
+    ledger = FakeLedger(latency=0.0)
+    nodes = local_nodes('Node1', 'Node2')
+
+    async def main():
+        request = await ledger.build_nym_request(STEWARD, 'did', 'verkey', None, None)
+        await ledger.sign_and_submit_request(None, None, STEWARD, request)
+        stubs = [await StubNode(node, ledger, latency=0.0).start() for node in nodes.values()]
+        transport = JsonLineTransport()
+        topology = PoolTopology(nodes, transport, timeout=2.0, explore=0.0)
+        try:
+            start = time.perf_counter()
+            reply = json.loads(await topology.submit_read(await ledger.build_get_nym_request(STEWARD, 'did')))
+            return reply, time.perf_counter() - start
+        finally:
+            await transport.close()
+            for stub in stubs:
+                await stub.stop()
+
+    reply, elapsed = asyncio.run(main())
+    assert 'reqId' not in reply
+    assert json.loads(reply['result']['data'])['verkey'] == 'verkey'
+    assert elapsed < 1.0
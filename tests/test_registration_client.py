@@ -0,0 +1,64 @@
+import pytest
+
+web3 = pytest.importorskip('web3')
+pytest.importorskip('eth_tester')
+eth_account = pytest.importorskip('eth_account')
+
+from registration_client import RegistrationClient, RegistrationError  # noqa: E402
+
+
+@pytest.fixture
+def w3():
+    return web3.Web3(web3.EthereumTesterProvider())
+
+
+@pytest.fixture
+def sender(w3):
+    account = eth_account.Account.create()
+    w3.eth.send_transaction({'from': w3.eth.accounts[0], 'to': account.address, 'value': 10 ** 20})
+    return account
+
+
+def push_records(prefix, count):
+    return [('{}{}'.format(prefix, i), 'holder', '0x00', '0x01') for i in range(count)]
+
+
+def transaction_nonces(w3, tx_hashes):
+    return [w3.eth.get_transaction(tx_hash)['nonce'] for tx_hash in tx_hashes]
+
+
+def test_pipelined_nonces_in_batches(w3, sender):
+    # The transactions only need a recipient; whether a contract runs them does not matter here.
+    client = RegistrationClient(w3, eth_account.Account.create().address, sender.key, batch_size=2)
+    hashes = client.submit_push(push_records('did', 5))
+    receipts = client.wait_for_receipts(hashes, timeout=10, poll_interval=0.01)
+
+    assert transaction_nonces(w3, hashes) == [0, 1, 2, 3, 4]
+    assert all(receipt['status'] == 1 for receipt in receipts)
+    assert client.metrics()['nonce_resyncs'] == 0
+    assert client.metrics()['submitted'] == 5
+
+
+def test_nonce_is_resynchronised_after_an_outside_transaction(w3, sender):
+    target = eth_account.Account.create().address
+    client = RegistrationClient(w3, target, sender.key)
+    client.submit_push(push_records('did', 2))
+
+    # Another process uses the account's next nonce behind the client's back.
+    outside = sender.sign_transaction({'to': target, 'value': 0, 'gas': 21000, 'gasPrice': w3.eth.gas_price,
+                                       'nonce': client.nonce, 'chainId': w3.eth.chain_id})
+    w3.eth.send_raw_transaction(outside.raw_transaction)
+
+    hashes = client.submit_push(push_records('more', 3))
+    client.wait_for_receipts(hashes, timeout=10, poll_interval=0.01)
+    assert client.metrics()['nonce_resyncs'] == 1
+    assert sorted(transaction_nonces(w3, hashes)) == [3, 4, 5]
+    assert client.nonce == w3.eth.get_transaction_count(sender.address, 'pending') == 6
+
+
+def test_persistent_rejection_raises(w3):
+    unfunded = eth_account.Account.create()
+    client = RegistrationClient(w3, eth_account.Account.create().address, unfunded.key)
+    with pytest.raises(RegistrationError):
+        client.submit_push(push_records('did', 2))
+    assert client.metrics()['nonce_resyncs'] == 2
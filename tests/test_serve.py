@@ -0,0 +1,153 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from tQMLTKSAM_serve import BadRequest, MicroBatcher, make_handler, serve_jsonl
+
+SEQ_LEN = 3
+VOCAB_SIZE = 10
+
+
+class Predictor:
+    """Records the batch shapes it is called with; 'probabilities' echo the first token id."""
+
+    def __init__(self, gate=None):
+        self.shapes = []
+        self.gate = gate
+
+    def __call__(self, ids):
+        if self.gate is not None:
+            self.gate.wait()
+        self.shapes.append(ids.shape)
+        return np.stack([ids[:, 0], -ids[:, 0]], axis=-1).astype(np.float32)
+
+
+def test_requests_are_batched_and_padded_to_a_bucket():
+    gate = threading.Event()
+    predict = Predictor(gate)
+    batcher = MicroBatcher(predict, [1, 4, 8], SEQ_LEN, VOCAB_SIZE, max_latency=0.05)
+    try:
+        # Requests queue up while the predictor is blocked, so they share batches.
+        futures = [batcher.submit([i, 0, 0]) for i in range(6)]
+        gate.set()
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+    assert [result[0] for result in results] == list(range(6))
+    assert all(shape[0] in (1, 4, 8) and shape[1] == SEQ_LEN for shape in predict.shapes)
+    assert len(predict.shapes) < 6
+    assert batcher.stats.summary()['requests'] == 6
+
+
+def test_batch_never_exceeds_the_largest_bucket():
+    gate = threading.Event()
+    predict = Predictor(gate)
+    batcher = MicroBatcher(predict, [2], SEQ_LEN, VOCAB_SIZE, max_latency=0.2)
+    try:
+        futures = [batcher.submit([i, 0, 0]) for i in range(5)]
+        gate.set()
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        batcher.close()
+    assert predict.shapes == [(2, SEQ_LEN)] * 3
+
+
+@pytest.mark.parametrize('ids', [[1, 2], [1, 2, 3, 4], [-1, 0, 0], [0, VOCAB_SIZE, 0], [0, 1.5, 0],
+                                 [0, 'a', 0], [[0], 0, 0], None])
+def test_bad_ids_are_rejected_without_batching(ids):
+    predict = Predictor()
+    batcher = MicroBatcher(predict, [1], SEQ_LEN, VOCAB_SIZE, max_latency=0.01)
+    try:
+        with pytest.raises(BadRequest):
+            batcher.submit(ids)
+        # The last vocabulary entry is still a valid id.
+        assert batcher.submit([VOCAB_SIZE - 1, 0, 0]).result(timeout=5)[0] == VOCAB_SIZE - 1
+    finally:
+        batcher.close()
+    assert predict.shapes == [(1, SEQ_LEN)]
+
+
+def test_predictor_errors_reach_every_request_in_the_batch():
+    def predict(ids):
+        raise RuntimeError("device lost")
+
+    batcher = MicroBatcher(predict, [4], SEQ_LEN, VOCAB_SIZE, max_latency=0.01)
+    try:
+        futures = [batcher.submit([i, 0, 0]) for i in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_serve_jsonl_answers_every_line():
+    batcher = MicroBatcher(Predictor(), [1, 4], SEQ_LEN, VOCAB_SIZE, max_latency=0.01)
+    lines = [json.dumps({'id': 'a', 'tokens': [1, 0, 0]}), 'not json', json.dumps({'id': 'b'}),
+             json.dumps({'id': 'c', 'tokens': [1]}), '', json.dumps({'id': 'd', 'tokens': [0, 0, 0]})]
+    stdout = io.StringIO()
+    try:
+        serve_jsonl(batcher, io.StringIO('\n'.join(lines) + '\n'), stdout)
+    finally:
+        batcher.close()
+    records = {record['id']: record for record in map(json.loads, stdout.getvalue().splitlines())}
+    assert set(records) == {'a', None, 'b', 'c', 'd'}
+    assert records['a']['label'] == 0 and records['a']['probs'] == [1.0, -1.0]
+    assert records['d']['label'] == 0
+    assert records[None]['error'].startswith('bad request')
+    assert records['b']['error'].startswith('bad request')
+    assert 'expected 3 token ids' in records['c']['error']
+
+
+def post(port, body):
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/predict', data=body.encode('utf-8'))
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as ex:
+        return ex.code, json.loads(ex.read())
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def start(predict):
+        batcher = MicroBatcher(predict, [1, 4], SEQ_LEN, VOCAB_SIZE, max_latency=0.01)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(batcher))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, batcher))
+        return server.server_address[1]
+
+    yield start
+    for server, batcher in servers:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+def test_http_maps_only_bad_requests_to_400(http_server):
+    port = http_server(Predictor())
+    status, record = post(port, json.dumps({'id': 'a', 'tokens': [3, 0, 0]}))
+    assert status == 200 and record['label'] == 0 and record['probs'] == [3.0, -3.0]
+    assert post(port, json.dumps({'tokens': [0, VOCAB_SIZE, 0]}))[0] == 400
+    assert post(port, json.dumps({'tokens': [-1, 0, 0]}))[0] == 400
+    assert post(port, json.dumps({'tokens': [0, 0]}))[0] == 400
+    assert post(port, json.dumps({'id': 'b'}))[0] == 400
+    assert post(port, 'not json')[0] == 400
+
+
+def test_http_predictor_value_error_is_a_server_error(http_server):
+    def predict(ids):
+        raise ValueError("incompatible shapes for broadcasting")
+
+    status, record = post(http_server(predict), json.dumps({'tokens': [1, 0, 0]}))
+    assert status == 500
+    assert record['error'].startswith('ValueError')
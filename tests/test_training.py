@@ -0,0 +1,28 @@
+import numpy as np
+import jax
+import jax.numpy as jnp
+import equinox as eqx
+
+from qsam_training import train
+
+
+class Classifier(eqx.Module):
+    fc: eqx.nn.Linear
+
+    def __call__(self, x):
+        return jax.vmap(self.fc)(x)
+
+
+def test_train_leaves_the_callers_model_usable():
+    model = Classifier(eqx.nn.Linear(4, 2, key=jax.random.PRNGKey(0)))
+    before = np.asarray(model.fc.weight).copy()
+    x = np.random.default_rng(0).random((12, 4), dtype=np.float32)
+    y = np.arange(12) % 2
+
+    trained, _, history = train(model, x, y, x, y, jnp.asarray, epochs=2, batch_size=4, eval_every=1)
+
+    assert len(history) == 2
+    assert not model.fc.weight.is_deleted()
+    np.testing.assert_array_equal(np.asarray(model.fc.weight), before)
+    assert not np.array_equal(np.asarray(trained.fc.weight), before)
+    assert model(jnp.asarray(x)).shape == (12, 2)